@@ -1,9 +1,20 @@
 import asyncio
-from typing import Any
+import os
+from typing import Any, Optional
+from urllib.parse import urlparse
 from bs4 import BeautifulSoup
 import requests
 from playwright.async_api import async_playwright
 
+from disney_fragment_store import DisneyFragmentStore
+from disney_profiling import setup as setup_profiling, stage
+from disney_rate_limiter import DisneyRateLimiter, HostStatusError, parse_retry_after
+from disney_shards import ShardSpec, shard_argument, shard_path, write_partial
+
+# 可以指向本地模拟服务 (disney_mock_help_center.py) 做压测
+HELP_CENTER_URL = os.environ.get('DISNEY_HELP_CENTER_URL', 'https://help.disneyplus.com').rstrip('/')
+REQUEST_TIMEOUT = 30
+
 def extract_price(html: str) -> list[dict[str, Any]]:
     soup = BeautifulSoup(html, 'html.parser')
     all_tables = soup.find_all('table') # 查找所有表格
@@ -55,8 +66,8 @@ def get_request_json(article_id: str, selected_meta: str, country: str) -> dict:
 
 
 def get_price_json(article_id: str, selected_meta: str, country: str, localeCode: str) -> dict:
-    url = f'https://help.disneyplus.com/{localeCode}/webruntime/api/apex/execute'
-    resp = requests.post(url, json=get_request_json(article_id, selected_meta, country))
+    url = f'{HELP_CENTER_URL}/{localeCode}/webruntime/api/apex/execute'
+    resp = requests.post(url, json=get_request_json(article_id, selected_meta, country), timeout=REQUEST_TIMEOUT)
     resp.raise_for_status()
     return resp.json()
 
@@ -64,13 +75,13 @@ def get_price_json(article_id: str, selected_meta: str, country: str, localeCode
 def get_country_language_localization() -> dict[str, Any]:
     # 默认使用德语接口获取，但后续会优先选取 en-* locale
     url = (
-        'https://help.disneyplus.com/de/webruntime/api/apex/execute'
+        f'{HELP_CENTER_URL}/de/webruntime/api/apex/execute'
         '?cacheable=true&classname=%40udd%2F01p5f00000e1rTi'
         '&isContinuation=false&method=getCountryLanguageLocalization'
         '&namespace=&params=%7B%22brand%22%3A%22Disney%22%2C%22selectedLanguage%22%3A%22de%22%7D'
         '&language=de&asGuest=true&htmlEncode=false'
     )
-    resp = requests.get(url)
+    resp = requests.get(url, timeout=REQUEST_TIMEOUT)
     resp.raise_for_status()
     return resp.json()['returnValue']
 
@@ -95,10 +106,13 @@ async def fetch_record_id(browser, locale_code: str) -> str:
 
     page.on("request", on_request)
     try:
-        await page.goto(
-            f'https://help.disneyplus.com/{locale_code}/article/disneyplus-price',
+        response = await page.goto(
+            f'{HELP_CENTER_URL}/{locale_code}/article/disneyplus-price',
             wait_until='domcontentloaded',
         )
+        # 429 / 5xx 交给限流器处理（减小并发、熔断）
+        if response is not None and (response.status == 429 or response.status >= 500):
+            raise HostStatusError(response.status, parse_retry_after(response.headers.get('retry-after')))
         try:
             return await asyncio.wait_for(article_id_future, timeout=15)
         except asyncio.TimeoutError:
@@ -107,69 +121,205 @@ async def fetch_record_id(browser, locale_code: str) -> str:
         await page.close()
 
 
-async def main():
-    loc_map = get_country_language_localization()
-    results: dict[str, Any] = {}
+def help_center_host() -> str:
+    return urlparse(HELP_CENTER_URL).netloc
+
+
+CHECKPOINT_FILE = 'disneyplus_prices.checkpoint.jsonl'
+
+
+def load_checkpoint(checkpoint_file: str = CHECKPOINT_FILE) -> dict[str, Any]:
+    # 读取断点日志中已完成的国家；进程中断时最后一行可能不完整，直接忽略
+    done: dict[str, Any] = {}
+    if not os.path.exists(checkpoint_file):
+        return done
+    with open(checkpoint_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            done[entry['country']] = entry['plans']
+    return done
+
+
+def open_checkpoint(done: dict[str, Any], checkpoint_file: str = CHECKPOINT_FILE):
+    # 用有效条目重写日志（去掉不完整的末行），之后每完成一个国家追加一行
+    f = open(checkpoint_file, 'w', encoding='utf-8')
+    for country_code, plans in done.items():
+        f.write(json.dumps({'country': country_code, 'plans': plans}, ensure_ascii=False) + '\n')
+    f.flush()
+    return f
+
+
+def append_checkpoint(f, country_code: str, plans: list[dict[str, Any]]):
+    f.write(json.dumps({'country': country_code, 'plans': plans}, ensure_ascii=False) + '\n')
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def clear_checkpoint(checkpoint_file: str = CHECKPOINT_FILE):
+    # 结果文件写入成功后删除断点日志
+    if os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+
+
+async def main(resume: bool = False, checkpoint_file: str = CHECKPOINT_FILE,
+               limiter: Optional[DisneyRateLimiter] = None, fragments: Optional[DisneyFragmentStore] = None,
+               shard: Optional[ShardSpec] = None):
+    _, results = await scrape_prices(resume, checkpoint_file, limiter, fragments, shard)
+    return results
+
+
+async def scrape_prices(resume: bool = False, checkpoint_file: str = CHECKPOINT_FILE,
+                        limiter: Optional[DisneyRateLimiter] = None, fragments: Optional[DisneyFragmentStore] = None,
+                        shard: Optional[ShardSpec] = None) -> tuple[list[str], dict[str, Any]]:
+    """返回 (帮助中心的完整国家列表, 抓取结果)；指定 shard 时只抓取属于该分片的国家"""
+    limiter = limiter or DisneyRateLimiter()
+    if fragments is None:
+        fragments = DisneyFragmentStore(manifest_name=f'manifest.{shard.suffix}.json') if shard else DisneyFragmentStore()
+    with stage('fetch'):
+        loc_map = await limiter.call(help_center_host(), get_country_language_localization)
+    all_countries = list(loc_map)
+    if shard:
+        loc_map = {country_code: info for country_code, info in loc_map.items() if shard.contains(country_code)}
+        print(f"分片 {shard.label}: 负责 {len(loc_map)}/{len(all_countries)} 个国家")
+    done = load_checkpoint(checkpoint_file) if resume else {}
+    if done:
+        print(f"从断点恢复：已完成 {len(done)} 个国家，剩余 {len([c for c in loc_map if c not in done])} 个")
+    journal = open_checkpoint(done, checkpoint_file)
+
+    try:
+        # 各国家并发抓取，解析阶段嵌套在 fetch 中，只记录耗时和内存
+        with stage('fetch'):
+            await scrape_countries(loc_map, done, journal, limiter, fragments)
+    finally:
+        journal.close()
+        limiter.close()
+        if fragments.countries:
+            fragments.save_manifest(order=loc_map)
+    limiter.report()
+
+    # 按国家列表的顺序从日志内容组装最终结果
+    return all_countries, {country_code: done[country_code] for country_code in loc_map if country_code in done}
+
+
+def select_locale(info: dict[str, Any]) -> dict[str, Any]:
+    # 所有可用语言选项
+    lan_entries = info.get('lanInfo', [])
+    # 优先选择以 en- 开头的 English locale
+    en_entries = [l for l in lan_entries if l.get('localeCode', '').startswith('en-')]
+    if en_entries:
+        return en_entries[0]
+    return lan_entries[0]
+
+
+async def scrape_countries(loc_map: dict[str, Any], done: dict[str, Any], journal, limiter: DisneyRateLimiter,
+                           fragments: DisneyFragmentStore):
+    pending = [country_code for country_code in loc_map if country_code not in done]
+    if not pending:
+        return
 
     async with async_playwright() as p:
         browser = await p.chromium.launch(headless=True)
-        record_ids_by_locale: dict[str, str] = {}
-
-        for country_code, info in loc_map.items():
-            # 所有可用语言选项
-            lan_entries = info.get('lanInfo', [])
-            # 优先选择以 en- 开头的 English locale
-            en_entries = [l for l in lan_entries if l.get('localeCode', '').startswith('en-')]
-            if en_entries:
-                lan = en_entries[0]
-            else:
-                lan = lan_entries[0]
-
+        # 同一 locale 的国家共用一次 recordId 查询
+        record_id_tasks: dict[str, asyncio.Task] = {}
+
+        async def get_record_id(locale_code: str) -> str:
+            task = record_id_tasks.get(locale_code)
+            if task is None:
+                task = record_id_tasks[locale_code] = asyncio.ensure_future(
+                    limiter.call(help_center_host(), fetch_record_id, browser, locale_code))
+            try:
+                return await asyncio.shield(task)
+            except Exception:
+                # 失败的结果不缓存，后面的国家会重新查询
+                if record_id_tasks.get(locale_code) is task:
+                    del record_id_tasks[locale_code]
+                raise
+
+        async def scrape_country(country_code: str):
+            lan = select_locale(loc_map[country_code])
             locale_code = lan['localeCode']
             master_label = lan['masterLabel']
             try:
                 # 获取 recordId
-                if locale_code not in record_ids_by_locale:
-                    record_ids_by_locale[locale_code] = await fetch_record_id(browser, locale_code)
-                record_id = record_ids_by_locale[locale_code]
+                record_id = await get_record_id(locale_code)
                 # 请求文章 JSON
-                price_json = get_price_json(record_id, master_label, country_code, locale_code)
+                price_json = await limiter.call(help_center_host(), get_price_json,
+                                                record_id, master_label, country_code, locale_code)
 
                 # 提取 HTML 片段和 LastPublishedDate
                 html_fragment = price_json['returnValue']['HowTo_Details__c']
                 last_published_date = price_json['returnValue'].get('LastPublishedDate')
+                # 保存原始片段，解析器修改后可以用 disney_fragment_store.py reparse 离线重新解析；
+                # 写文件和解析都在线程中执行，不阻塞事件循环上其他国家的请求
+                await asyncio.to_thread(fragments.put, country_code, html_fragment, locale_code, last_published_date)
 
                 # 解析套餐信息
-                plans = extract_price(html_fragment)
+                with stage('parse'):
+                    plans = await asyncio.to_thread(extract_price, html_fragment)
                 # 将 LastPublishedDate 加入每个套餐字典中
                 for plan in plans:
                     plan['last_published_date'] = last_published_date
 
-                results[country_code] = plans
+                done[country_code] = plans
+                append_checkpoint(journal, country_code, plans)
                 print(f"[{country_code}] 使用 {locale_code} 抓取到 {len(plans)} 个套餐，发布日期: {last_published_date}")
             except Exception as e:
                 print(f"[{country_code}] 失败：{e}")
 
+        await asyncio.gather(*(scrape_country(country_code) for country_code in pending))
         await browser.close()
 
-    return results
-
 
 import json
 import time
-import os
 import shutil
 
-if __name__ == '__main__':
-    all_prices = asyncio.run(main())
+OUTPUT_FILE = 'disneyplus_prices.json'
 
-    if not all_prices:
-        raise SystemExit("❌ 所有国家抓取失败,results 为空,中止执行")
-
-    output_file_latest = 'disneyplus_prices.json'
 
+def save_prices(all_prices: dict[str, Any], output_file: str = OUTPUT_FILE):
     # 保存最新版本（供转换器使用）
-    with open(output_file_latest, 'w', encoding='utf-8') as f:
+    with stage('write'), open(output_file, 'w', encoding='utf-8') as f:
         json.dump(all_prices, f, ensure_ascii=False, indent=2)
 
-    print(f"已写入 {output_file_latest}")
+    print(f"已写入 {output_file}")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    setup_profiling('disney')
+    parser = argparse.ArgumentParser(description='Disney+ 价格爬虫')
+    parser.add_argument('--resume', action='store_true', help=f'跳过 {CHECKPOINT_FILE} 中已完成的国家，只抓取剩余国家')
+    parser.add_argument('--base-url', help='帮助中心地址 (默认: 环境变量 DISNEY_HELP_CENTER_URL 或 https://help.disneyplus.com)')
+    parser.add_argument('--shard', type=shard_argument, metavar='K/N',
+                        help='只抓取按国家代码哈希分到第 K 片(共 N 片)的国家,结果写入分片文件,'
+                             '全部完成后用 disney_shards.py merge 合并')
+    args = parser.parse_args()
+    if args.base_url:
+        HELP_CENTER_URL = args.base_url.rstrip('/')
+    # 分片各自使用独立的断点日志，多个分片可以在同一目录下同时运行
+    checkpoint_file = shard_path(CHECKPOINT_FILE, args.shard) if args.shard else CHECKPOINT_FILE
+    all_countries, all_prices = asyncio.run(scrape_prices(resume=args.resume, checkpoint_file=checkpoint_file,
+                                                          shard=args.shard))
+
+    if args.shard:
+        # 分片内有国家失败也写出分片文件，由合并步骤统一报告缺失的国家；
+        # 此时保留断点日志并以非零状态退出，调度方可以用 --resume 只补抓失败的国家
+        write_partial(args.shard, all_countries, all_prices)
+        shard_countries = [country_code for country_code in all_countries if args.shard.contains(country_code)]
+        failed = len(shard_countries) - len(all_prices)
+        if failed:
+            raise SystemExit(f"❌ 分片 {args.shard.label} 有 {failed} 个国家抓取失败,已保留 {checkpoint_file},"
+                             f"可以用 --shard {args.shard.label} --resume 补抓")
+        clear_checkpoint(checkpoint_file)
+        raise SystemExit(0)
+
+    if not all_prices:
+        raise SystemExit("❌ 所有国家抓取失败,results 为空,中止执行")
+
+    save_prices(all_prices)
+    clear_checkpoint()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Disney+ 价格聚合视图
+汇率转换之后一次遍历处理后数据，按 套餐 / 货币 / 地区 分组计算 CNY 价格的中位数、均值、最低与最高，
+结果作为物化视图写在处理后文件旁边 (disneyplus_prices_aggregates.json)，看板直接读取即可。
+每个国家记录一个指纹，再次运行时只重新计算包含变化国家的分组，其余分组沿用上次的结果。
+"""
+
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from disney_money import Money
+from disney_plan_identity import canonical_plan_id
+
+AGGREGATES_VERSION = 2
+PERIODS = ('monthly', 'annual')
+VIEWS = ('by_plan', 'by_currency', 'by_region')
+
+REGION_COUNTRIES = {
+    'europe': [
+        'AD', 'AL', 'AT', 'BA', 'BE', 'BG', 'CH', 'CZ', 'DE', 'DK', 'EE', 'ES', 'FI', 'FR', 'GI', 'GR', 'HR',
+        'HU', 'IE', 'IS', 'IT', 'LI', 'LT', 'LU', 'LV', 'MC', 'ME', 'MK', 'MT', 'NL', 'NO', 'PL', 'PT', 'RO',
+        'RS', 'SE', 'SI', 'SK', 'TR', 'UK',
+    ],
+    'north_america': ['CA', 'US'],
+    'latin_america': [
+        'AR', 'BO', 'BR', 'BZ', 'CL', 'CO', 'CR', 'EC', 'GT', 'GY', 'HN', 'MX', 'NI', 'PA', 'PE', 'PY', 'SR',
+        'SV', 'UY', 'VE',
+    ],
+    'caribbean': ['AG', 'BB', 'BS', 'DM', 'DO', 'GD', 'HT', 'JM', 'KN', 'LC', 'TT', 'VC'],
+    'asia_pacific': ['AU', 'HK', 'JP', 'KR', 'NZ', 'SG', 'TW'],
+}
+REGION_BY_COUNTRY = {country: region for region, countries in REGION_COUNTRIES.items() for country in countries}
+OTHER_REGION = 'other'
+
+# 分组键：(视图, 'EUR|disney/premium|monthly')
+GroupKey = Tuple[str, str]
+
+
+def cny_minor(plan: Dict, period: str) -> Optional[int]:
+    """套餐某个周期的 CNY 价格（整数分）；旧数据没有 *_minor 字段时解析字符串"""
+    money = Money.from_fields(plan.get(f'{period}_price_cny_minor'), plan.get(f'{period}_price_cny'))
+    return money.minor if money is not None and money.currency == 'CNY' else None
+
+
+def minor_to_cny(numerator: int, denominator: int = 1) -> float:
+    """整数分（均值和偶数个成员的中位数带分母）-> 元，四舍五入到分"""
+    cents = (Decimal(numerator) / denominator).quantize(Decimal(1), rounding=ROUND_HALF_UP)
+    return Money(int(cents), 'CNY').to_float()
+
+
+def aggregates_path(processed_path: str) -> str:
+    """disneyplus_prices_processed.json -> disneyplus_prices_aggregates.json"""
+    base, ext = os.path.splitext(processed_path)
+    if base.endswith('_processed'):
+        base = base[:-len('_processed')]
+    return f"{base}_aggregates{ext}"
+
+
+def country_rows(country: str, info: Dict) -> List[Tuple[GroupKey, int]]:
+    """一个国家贡献给各个分组的 (分组键, CNY 价格（分）)"""
+    region = REGION_BY_COUNTRY.get(country, OTHER_REGION)
+    rows = []
+    for plan in info.get('plans', []):
+        plan_id = plan.get('plan_id') or canonical_plan_id(plan.get('plan_name') or '')
+        currency = plan.get('currency_code') or 'N/A'
+        for period in PERIODS:
+            price = cny_minor(plan, period)
+            if price is None:
+                continue
+            rows.append((('by_plan', f"{plan_id}|{period}"), price))
+            rows.append((('by_currency', f"{currency}|{plan_id}|{period}"), price))
+            rows.append((('by_region', f"{region}|{plan_id}|{period}"), price))
+    return rows
+
+
+def fingerprint(rows: List[Tuple[GroupKey, int]]) -> str:
+    # 只依据参与聚合的字段，套餐名称写法变化等不影响聚合的修改不会触发重算
+    payload = json.dumps(sorted(rows), separators=(',', ':'))
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def group_fields(view: str, key: str) -> Dict[str, str]:
+    parts = key.split('|')
+    names = {'by_plan': ('plan_id', 'period'),
+             'by_currency': ('currency', 'plan_id', 'period'),
+             'by_region': ('region', 'plan_id', 'period')}[view]
+    return dict(zip(names, parts))
+
+
+def group_stats(view: str, key: str, values: List[Tuple[int, str]]) -> Dict:
+    """values 为 (CNY 价格（分）, 国家)，统计全部用整数完成，只在输出时换算成元"""
+    values = sorted(values)
+    prices = [price for price, _ in values]
+    middle = len(prices) // 2
+    median = minor_to_cny(prices[middle]) if len(prices) % 2 else minor_to_cny(prices[middle - 1] + prices[middle], 2)
+    return {
+        **group_fields(view, key),
+        'count': len(values),
+        'median_cny': median,
+        'mean_cny': minor_to_cny(sum(prices), len(prices)),
+        'min': {'country_code': values[0][1], 'price_cny': minor_to_cny(values[0][0])},
+        'max': {'country_code': values[-1][1], 'price_cny': minor_to_cny(values[-1][0])},
+        'countries': sorted({country for _, country in values}),
+    }
+
+
+def update_aggregates(items: Iterable[Tuple[str, Dict]], previous: Optional[Dict] = None,
+                      source: Optional[str] = None) -> Tuple[Dict, int]:
+    """一次遍历 (国家, 数据) 生成全部分组的成员与价格，只对包含变化国家的分组重新计算统计值。
+    返回 (聚合结果, 重新计算的分组数)"""
+    fingerprints: Dict[str, str] = {}
+    groups: Dict[GroupKey, List[Tuple[int, str]]] = {}
+    for country, info in items:
+        if country.startswith('_') or not isinstance(info, dict):
+            continue
+        rows = country_rows(country, info)
+        fingerprints[country] = fingerprint(rows)
+        for group, price in rows:
+            groups.setdefault(group, []).append((price, country))
+
+    reusable = previous is not None and previous.get('_meta', {}).get('version') == AGGREGATES_VERSION
+    old_fingerprints = previous['_meta'].get('fingerprints', {}) if reusable else {}
+    changed: Set[str] = {country for country, fp in fingerprints.items() if old_fingerprints.get(country) != fp}
+    changed |= set(old_fingerprints) - set(fingerprints)
+
+    result: Dict = {view: {} for view in VIEWS}
+    recomputed = 0
+    for (view, key), values in sorted(groups.items()):
+        old = previous.get(view, {}).get(key) if reusable else None
+        # 成员没有变化、且成员的指纹都没变时沿用旧结果；国家移出分组会使它的指纹变化
+        if old is not None and not changed.intersection(old['countries']) \
+                and not changed.intersection(country for _, country in values):
+            result[view][key] = old
+        else:
+            result[view][key] = group_stats(view, key, values)
+            recomputed += 1
+
+    result['_meta'] = {
+        'version': AGGREGATES_VERSION,
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'source': source,
+        'countries': len(fingerprints),
+        'groups': sum(len(result[view]) for view in VIEWS),
+        'recomputed_groups': recomputed,
+        'changed_countries': sorted(changed),
+        'fingerprints': fingerprints,
+    }
+    return result, recomputed
+
+
+def load_aggregates(path: str) -> Optional[Dict]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def write_aggregates(items: Iterable[Tuple[str, Dict]], processed_path: str) -> Dict:
+    """更新并写出处理后文件对应的聚合视图"""
+    path = aggregates_path(processed_path)
+    aggregates, recomputed = update_aggregates(items, load_aggregates(path), os.path.basename(processed_path))
+    meta = aggregates['_meta']
+    # _meta 放在最前面，便于查看
+    ordered = {'_meta': meta, **{view: aggregates[view] for view in VIEWS}}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(ordered, f, ensure_ascii=False, indent=2)
+    print(f"✅ 聚合视图已写入 {path}: {len(meta['changed_countries'])} 个国家有变化,"
+          f"重新计算 {recomputed}/{meta['groups']} 个分组")
+    return ordered
+
+
+def main(argv: Optional[List[str]] = None):
+    """用法: python disney_aggregates.py [处理后数据文件] [--full]"""
+    args = sys.argv[1:] if argv is None else argv
+    full = '--full' in args
+    paths = [arg for arg in args if not arg.startswith('--')]
+    processed_path = paths[0] if paths else 'disneyplus_prices_processed.json'
+
+    if full and os.path.exists(aggregates_path(processed_path)):
+        os.remove(aggregates_path(processed_path))
+    with open(processed_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    write_aggregates(data.items(), processed_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Disney+ 价格流水线基准测试
+用合成数据对各阶段（解析、汇率转换、流式转换、排序、对比、渲染、CHANGELOG 解析）计时并记录内存峰值，
+市场数量可以从现在的 82 个扩展到上万个，并与保存的基线对比。
+"""
+
+import argparse
+import contextlib
+import copy
+import gc
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import disney_rate_converter as converter
+from disney_changelog_archiver import DisneyChangelogArchiver
+from disney_fragment_store import DisneyFragmentStore
+from disney_price_change_detector import DisneyPriceChangeDetector
+
+BASELINE_FILE = os.path.join("benchmarks", "baseline.json")
+DEFAULT_MARKETS = [82, 1000]
+
+# 汇率固定，保证每次运行结果一致（以 USD 为基准，与 openexchangerates 相同）
+SYNTHETIC_RATES = {
+    'USD': 1.0, 'CNY': 7.18, 'EUR': 0.92, 'GBP': 0.79, 'TRY': 40.1, 'KRW': 1380.0, 'JPY': 148.0,
+    'TWD': 30.5, 'CAD': 1.37, 'COP': 4020.0, 'ARS': 1180.0, 'BRL': 5.55, 'MXN': 18.7, 'CLP': 940.0,
+    'PEN': 3.58, 'AUD': 1.53, 'NZD': 1.68, 'HKD': 7.84, 'SGD': 1.29, 'NOK': 10.2, 'SEK': 9.6,
+    'DKK': 6.4, 'CHF': 0.81, 'PLN': 3.65, 'CZK': 21.3, 'HUF': 345.0, 'RON': 4.38,
+}
+
+PLAN_TEMPLATES = [
+    ("Disney+ Standard with Ads", 5.99, False),
+    ("Disney+ Standard", 9.99, True),
+    ("Disney+ Premium", 13.99, True),
+    ("Extra Member", 5.99, False),
+]
+
+
+def _market_codes(markets: int) -> List[str]:
+    """前 82 个使用真实国家代码，其余生成 M0083 这样的合成代码"""
+    real_codes = list(converter.COUNTRY_INFO)
+    codes = real_codes[:markets]
+    codes.extend(f"M{i:04d}" for i in range(len(codes), markets))
+    return codes
+
+
+def _country_details(code: str, index: int) -> Dict:
+    if code in converter.COUNTRY_INFO:
+        return converter.COUNTRY_INFO[code]
+    real_codes = list(converter.COUNTRY_INFO)
+    return converter.COUNTRY_INFO[real_codes[index % len(real_codes)]]
+
+
+def _format_amount(amount: float, details: Dict) -> str:
+    """按国家的千位/小数分隔符格式化金额"""
+    text = f"{amount:,.2f}"
+    thousand, decimal = details.get('thousand', ','), details.get('decimal', '.')
+    return text.replace(',', '\0').replace('.', decimal).replace('\0', thousand)
+
+
+def _local_amount(base_usd: float, details: Dict) -> float:
+    rate = SYNTHETIC_RATES.get(details.get('currency'), 1.0)
+    return round(base_usd * rate, 2)
+
+
+def _price_text(monthly: float, has_annual: bool, details: Dict) -> str:
+    currency = details['currency']
+    text = f"Monthly: {_format_amount(monthly, details)} {currency} Select plan"
+    if has_annual:
+        text += f" Annual: {_format_amount(monthly * 10, details)} {currency} Select plan"
+    return text
+
+
+def generate_help_center_fragments(markets: int, seed: int = 0) -> List[str]:
+    """为每个市场生成一段帮助中心 HTML 片段（与 HowTo_Details__c 中的价格表结构一致）"""
+    rng = random.Random(seed)
+    fragments = []
+    for index, code in enumerate(_market_codes(markets)):
+        details = _country_details(code, index)
+        rows = []
+        for plan_name, base_usd, has_annual in PLAN_TEMPLATES:
+            monthly = _local_amount(base_usd * rng.uniform(0.6, 1.4), details)
+            price = _price_text(monthly, has_annual, details)
+            rows.append(f"<tr><td><p>{plan_name}</p></td><td><p>Plan details</p></td><td><p>{price}</p></td></tr>")
+        fragments.append(
+            "<p>Prices for your region</p><table><tbody>"
+            "<tr><th>Plan</th><th>Features</th><th>Price</th></tr>"
+            + ''.join(rows)
+            + "</tbody></table><p>Prices include applicable taxes.</p>"
+        )
+    return fragments
+
+
+def generate_raw_prices(markets: int, seed: int = 0) -> Dict[str, List[Dict]]:
+    """生成与 disneyplus_prices.json 结构相同的原始价格数据"""
+    rng = random.Random(seed)
+    raw = {}
+    for index, code in enumerate(_market_codes(markets)):
+        details = _country_details(code, index)
+        plans = []
+        for plan_name, base_usd, has_annual in PLAN_TEMPLATES:
+            monthly = _local_amount(base_usd * rng.uniform(0.6, 1.4), details)
+            price = _price_text(monthly, has_annual, details)
+            plans.append({'plan': plan_name, 'price': price, 'last_published_date': '2026-05-04T20:17:25.000Z'})
+        raw[code] = plans
+    return raw
+
+
+def generate_country_info(markets: int) -> Dict[str, Dict]:
+    """合成市场复用真实国家的货币与格式信息"""
+    return {code: _country_details(code, index) for index, code in enumerate(_market_codes(markets))}
+
+
+def generate_processed_pair(markets: int, change_ratio: float = 0.3, seed: int = 0):
+    """生成一对 processed 快照：新快照中约 change_ratio 的价格因汇率波动变化，并有少量套餐增删"""
+    rng = random.Random(seed)
+    old = {}
+    for index, code in enumerate(_market_codes(markets)):
+        details = _country_details(code, index)
+        plans = []
+        for plan_name, base_usd, has_annual in PLAN_TEMPLATES:
+            monthly = round(base_usd * rng.uniform(0.6, 1.4), 2)
+            local = _local_amount(monthly, details)
+            plans.append({
+                'plan_name': plan_name,
+                'currency_code': details['currency'],
+                'monthly_price_original': f"{details['currency']} {local:.2f}",
+                'monthly_price_cny': f"CNY {monthly * SYNTHETIC_RATES['CNY']:.2f}",
+                'annual_price_original': f"{details['currency']} {local * 10:.2f}" if has_annual else None,
+                'annual_price_cny': f"CNY {monthly * 10 * SYNTHETIC_RATES['CNY']:.2f}" if has_annual else None,
+            })
+        old[code] = {'name_cn': details.get('name_cn', code), 'plans': plans}
+
+    new = copy.deepcopy(old)
+    for country in new.values():
+        for plan in country['plans']:
+            if rng.random() < change_ratio:
+                swing = rng.uniform(0.97, 1.03)
+                for field in ('monthly_price_cny', 'annual_price_cny'):
+                    if plan[field]:
+                        plan[field] = f"CNY {float(plan[field][4:]) * swing:.2f}"
+        if rng.random() < 0.02:
+            country['plans'].pop()
+        if rng.random() < 0.02:
+            country['plans'].append(dict(country['plans'][0], plan_name='Disney+ Basic'))
+    return old, new
+
+
+def generate_changelog(path: str, markets: int, entries: int = 12, seed: int = 0):
+    """生成包含 entries 个检测条目的大型 CHANGELOG 文件"""
+    detector = DisneyPriceChangeDetector()
+    start = datetime(2026, 1, 4, 9, 0, 0)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("# Disney+ 价格变化记录\n\n## 📅 当前月份记录\n\n")
+        for i in range(entries):
+            old, new = generate_processed_pair(markets, seed=seed + i)
+            date = (start + timedelta(days=7 * i)).strftime('%Y-%m-%d %H:%M:%S')
+            if i == 0 or date[5:7] != (start + timedelta(days=7 * (i - 1))).strftime('%m'):
+                f.write(f"### {date[:4]}年{date[5:7]}月\n\n")
+            f.write(detector.generate_changelog_content(detector.compare_prices(old, new), date) + "\n\n")
+
+
+def measure(func: Callable[[], object], repeat: int = 3) -> Dict:
+    """最佳耗时取 repeat 次中的最小值；内存峰值单独用 tracemalloc 再跑一次测量"""
+    timings = []
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            gc.collect()
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+
+        gc.collect()
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return {'seconds': round(min(timings), 6), 'peak_kb': round(peak / 1024, 1)}
+
+
+def run_benchmarks(markets: int, repeat: int = 3, stages: Optional[List[str]] = None) -> Dict[str, Dict]:
+    """对单个规模运行全部阶段，返回 {阶段: 结果}"""
+    results = {}
+
+    def wanted(stage: str) -> bool:
+        return not stages or stage in stages
+
+    if wanted('extract_price') or wanted('extract_price_corpus'):
+        try:
+            from disney import extract_price
+        except ImportError as e:
+            print(f"⚠️ 跳过 extract_price: {e}")
+        else:
+            if wanted('extract_price'):
+                fragments = generate_help_center_fragments(markets)
+                results['extract_price'] = measure(lambda: [extract_price(html) for html in fragments], repeat)
+            # 爬虫保存的真实片段（与市场数量无关），没有片段存储时跳过
+            corpus = DisneyFragmentStore().corpus() if wanted('extract_price_corpus') else []
+            if corpus:
+                results['extract_price_corpus'] = measure(lambda: [extract_price(html) for html in corpus], repeat)
+                results['extract_price_corpus']['fragments'] = len(corpus)
+
+    raw = generate_raw_prices(markets)
+    country_info = generate_country_info(markets)
+    if wanted('convert'):
+        results['convert'] = measure(
+            lambda: converter.process_prices(raw, SYNTHETIC_RATES, country_info), repeat)
+
+    if wanted('sort'):
+        with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+            processed = converter.process_prices(raw, SYNTHETIC_RATES, country_info)
+        results['sort'] = measure(lambda: converter.sort_by_premium_plan_cny(processed), repeat)
+
+    if wanted('convert_stream'):
+        # 流式转换包含读取、转换、排序和写出，对比时关注内存峰值
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_path = os.path.join(tmp_dir, 'disneyplus_prices.json')
+            with open(input_path, 'w', encoding='utf-8') as f:
+                json.dump(raw, f, ensure_ascii=False, indent=2)
+            output_path = os.path.join(tmp_dir, 'disneyplus_prices_processed.json')
+            results['convert_stream'] = measure(
+                lambda: converter.convert_prices_streaming(input_path, output_path, SYNTHETIC_RATES, country_info),
+                repeat)
+            results['convert_stream']['input_kb'] = round(os.path.getsize(input_path) / 1024, 1)
+
+    detector = DisneyPriceChangeDetector()
+    old, new = generate_processed_pair(markets)
+    if wanted('compare_prices'):
+        results['compare_prices'] = measure(lambda: detector.compare_prices(old, new), repeat)
+
+    if wanted('generate_changelog_content'):
+        changes = detector.compare_prices(old, new)
+        results['generate_changelog_content'] = measure(
+            lambda: detector.generate_changelog_content(changes, '2026-01-04 09:00:00'), repeat)
+
+    if wanted('parse_changelog_entries'):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            changelog_path = os.path.join(tmp_dir, 'CHANGELOG.md')
+            generate_changelog(changelog_path, markets)
+            archiver = DisneyChangelogArchiver()
+            archiver.changelog_file = changelog_path
+            results['parse_changelog_entries'] = measure(archiver.parse_changelog_entries, repeat)
+            results['parse_changelog_entries']['input_kb'] = round(os.path.getsize(changelog_path) / 1024, 1)
+
+    return results
+
+
+def load_baseline(path: str = BASELINE_FILE) -> Dict:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_baseline(report: Dict[str, Dict[str, Dict]], path: str = BASELINE_FILE):
+    baseline = load_baseline(path)
+    baseline.setdefault('results', {})
+    for markets, stages in report.items():
+        baseline['results'].setdefault(markets, {}).update(stages)
+    baseline['updated_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2)
+        f.write('\n')
+    print(f"✅ 基线已保存: {path}")
+
+
+def print_report(report: Dict[str, Dict[str, Dict]], baseline: Dict, threshold: float) -> List[str]:
+    """打印结果表格，返回超过阈值的回退项"""
+    regressions = []
+    print(f"{'市场数':>7} | {'阶段':<28} | {'耗时(s)':>10} | {'基线(s)':>10} | {'倍数':>6} | {'内存峰值(KB)':>12} | {'基线(KB)':>10}")
+    print('-' * 100)
+    for markets, stages in report.items():
+        for stage, result in stages.items():
+            base = baseline.get('results', {}).get(markets, {}).get(stage, {})
+            ratio = result['seconds'] / base['seconds'] if base.get('seconds') else None
+            ratio_text = f"{ratio:.2f}x" if ratio is not None else '-'
+            print(f"{markets:>7} | {stage:<28} | {result['seconds']:>10.4f} | "
+                  f"{base.get('seconds', '-'):>10} | {ratio_text:>6} | "
+                  f"{result['peak_kb']:>12} | {base.get('peak_kb', '-'):>10}")
+            if ratio is not None and ratio > threshold:
+                regressions.append(f"{stage}@{markets}: {ratio:.2f}x")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Disney+ 价格流水线基准测试")
+    parser.add_argument('--markets', type=int, nargs='+', default=DEFAULT_MARKETS,
+                        help='市场数量，可指定多个规模 (默认: 82 1000)')
+    parser.add_argument('--stages', nargs='+', help='只运行指定阶段')
+    parser.add_argument('--repeat', type=int, default=3, help='每个阶段的计时次数，取最小值 (默认: 3)')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help=f'基线文件 (默认: {BASELINE_FILE})')
+    parser.add_argument('--save-baseline', action='store_true', help='把本次结果写入基线')
+    parser.add_argument('--threshold', type=float, default=1.5,
+                        help='耗时超过基线的倍数时视为回退，以非零状态退出 (默认: 1.5)')
+    parser.add_argument('--json', dest='json_output', help='把结果另存为 JSON 文件')
+    args = parser.parse_args(argv)
+
+    report = {}
+    for markets in args.markets:
+        print(f"⏱️ 运行基准测试: {markets} 个市场...")
+        report[str(markets)] = run_benchmarks(markets, args.repeat, args.stages)
+
+    baseline = load_baseline(args.baseline)
+    regressions = print_report(report, baseline, args.threshold)
+
+    if args.json_output:
+        with open(args.json_output, 'w', encoding='utf-8') as f:
+            json.dump({'results': report}, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        save_baseline(report, args.baseline)
+    elif regressions:
+        print(f"❌ 性能回退: {', '.join(regressions)}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Disney+ 处理后快照的二进制伴随文件 (.bin)
+固定结构：字符串表（国家代码、名称、套餐名称、货币）+ 定长的国家/套餐/排行记录，
+金额以 (整数值, 小数位数) 保存，读取时不需要再解析 "CNY 87.59" 这样的字符串。
+BinarySnapshot 通过 mmap 打开文件，可以直接按整数遍历金额，也可以还原出与 JSON 完全相同的数据。
+bench 命令在全部历史快照上对比 JSON 与二进制格式的加载时间和大小。
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+from collections.abc import Mapping
+from decimal import Decimal
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from disney_money import Money, currency_exponent, format_scaled, parse_scaled
+from disney_snapshot_store import DisneySnapshotStore
+
+MAGIC = b'DPSB'
+FORMAT_VERSION = 2
+TOP_10_KEY = '_top_10_cheapest_premium_plans'
+FLAG_TOP_10 = 1
+PLAN_FLAG_MINOR = 1    # 套餐带 currency_exponent 与 *_minor 字段
+
+NONE = 0xFFFFFFFF      # 字符串不存在 / 值为 null
+NO_AMOUNT = -128       # 小数位数为该值时表示金额为 null
+
+# 魔数, 版本, 标志, 字符串数, 国家数, 套餐数, 排行数, 字符串表/国家/套餐/排行 偏移, 排行说明, 排行更新时间
+HEADER = struct.Struct('<4sHHIIIIIIIIII')
+# 国家代码, 中文名, 第一个套餐的序号, 套餐数
+COUNTRY = struct.Struct('<IIIH')
+# 套餐名称, 规范 ID, 货币代码, 4 个金额 (货币, 整数值, 小数位数)：月付原价、月付 CNY、年付原价、年付 CNY, 标志
+# 整数值与小数位数按字符串原样保存；*_minor 字段可以由它们按 ISO 4217 小数位数精确算出，不单独保存
+PLAN = struct.Struct('<III' + 'Iqb' * 4 + 'B')
+# 排名, 国家代码, 中文名, 套餐名称, 原价 (货币, 整数值, 小数位数), 货币代码, CNY 价格 (整数值, 小数位数)
+TOP = struct.Struct('<HIIIIqbIqb')
+
+AMOUNT_FIELDS = ('monthly_price_original', 'monthly_price_cny', 'annual_price_original', 'annual_price_cny')
+TOP_KEYS = ('rank', 'country_code', 'country_name_cn', 'plan_name', 'original_price', 'currency', 'price_cny')
+
+
+class UnsupportedSnapshot(ValueError):
+    """数据不符合固定结构，不能写成二进制格式（JSON 仍然是权威数据）"""
+
+
+def sidecar_path(json_path: str) -> str:
+    """disneyplus_prices_processed.json -> disneyplus_prices_processed.bin"""
+    return os.path.splitext(json_path)[0] + '.bin'
+
+
+def parse_amount_text(text: Optional[str]) -> Tuple[Optional[str], int, int]:
+    """'USD 12.99' -> ('USD', 1299, 2)；None -> (None, 0, NO_AMOUNT)"""
+    if text is None:
+        return None, 0, NO_AMOUNT
+    scaled = parse_scaled(text)
+    if scaled is None:
+        raise UnsupportedSnapshot(f"无法识别的金额: {text!r}")
+    return scaled
+
+
+def plan_keys(has_plan_id: bool, has_minor: bool) -> List[str]:
+    """套餐字段的固定顺序；has_minor 时为转换器带整数字段 (*_minor) 的新结构"""
+    keys = ['plan_name'] + (['plan_id'] if has_plan_id else []) + ['currency_code']
+    if not has_minor:
+        return keys + list(AMOUNT_FIELDS)
+    keys.append('currency_exponent')
+    for field in AMOUNT_FIELDS:
+        keys += [field, f'{field}_minor']
+    return keys
+
+
+def _float_parts(value) -> Tuple[int, int]:
+    if value is None:
+        return 0, NO_AMOUNT
+    if not isinstance(value, (int, float)) or isinstance(value, bool):
+        raise UnsupportedSnapshot(f"无法识别的数值: {value!r}")
+    sign, digits, exponent = Decimal(repr(value)).as_tuple()
+    if exponent > 0 or -exponent > 127:
+        raise UnsupportedSnapshot(f"无法识别的数值: {value!r}")
+    number = int(''.join(map(str, digits)) or '0')
+    return -number if sign else number, -exponent
+
+
+class _StringTable:
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.strings: List[str] = []
+
+    def add(self, value: Optional[str]) -> int:
+        if value is None:
+            return NONE
+        if not isinstance(value, str):
+            raise UnsupportedSnapshot(f"期望字符串，实际为 {value!r}")
+        if value not in self.ids:
+            self.ids[value] = len(self.strings)
+            self.strings.append(value)
+        return self.ids[value]
+
+    def encode(self) -> bytes:
+        encoded = [s.encode('utf-8') for s in self.strings]
+        offsets, position = [], 0
+        for item in encoded:
+            offsets.append(position)
+            position += len(item)
+        offsets.append(position)
+        return struct.pack(f'<{len(offsets)}I', *offsets) + b''.join(encoded)
+
+
+def encode_snapshot(data: Dict) -> bytes:
+    """把处理后数据编码为二进制格式；结构不符时抛出 UnsupportedSnapshot"""
+    strings = _StringTable()
+    countries, plans, top = [], [], []
+    flags = 0
+    description = updated_at = NONE
+
+    keys = list(data)
+    if TOP_10_KEY in data:
+        if keys[0] != TOP_10_KEY:
+            raise UnsupportedSnapshot("排行榜不在文件开头")
+        header = data[TOP_10_KEY]
+        if list(header) != ['description', 'updated_at', 'data']:
+            raise UnsupportedSnapshot(f"排行榜字段不符合结构: {list(header)}")
+        flags |= FLAG_TOP_10
+        description, updated_at = strings.add(header['description']), strings.add(header['updated_at'])
+        for entry in header['data']:
+            if tuple(entry) != TOP_KEYS:
+                raise UnsupportedSnapshot(f"排行条目字段不符合结构: {list(entry)}")
+            currency, value, exponent = parse_amount_text(entry['original_price'])
+            top.append(TOP.pack(entry['rank'], strings.add(entry['country_code']),
+                                strings.add(entry['country_name_cn']), strings.add(entry['plan_name']),
+                                strings.add(currency), value, exponent, strings.add(entry['currency']),
+                                *_float_parts(entry['price_cny'])))
+
+    for country, info in data.items():
+        if country == TOP_10_KEY:
+            continue
+        if country.startswith('_') or not isinstance(info, dict) or list(info) not in (['name_cn', 'plans'], ['plans']):
+            raise UnsupportedSnapshot(f"国家数据不符合结构: {country}")
+        country_plans = info['plans']
+        if len(country_plans) > 0xFFFF:
+            raise UnsupportedSnapshot(f"{country} 套餐数量过多")
+        countries.append(COUNTRY.pack(strings.add(country), strings.add(info.get('name_cn')),
+                                      len(plans), len(country_plans)))
+        for plan in country_plans:
+            has_minor = 'currency_exponent' in plan
+            if list(plan) != plan_keys('plan_id' in plan, has_minor):
+                raise UnsupportedSnapshot(f"{country} 的套餐字段不符合结构: {list(plan)}")
+            if has_minor and plan['currency_exponent'] != currency_exponent(plan['currency_code']):
+                raise UnsupportedSnapshot(f"{country} 的 currency_exponent 与货币代码不一致")
+            amounts = []
+            for field in AMOUNT_FIELDS:
+                currency, value, exponent = parse_amount_text(plan[field])
+                if has_minor:
+                    minor = None if exponent == NO_AMOUNT else Money.from_scaled(currency, value, exponent).minor
+                    if plan[f'{field}_minor'] != minor:
+                        raise UnsupportedSnapshot(f"{country} 的 {field}_minor 与金额字符串不一致")
+                amounts.extend((strings.add(currency), value, exponent))
+            plans.append(PLAN.pack(strings.add(plan['plan_name']),
+                                   strings.add(plan['plan_id']) if 'plan_id' in plan else NONE,
+                                   strings.add(plan['currency_code']), *amounts,
+                                   PLAN_FLAG_MINOR if has_minor else 0))
+
+    string_bytes = strings.encode()
+    strings_offset = HEADER.size
+    countries_offset = strings_offset + len(string_bytes)
+    plans_offset = countries_offset + len(countries) * COUNTRY.size
+    top_offset = plans_offset + len(plans) * PLAN.size
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, flags, len(strings.strings), len(countries), len(plans), len(top),
+                         strings_offset, countries_offset, plans_offset, top_offset, description, updated_at)
+    return b''.join([header, string_bytes, *countries, *plans, *top])
+
+
+def write_sidecar(data: Dict, path: str) -> Optional[str]:
+    """写出二进制伴随文件；数据不符合固定结构时跳过并返回 None"""
+    try:
+        payload = encode_snapshot(data)
+    except UnsupportedSnapshot as e:
+        print(f"⚠️ 跳过二进制伴随文件 {path}: {e}")
+        return None
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+    return path
+
+
+class BinarySnapshot(Mapping):
+    """通过 mmap 读取二进制快照；作为映射使用时与 json.load 的结果相同"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.flags, self.n_strings, self.n_countries, self.n_plans, self.n_top,
+         self._strings_offset, self._countries_offset, self._plans_offset, self._top_offset,
+         self._description, self._updated_at) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"不是有效的二进制快照: {path}")
+        self._string_offsets = struct.unpack_from(f'<{self.n_strings + 1}I', self._mm, self._strings_offset)
+        self._string_data = self._strings_offset + 4 * (self.n_strings + 1)
+        self._string_cache: Dict[int, str] = {}
+        self._countries = {
+            self.string(code): (name, first, count)
+            for code, name, first, count in COUNTRY.iter_unpack(self._table(self._countries_offset, self.n_countries, COUNTRY))
+        }
+
+    def _table(self, offset: int, count: int, record: struct.Struct) -> memoryview:
+        return memoryview(self._mm)[offset:offset + count * record.size]
+
+    def close(self):
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def string(self, index: int) -> Optional[str]:
+        if index == NONE:
+            return None
+        value = self._string_cache.get(index)
+        if value is None:
+            start = self._string_data + self._string_offsets[index]
+            end = self._string_data + self._string_offsets[index + 1]
+            value = self._string_cache[index] = self._mm[start:end].decode('utf-8')
+        return value
+
+    # --- 数值访问：不构造字符串 ---
+
+    def plan_records(self) -> Iterator[Tuple]:
+        """按文件顺序直接产出套餐的原始记录（字符串为字符串表序号），最快的批量读取方式"""
+        return PLAN.iter_unpack(self._table(self._plans_offset, self.n_plans, PLAN))
+
+    def iter_plans(self) -> Iterator[Tuple]:
+        """逐个产出 (国家代码, 套餐名称, 货币代码, (货币, 整数值, 小数位数) × 4)，null 金额的小数位数为 NO_AMOUNT"""
+        plans = self.plan_records()
+        for code, (_, _, count) in self._countries.items():
+            for _ in range(count):
+                record = next(plans)
+                yield (code, self.string(record[0]), self.string(record[2]),
+                       *(record[i:i + 3] for i in range(3, 15, 3)))
+
+    def iter_amounts(self, field: str = 'monthly_price_cny') -> Iterator[Tuple[str, str, int, int]]:
+        """产出某个金额字段的 (国家代码, 套餐名称, 整数值, 小数位数)，跳过 null"""
+        position = 3 + 3 * AMOUNT_FIELDS.index(field)
+        plans = self.plan_records()
+        for code, (_, _, count) in self._countries.items():
+            for _ in range(count):
+                record = next(plans)
+                if record[position + 2] != NO_AMOUNT:
+                    yield code, self.string(record[0]), record[position + 1], record[position + 2]
+
+    # --- 还原为 JSON 数据 ---
+
+    def _amount_text(self, currency: int, value: int, exponent: int) -> Optional[str]:
+        if exponent == NO_AMOUNT:
+            return None
+        return f"{self.string(currency)} {format_scaled(value, exponent)}"
+
+    def _plan(self, record: Tuple) -> Dict:
+        plan = {'plan_name': self.string(record[0])}
+        if record[1] != NONE:
+            plan['plan_id'] = self.string(record[1])
+        plan['currency_code'] = self.string(record[2])
+        has_minor = record[15] & PLAN_FLAG_MINOR
+        if has_minor:
+            plan['currency_exponent'] = currency_exponent(plan['currency_code'])
+        for i, field in enumerate(AMOUNT_FIELDS):
+            currency, value, exponent = record[3 + 3 * i:6 + 3 * i]
+            plan[field] = self._amount_text(currency, value, exponent)
+            if has_minor:
+                plan[f'{field}_minor'] = (None if exponent == NO_AMOUNT
+                                          else Money.from_scaled(self.string(currency), value, exponent).minor)
+        return plan
+
+    def _top_10(self) -> Dict:
+        data = []
+        for (rank, code, name, plan_name, currency, value, exponent,
+             currency_code, cny_value, cny_exponent) in TOP.iter_unpack(self._table(self._top_offset, self.n_top, TOP)):
+            price = None
+            if cny_exponent != NO_AMOUNT:
+                price = float(Decimal(cny_value).scaleb(-cny_exponent)) if cny_exponent else cny_value
+            data.append({
+                'rank': rank,
+                'country_code': self.string(code),
+                'country_name_cn': self.string(name),
+                'plan_name': self.string(plan_name),
+                'original_price': self._amount_text(currency, value, exponent),
+                'currency': self.string(currency_code),
+                'price_cny': price,
+            })
+        return {'description': self.string(self._description), 'updated_at': self.string(self._updated_at), 'data': data}
+
+    def __getitem__(self, key: str):
+        if key == TOP_10_KEY and self.flags & FLAG_TOP_10:
+            return self._top_10()
+        name, first, count = self._countries[key]
+        plans = self._table(self._plans_offset + first * PLAN.size, count, PLAN)
+        info = {} if name == NONE else {'name_cn': self.string(name)}
+        info['plans'] = [self._plan(record) for record in PLAN.iter_unpack(plans)]
+        return info
+
+    def __iter__(self) -> Iterator[str]:
+        if self.flags & FLAG_TOP_10:
+            yield TOP_10_KEY
+        yield from self._countries
+
+    def __len__(self) -> int:
+        return len(self._countries) + (1 if self.flags & FLAG_TOP_10 else 0)
+
+
+# --- 快照存储中的伴随文件 ---
+
+def store_sidecar_path(store: DisneySnapshotStore, ts: str) -> str:
+    return os.path.join(store.root, 'sidecars', ts[:4], ts[4:6], f"processed_{ts}.bin")
+
+
+def write_store_sidecar(store: DisneySnapshotStore, ts: str, data: Dict) -> Optional[str]:
+    path = store_sidecar_path(store, ts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return write_sidecar(data, path)
+
+
+def sidecar_is_current(path: str) -> bool:
+    """伴随文件存在且是当前格式版本"""
+    try:
+        with open(path, 'rb') as f:
+            magic, version = struct.unpack('<4sH', f.read(6))
+    except (OSError, struct.error):
+        return False
+    return magic == MAGIC and version == FORMAT_VERSION
+
+
+def open_processed(ts: str, store: Optional[DisneySnapshotStore] = None) -> Mapping:
+    """打开处理后快照：优先使用二进制伴随文件，没有时从快照存储生成一次"""
+    store = store or DisneySnapshotStore()
+    path = store_sidecar_path(store, ts)
+    if not sidecar_is_current(path):
+        data = store.load_snapshot(ts, 'processed')
+        if not write_store_sidecar(store, ts, data):
+            return data
+    return BinarySnapshot(path)
+
+
+def build_store_sidecars(store: DisneySnapshotStore, force: bool = False) -> Tuple[int, int]:
+    """为所有处理后快照生成伴随文件，返回 (生成数, 跳过数)"""
+    built = skipped = 0
+    for ts in store.list_snapshots('processed'):
+        if sidecar_is_current(store_sidecar_path(store, ts)) and not force:
+            skipped += 1
+            continue
+        if write_store_sidecar(store, ts, store.load_snapshot(ts, 'processed')):
+            built += 1
+        else:
+            skipped += 1
+    return built, skipped
+
+
+# --- 基准测试 ---
+
+def _json_parse_amounts(data: Dict) -> float:
+    total = 0.0
+    for key, info in data.items():
+        if key.startswith('_'):
+            continue
+        for plan in info['plans']:
+            for field in AMOUNT_FIELDS:
+                if plan[field]:
+                    total += float(plan[field].split()[-1])
+    return total
+
+
+def _binary_sum_amounts(snapshot: BinarySnapshot) -> float:
+    totals: Dict[int, int] = {}
+    for record in snapshot.plan_records():
+        for position in (4, 7, 10, 13):
+            exponent = record[position + 1]
+            if exponent != NO_AMOUNT:
+                totals[exponent] = totals.get(exponent, 0) + record[position]
+    return sum(value / 10 ** exponent for exponent, value in totals.items())
+
+
+def run_bench(store: DisneySnapshotStore, repeat: int = 3) -> Dict:
+    """在全部处理后快照上对比：JSON 加载 + 解析金额字符串 vs mmap 二进制 + 整数金额"""
+    timestamps = store.list_snapshots('processed')
+    with tempfile.TemporaryDirectory(prefix='disney_binary_bench_') as tmp:
+        json_paths, bin_paths = [], []
+        for ts in timestamps:
+            data = store.load_snapshot(ts, 'processed')
+            json_path = os.path.join(tmp, f"{ts}.json")
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            if write_sidecar(data, sidecar_path(json_path)):
+                json_paths.append(json_path)
+                bin_paths.append(sidecar_path(json_path))
+
+        def best(func) -> float:
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                func()
+                timings.append(time.perf_counter() - start)
+            return min(timings)
+
+        def json_load_all():
+            for path in json_paths:
+                with open(path, 'r', encoding='utf-8') as f:
+                    _json_parse_amounts(json.load(f))
+
+        def binary_amounts_all():
+            for path in bin_paths:
+                with BinarySnapshot(path) as snapshot:
+                    _binary_sum_amounts(snapshot)
+
+        def binary_full_all():
+            for path in bin_paths:
+                with BinarySnapshot(path) as snapshot:
+                    dict(snapshot)
+
+        # 先确认还原结果与 JSON 完全一致
+        for json_path, bin_path in zip(json_paths, bin_paths):
+            with open(json_path, 'r', encoding='utf-8') as f, BinarySnapshot(bin_path) as snapshot:
+                if json.dumps(dict(snapshot), ensure_ascii=False) != json.dumps(json.load(f), ensure_ascii=False):
+                    raise RuntimeError(f"二进制快照还原结果与 JSON 不一致: {json_path}")
+
+        return {
+            'snapshots': len(json_paths),
+            'skipped': len(timestamps) - len(json_paths),
+            'json_bytes': sum(os.path.getsize(path) for path in json_paths),
+            'binary_bytes': sum(os.path.getsize(path) for path in bin_paths),
+            'json_load_and_parse_seconds': best(json_load_all),
+            'binary_amounts_seconds': best(binary_amounts_all),
+            'binary_full_decode_seconds': best(binary_full_all),
+        }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Disney+ 处理后快照的二进制伴随文件')
+    parser.add_argument('--root', default='snapshot_store', help='快照存储目录 (默认: snapshot_store)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    write_parser = subparsers.add_parser('write', help='为处理后的 JSON 文件生成 .bin 伴随文件')
+    write_parser.add_argument('files', nargs='*', default=['disneyplus_prices_processed.json'])
+
+    build_parser = subparsers.add_parser('build', help='为快照存储中的所有处理后快照生成伴随文件')
+    build_parser.add_argument('--force', action='store_true', help='重新生成已存在的伴随文件')
+
+    cat_parser = subparsers.add_parser('cat', help='把 .bin 文件还原为 JSON 输出')
+    cat_parser.add_argument('file')
+
+    bench_parser = subparsers.add_parser('bench', help='在全部历史快照上对比 JSON 与二进制格式')
+    bench_parser.add_argument('--repeat', type=int, default=3)
+
+    args = parser.parse_args(argv)
+    store = DisneySnapshotStore(args.root)
+
+    if args.command == 'write':
+        for path in args.files:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            target = write_sidecar(data, sidecar_path(path))
+            if target:
+                print(f"✅ {path} -> {target} ({os.path.getsize(path) / 1024:.1f} KB -> {os.path.getsize(target) / 1024:.1f} KB)")
+    elif args.command == 'build':
+        built, skipped = build_store_sidecars(store, args.force)
+        print(f"✅ 生成 {built} 个伴随文件,跳过 {skipped} 个")
+    elif args.command == 'cat':
+        with BinarySnapshot(args.file) as snapshot:
+            print(json.dumps(dict(snapshot), ensure_ascii=False, indent=2))
+    elif args.command == 'bench':
+        result = run_bench(store, args.repeat)
+        if not result['snapshots']:
+            print("没有可用的处理后快照")
+            sys.exit(1)
+        json_time, bin_time = result['json_load_and_parse_seconds'], result['binary_amounts_seconds']
+        print(f"快照数: {result['snapshots']} (结构不符跳过 {result['skipped']} 个)")
+        print(f"大小: JSON {result['json_bytes'] / 1024:.1f} KB -> 二进制 {result['binary_bytes'] / 1024:.1f} KB "
+              f"({result['binary_bytes'] / result['json_bytes']:.1%})")
+        print(f"加载并读取全部金额: JSON {json_time * 1000:.1f} ms -> 二进制 {bin_time * 1000:.1f} ms "
+              f"({json_time / bin_time:.1f}x)")
+        print(f"二进制完整还原为 JSON 结构: {result['binary_full_decode_seconds'] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
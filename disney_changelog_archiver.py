@@ -5,16 +5,32 @@ Disney+ CHANGELOG 归档管理器
 每月自动归档 CHANGELOG，保持主文件的可读性
 """
 
+import hashlib
+import json
+import mmap
 import os
 import re
 from datetime import datetime, timedelta
-from typing import List, Tuple
+from typing import Dict, List, Tuple
 import calendar
 
+from disney_changelog_events import DisneyChangelogEventLog
+from disney_changelog_markdown import render_markdown
+from disney_changelog_search import refresh_changelog_index
+from disney_changelog_splitter import file_signature, load_offset_index, split_buffer
+from disney_profiling import setup as setup_profiling, stage
+
+ARCHIVE_FOOTER_MARKER = "---\n\n📚 **相关链接**".encode('utf-8')
+ARCHIVE_COUNT_RE = re.compile(r'^- \*\*变化记录数量\*\*：(\d+) 次'.encode('utf-8'), re.MULTILINE)
+ARCHIVE_TRAILING_MONTH_RE = re.compile(r'(?:\s*\n### \d{4}年\d{2}月)+\s*$')
+
+
 class DisneyChangelogArchiver:
     def __init__(self):
         self.changelog_file = "CHANGELOG.md"
         self.archive_dir = "changelog_archive"
+        self.metadata_file = os.path.join(self.archive_dir, "archive_metadata.json")
+        self.event_log = DisneyChangelogEventLog()
         self.header_template = """# Disney+ 价格变化记录
 
 此文件记录 Disney+ 各国套餐价格的变化历史。
@@ -46,88 +62,66 @@ class DisneyChangelogArchiver:
             print(f"⚠️ CHANGELOG 文件不存在: {self.changelog_file}")
             return [], []
         
-        with open(self.changelog_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # 查找所有日期条目
-        # 匹配格式如: ## 2025-08-05 14:30:22 或 ## 2025-08-05
-        date_pattern = r'^## (\d{4}-\d{2}-\d{2})(?:\s+\d{2}:\d{2}:\d{2})?'
-        
-        lines = content.split('\n')
-        entries_to_archive = []
-        entries_to_keep = []
-        current_entry = []
-        current_date = None
-        in_entry = False
-        
         # 获取当前日期和上个月的最后一天
         now = datetime.now()
         # 计算上个月的最后一天作为归档截止日期
         first_day_this_month = now.replace(day=1)
         last_day_last_month = first_day_this_month - timedelta(days=1)
-        cutoff_date = last_day_last_month.date()
-        
-        print(f"📅 归档截止日期: {cutoff_date.strftime('%Y-%m-%d')}")
-        
-        i = 0
-        while i < len(lines):
-            line = lines[i]
-            
-            # 检查是否是日期标题行
-            match = re.match(date_pattern, line, re.MULTILINE)
-            if match:
-                # 保存上一个条目
-                if current_entry and current_date:
-                    entry_content = '\n'.join(current_entry)
-                    if current_date <= cutoff_date:
-                        entries_to_archive.append(entry_content)
-                    else:
-                        entries_to_keep.append(entry_content)
-                
-                # 开始新条目
-                current_date = datetime.strptime(match.group(1), '%Y-%m-%d').date()
-                current_entry = [line]
-                in_entry = True
-            elif in_entry and (line.startswith('## ') or line.startswith('# ')):
-                # 遇到新的标题，结束当前条目
-                if current_entry and current_date:
-                    entry_content = '\n'.join(current_entry)
-                    if current_date <= cutoff_date:
+        cutoff = last_day_last_month.date().strftime('%Y-%m-%d')
+
+        print(f"📅 归档截止日期: {cutoff}")
+
+        entries_to_archive = []
+        entries_to_keep = []
+        if os.path.getsize(self.changelog_file) == 0:
+            return entries_to_archive, entries_to_keep
+
+        # mmap 单遍切分出每个条目的字节范围，直接按范围取出内容
+        with open(self.changelog_file, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for entry in split_buffer(mm):
+                    entry_content = mm[entry.offset:entry.offset + entry.length].decode('utf-8')
+                    if entry.date <= cutoff:
                         entries_to_archive.append(entry_content)
                     else:
                         entries_to_keep.append(entry_content)
-                
-                # 重置状态，这行不是日期条目
-                current_entry = []
-                current_date = None
-                in_entry = False
-                
-                # 如果这是非日期的标题，需要跳过
-                continue
-            elif in_entry:
-                # 添加到当前条目
-                current_entry.append(line)
-            
-            i += 1
-        
-        # 处理最后一个条目
-        if current_entry and current_date:
-            entry_content = '\n'.join(current_entry)
-            if current_date <= cutoff_date:
-                entries_to_archive.append(entry_content)
-            else:
-                entries_to_keep.append(entry_content)
         
         return entries_to_archive, entries_to_keep
     
+    def _archive_footer(self) -> str:
+        return f"""---
+
+📚 **相关链接**：
+- [返回主 CHANGELOG](../CHANGELOG.md)
+- [查看其他月份归档](./)
+
+*此文件由自动归档系统生成于 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}*
+"""
+
+    def _unique_entries(self, entries: List[str], existing_keys=()) -> List[str]:
+        """按日期和内容哈希去掉已存在或重复的条目（保持顺序）"""
+        seen = set(existing_keys)
+        unique = []
+        for entry in entries:
+            key = self._entry_key(entry)
+            if key not in seen:
+                seen.add(key)
+                unique.append(entry)
+        return unique
+
     def create_monthly_archive(self, entries: List[str], year_month: str) -> str:
-        """创建月度归档文件"""
+        """创建月度归档文件；归档已存在时只追加新条目"""
         if not entries:
             print(f"⚠️ {year_month} 没有需要归档的条目")
             return ""
         
         archive_filename = f"disney_changelog_{year_month}.md"
         archive_path = os.path.join(self.archive_dir, archive_filename)
+
+        if os.path.exists(archive_path):
+            return self.merge_into_monthly_archive(entries, archive_filename)
+
+        entries = self._unique_entries(entries)
         
         # 生成归档文件内容
         year, month = year_month.split('-')
@@ -148,32 +142,172 @@ class DisneyChangelogArchiver:
 """
         
         # 添加所有条目
-        for entry in entries:
-            archive_content += entry + "\n\n"
+        archive_content += ''.join(entry + "\n\n" for entry in entries)
         
         # 添加页脚
-        archive_content += f"""---
-
-📚 **相关链接**：
-- [返回主 CHANGELOG](../CHANGELOG.md)
-- [查看其他月份归档](./)
-
-*此文件由自动归档系统生成于 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}*
-"""
+        archive_content += self._archive_footer()
         
         # 写入归档文件
         with open(archive_path, 'w', encoding='utf-8') as f:
             f.write(archive_content)
+        self.update_archive_metadata(archive_filename)
         
         print(f"✅ 创建月度归档: {archive_path} ({len(entries)} 个条目)")
         return archive_filename
+
+    def merge_into_monthly_archive(self, entries: List[str], archive_filename: str) -> str:
+        """把新条目按日期合并进已有的月度归档（最新的在前）：按日期+内容哈希去重，原地更新条目计数，重复执行不会改变文件"""
+        archive_path = os.path.join(self.archive_dir, archive_filename)
+        metadata = self.load_archive_metadata()
+        record = metadata.get(archive_filename)
+        if not self._record_is_current(record, archive_path) or 'entry_offsets' not in record:
+            record = self._scan_archive_file(archive_filename)
+
+        new_entries = self._unique_entries(entries, record['entry_keys'])
+        if not new_entries:
+            print(f"✅ 月度归档已是最新: {archive_path}")
+            metadata[archive_filename] = record
+            self.save_archive_metadata(metadata)
+            return archive_filename
+
+        # 归档中的条目最新的在前：新条目按日期插入，只重写第一个比新条目旧的已有条目之后的部分
+        new_entries.sort(key=self._entry_date, reverse=True)
+        dates = [key.split('|', 1)[0] for key in record['entry_keys']]
+        offsets = record['entry_offsets']
+        newest = self._entry_date(new_entries[0])
+        split = next((i for i, date in enumerate(dates) if date < newest), len(dates))
+        rewrite_offset = offsets[split] if split < len(dates) else record['footer_offset']
+
+        new_count = record['entry_count'] + len(new_entries)
+        count_bytes = str(new_count).encode('ascii')
+
+        with open(archive_path, 'rb') as f:
+            f.seek(rewrite_offset)
+            tail = f.read(record['footer_offset'] - rewrite_offset)
+        bounds = [offset - rewrite_offset for offset in offsets[split:]] + [len(tail)]
+        # (日期, 原始字节)；已有条目保持原样，排序稳定，同一时间的已有条目排在新条目之前
+        chunks = [(dates[split + i], tail[bounds[i]:bounds[i + 1]]) for i in range(len(bounds) - 1)]
+        chunks += [(self._entry_date(entry), (entry + "\n\n").encode('utf-8')) for entry in new_entries]
+        chunks.sort(key=lambda chunk: chunk[0], reverse=True)
+        appended = b''.join(chunk for _, chunk in chunks) + self._archive_footer().encode('utf-8')
+
+        with open(archive_path, 'r+b') as f:
+            # 从插入点截断，写入合并后的条目和新页脚
+            f.seek(rewrite_offset)
+            f.truncate()
+            f.write(appended)
+            if record['count_offset'] is not None and len(count_bytes) == record['count_length']:
+                # 计数位数不变时直接原地覆盖
+                f.seek(record['count_offset'])
+                f.write(count_bytes)
+            elif record['count_offset'] is not None:
+                # 位数变化（如 9 -> 10）时才需要整体重写
+                f.seek(0)
+                content = f.read()
+                content = (content[:record['count_offset']] + count_bytes
+                           + content[record['count_offset'] + record['count_length']:])
+                f.seek(0)
+                f.truncate()
+                f.write(content)
+
+        self.update_archive_metadata(archive_filename)
+        print(f"✅ 合并月度归档: {archive_path} (新增 {len(new_entries)} 个条目，共 {new_count} 个)")
+        return archive_filename
     
+    def load_archive_metadata(self) -> Dict[str, Dict]:
+        """读取归档元数据 sidecar（文件名 -> 条目数、日期范围、大小、内容哈希）"""
+        try:
+            with open(self.metadata_file, 'r', encoding='utf-8') as f:
+                return json.load(f).get('files', {})
+        except (FileNotFoundError, json.JSONDecodeError, AttributeError):
+            return {}
+
+    def save_archive_metadata(self, metadata: Dict[str, Dict]):
+        self.ensure_archive_directory()
+        tmp_file = self.metadata_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'files': dict(sorted(metadata.items()))}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.metadata_file)
+
+    def _scan_archive_file(self, filename: str) -> Dict:
+        """读取一个归档文件，统计条目数、日期范围，并记录去重键和页脚/计数的位置"""
+        archive_path = os.path.join(self.archive_dir, filename)
+        signature = file_signature(archive_path)
+        record = {
+            'year_month': filename.replace('disney_changelog_', '').replace('.md', ''),
+            'entry_count': 0,
+            'first_date': None,
+            'last_date': None,
+            **signature,
+            'entry_keys': [],
+            'entry_offsets': [],
+            'footer_offset': signature['size'],
+            'count_offset': None,
+            'count_length': 0,
+        }
+        if signature['size'] == 0:
+            return record
+
+        with open(archive_path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                footer_offset = mm.rfind(ARCHIVE_FOOTER_MARKER)
+                if footer_offset < 0:
+                    footer_offset = len(mm)
+                count_match = ARCHIVE_COUNT_RE.search(mm)
+                if count_match:
+                    record['count_offset'] = count_match.start(1)
+                    record['count_length'] = count_match.end(1) - count_match.start(1)
+
+                dates = []
+                for entry in split_buffer(mm):
+                    # 最后一个条目不包含页脚
+                    end = min(entry.offset + entry.length, footer_offset)
+                    content = mm[entry.offset:end].decode('utf-8')
+                    dates.append(entry.date)
+                    record['entry_keys'].append(self._entry_key(content))
+                    record['entry_offsets'].append(entry.offset)
+
+        record['entry_count'] = len(dates)
+        record['first_date'] = min(dates) if dates else None
+        record['last_date'] = max(dates) if dates else None
+        record['footer_offset'] = footer_offset
+        return record
+
+    @staticmethod
+    def _record_is_current(record: Dict, archive_path: str) -> bool:
+        """记录的大小和内容哈希都与文件一致时才可直接使用；不依赖 mtime，git 检出后依然有效"""
+        return (bool(record) and record.get('size') == os.path.getsize(archive_path)
+                and record.get('sha256') == file_signature(archive_path)['sha256'])
+
+    @staticmethod
+    def _entry_date(entry: str) -> str:
+        """条目标题行中的日期时间，与去重键的前半部分相同"""
+        return entry.lstrip().split('\n', 1)[0][3:].strip()
+
+    @staticmethod
+    def _entry_key(entry: str) -> str:
+        """条目去重键：标题行中的日期时间 + 规范化内容的哈希"""
+        normalized = ARCHIVE_TRAILING_MONTH_RE.sub('', entry.strip())
+        header = normalized.split('\n', 1)[0]
+        digest = hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+        return f"{header[3:].strip()}|{digest}"
+
+    def update_archive_metadata(self, filename: str):
+        """归档文件写入后更新 sidecar 中对应的记录"""
+        metadata = self.load_archive_metadata()
+        metadata[filename] = self._scan_archive_file(filename)
+        self.save_archive_metadata(metadata)
+
     def get_existing_archives(self) -> List[Tuple[str, str, int]]:
-        """获取现有归档文件信息"""
+        """获取现有归档文件信息（只重新扫描大小或内容哈希发生变化的文件）"""
         archives = []
         
         if not os.path.exists(self.archive_dir):
             return archives
+
+        metadata = self.load_archive_metadata()
+        changed = False
+        current_files = set()
         
         # 扫描归档目录
         for filename in os.listdir(self.archive_dir):
@@ -181,17 +315,25 @@ class DisneyChangelogArchiver:
                 # 提取年月信息
                 year_month = filename.replace('disney_changelog_', '').replace('.md', '')
                 if re.match(r'\d{4}-\d{2}', year_month):
-                    # 统计该归档文件中的条目数量
+                    current_files.add(filename)
                     archive_path = os.path.join(self.archive_dir, filename)
+                    cached = metadata.get(filename)
                     try:
-                        with open(archive_path, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                        # 统计 ## YYYY-MM-DD 格式的条目
-                        entry_count = len(re.findall(r'^## \d{4}-\d{2}-\d{2}', content, re.MULTILINE))
-                        archives.append((year_month, filename, entry_count))
+                        if not self._record_is_current(cached, archive_path):
+                            cached = self._scan_archive_file(filename)
+                            metadata[filename] = cached
+                            changed = True
+                        archives.append((year_month, filename, cached['entry_count']))
                     except Exception as e:
                         print(f"⚠️ 读取归档文件失败: {filename} - {e}")
                         archives.append((year_month, filename, 0))
+
+        # 清理已删除文件的记录
+        for filename in set(metadata) - current_files:
+            del metadata[filename]
+            changed = True
+        if changed:
+            self.save_archive_metadata(metadata)
         
         # 按年月排序（最新的在前）
         archives.sort(key=lambda x: x[0], reverse=True)
@@ -238,6 +380,8 @@ class DisneyChangelogArchiver:
         # 写入文件
         with open(self.changelog_file, 'w', encoding='utf-8') as f:
             f.write(new_content)
+        # 刷新持久化的条目偏移索引
+        load_offset_index(self.changelog_file)
         
         print(f"✅ 更新主 CHANGELOG: {self.changelog_file}")
     
@@ -255,7 +399,8 @@ class DisneyChangelogArchiver:
         self.ensure_archive_directory()
         
         # 解析现有记录
-        entries_to_archive, entries_to_keep = self.parse_changelog_entries()
+        with stage('parse'):
+            entries_to_archive, entries_to_keep = self.parse_changelog_entries()
         
         if not entries_to_archive:
             print("📝 没有需要归档的历史记录")
@@ -271,19 +416,28 @@ class DisneyChangelogArchiver:
                 if year_month not in monthly_entries:
                     monthly_entries[year_month] = []
                 monthly_entries[year_month].append(entry)
+
+        # 事件日志中已有的月份以日志为准重新渲染，Markdown 只是视图
+        with stage('render'):
+            for year_month in monthly_entries:
+                if self.event_log.has_month(year_month):
+                    monthly_entries[year_month] = self.event_log.render_month_entries(year_month, render_markdown)
         
         # 创建月度归档文件
         archived_files = []
         total_archived = 0
         
-        for year_month, entries in monthly_entries.items():
-            archive_filename = self.create_monthly_archive(entries, year_month)
-            if archive_filename:
-                archived_files.append(archive_filename)
-                total_archived += len(entries)
-        
-        # 更新主 CHANGELOG
-        self.update_main_changelog(entries_to_keep, archived_files)
+        with stage('write'):
+            for year_month, entries in monthly_entries.items():
+                archive_filename = self.create_monthly_archive(entries, year_month)
+                if archive_filename:
+                    archived_files.append(archive_filename)
+                    total_archived += len(entries)
+
+            # 更新主 CHANGELOG
+            self.update_main_changelog(entries_to_keep, archived_files)
+        # 条目从主 CHANGELOG 移入归档，索引按内容哈希对应，不会重复
+        refresh_changelog_index(changelog_file=self.changelog_file, archive_dir=self.archive_dir)
         
         print(f"🎉 归档完成！共归档 {total_archived} 个条目到 {len(archived_files)} 个文件")
         return total_archived, archived_files
@@ -291,6 +445,7 @@ class DisneyChangelogArchiver:
 
 def main():
     """主函数"""
+    setup_profiling('disney_changelog_archiver')
     archiver = DisneyChangelogArchiver()
     
     # 检查是否应该执行归档
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Disney+ 价格变化事件日志
+以按月分文件的 JSONL 追加写入每次检测的变化事件，作为 CHANGELOG 的唯一数据源。
+CHANGELOG.md 与月度归档只是由事件日志渲染出来的视图。
+"""
+
+import html
+import json
+import os
+import re
+import sys
+from typing import Callable, Dict, Iterator, List, TextIO
+
+from disney_changelog_markdown import (
+    ENTRY_SEPARATOR,
+    import_changelog_history,
+    month_key,
+    month_title,
+    render_changelog_month,
+)
+from disney_changelog_renderer import ChangelogRenderer
+
+
+class DisneyChangelogEventLog:
+    def __init__(self, events_dir: str = "changelog_events"):
+        self.events_dir = events_dir
+
+    def month_path(self, year_month: str) -> str:
+        return os.path.join(self.events_dir, f"disney_changes_{year_month}.jsonl")
+
+    def has_month(self, year_month: str) -> bool:
+        return os.path.exists(self.month_path(year_month))
+
+    def months(self) -> List[str]:
+        """返回事件日志中已有的月份（升序）"""
+        if not os.path.isdir(self.events_dir):
+            return []
+        months = []
+        for filename in os.listdir(self.events_dir):
+            match = re.match(r'disney_changes_(\d{4}-\d{2})\.jsonl$', filename)
+            if match:
+                months.append(match.group(1))
+        return sorted(months)
+
+    def _append_records(self, year_month: str, records: List[Dict]):
+        os.makedirs(self.events_dir, exist_ok=True)
+        lines = ''.join(
+            json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+            for record in records
+        )
+        # 追加写入，开销只和本次写入的记录大小有关
+        with open(self.month_path(year_month), 'a', encoding='utf-8') as f:
+            f.write(lines)
+
+    def append_run(self, date: str, changes: List[Dict]) -> str:
+        """追加一次检测运行的全部变化事件，返回所属月份"""
+        year_month = month_key(date)
+        self._append_records(year_month, [{'date': date, 'changes': changes}])
+        return year_month
+
+    def has_run(self, date: str) -> bool:
+        """某次检测运行的变化是否已经写入事件日志"""
+        return any('changes' in record and record.get('date') == date
+                   for record in self.iter_records(month_key(date)))
+
+    def append_legacy_entries(self, year_month: str, entries: List[str]):
+        """把尚无结构化数据的历史 Markdown 条目原样写入事件日志（按时间升序传入）"""
+        records = []
+        for entry in entries:
+            header = entry.split('\n', 1)[0]
+            records.append({'date': header[3:].strip(), 'markdown': entry})
+        if records:
+            self._append_records(year_month, records)
+
+    def iter_records(self, year_month: str) -> Iterator[Dict]:
+        """按写入顺序读取某月的事件记录"""
+        path = self.month_path(year_month)
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"⚠️ 事件日志第 {line_no} 行格式错误，已跳过: {path}")
+
+    def render_month_entries(self, year_month: str,
+                             render_changes: Callable[[List[Dict], str], str]) -> List[str]:
+        """渲染某月的全部条目，最新的在前（与 CHANGELOG 中的顺序一致）"""
+        entries = []
+        for record in self.iter_records(year_month):
+            if 'markdown' in record:
+                entries.append(record['markdown'].rstrip('\n') + '\n\n')
+            else:
+                entries.append(render_changes(record.get('changes', []), record['date']))
+        entries.reverse()
+        return entries
+
+    def render_month_section(self, year_month: str,
+                             render_changes: Callable[[List[Dict], str], str]) -> str:
+        """渲染 CHANGELOG.md 中某月的完整小节（含月份标题）；
+        历史条目带着原有的空行原样拼接，新条目之后补上条目间隔，与逐次插入的结果逐字节一致"""
+        chunks = []
+        for record in self.iter_records(year_month):
+            if 'markdown' in record:
+                chunks.append(record['markdown'])
+            else:
+                chunks.append(render_changes(record.get('changes', []), record['date']) + ENTRY_SEPARATOR)
+        chunks.reverse()
+        return f"### {month_title(year_month)}\n\n" + ''.join(chunks)
+
+
+def render_month_html(event_log: DisneyChangelogEventLog, year_month: str, sink: TextIO):
+    """把某月的事件日志渲染成 HTML 并直接写入 sink（最新的在前）"""
+    renderer = ChangelogRenderer('html')
+    records = list(event_log.iter_records(year_month))
+    sink.write(f"<h1>Disney+ 价格变化记录 - {month_title(year_month)}</h1>\n")
+    for record in reversed(records):
+        if 'markdown' in record:
+            # 事件日志之前的历史条目没有结构化数据，原样保留
+            sink.write(f'<section class="changelog-entry legacy">\n<pre>{html.escape(record["markdown"])}</pre>\n</section>\n')
+        else:
+            renderer.render(record.get('changes', []), record['date'], sink)
+
+
+def main():
+    """命令行入口：import 导入历史条目；render [YYYY-MM] 重新渲染月份视图；html YYYY-MM [输出文件] 渲染 HTML"""
+    event_log = DisneyChangelogEventLog()
+    changelog_file = "CHANGELOG.md"
+    command = sys.argv[1] if len(sys.argv) > 1 else 'render'
+
+    if command == 'import':
+        imported = import_changelog_history(event_log, changelog_file)
+        print(f"✅ 已导入 {imported} 个月份的历史条目到 {event_log.events_dir}")
+    elif command == 'render':
+        months = sys.argv[2:] or event_log.months()[-1:]
+        for year_month in months:
+            render_changelog_month(event_log, changelog_file, year_month)
+    elif command == 'html' and len(sys.argv) > 2:
+        year_month = sys.argv[2]
+        output = sys.argv[3] if len(sys.argv) > 3 else f"disney_changelog_{year_month}.html"
+        with open(output, 'w', encoding='utf-8') as f:
+            render_month_html(event_log, year_month, f)
+        print(f"✅ 已生成 HTML: {output}")
+    else:
+        print("用法: python disney_changelog_events.py [import | render [YYYY-MM ...] | html YYYY-MM [输出文件]]")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
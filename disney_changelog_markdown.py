@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Disney+ CHANGELOG.md 视图
+CHANGELOG 的月份/条目格式与 Markdown 渲染，以及对 CHANGELOG.md 的增量写入。
+检测器、事件日志命令行与归档器都只依赖本模块，彼此之间不再互相导入。
+每次运行只改写当前月份小节（新条目插入位置之后的内容），更早的条目逐字节保持不变。
+"""
+
+import mmap
+import os
+import re
+from typing import List, Optional, Tuple
+
+from disney_changelog_renderer import ChangelogRenderer
+from disney_changelog_search import refresh_changelog_index
+from disney_changelog_splitter import load_offset_index
+from disney_profiling import stage
+
+# 匹配 Markdown 中的日期条目标题，如: ## 2025-08-05 14:30:22
+ENTRY_HEADER_RE = re.compile(r'^## \d{4}-\d{2}-\d{2}', re.MULTILINE)
+# 匹配 CHANGELOG.md 中的月份标题，如: ### 2025年08月
+MONTH_HEADER_RE = re.compile(r'^### (\d{4})年(\d{2})月[ \t]*$', re.MULTILINE)
+MONTH_HEADER_BYTES_RE = re.compile(MONTH_HEADER_RE.pattern.encode('utf-8'), re.MULTILINE)
+# 条目正文以空行结尾，条目之后再空两行（与历史文件的格式一致）
+ENTRY_SEPARATOR = "\n\n"
+# 归档器在月初清空当前月份后写入的占位文字
+EMPTY_MONTH_RE = re.compile(r'\s*\*本月暂无价格变化记录\*[ \t]*\n*')
+
+INITIAL_CHANGELOG_HEADER = """# Disney+ 价格变化记录
+
+此文件记录 Disney+ 各国套餐价格的变化历史。
+
+> 📊 **说明**：价格变化自动检测功能已启用，每次爬虫运行后都会对比上次的价格数据，生成详细的变化报告。
+
+## 📁 历史归档
+
+| 年月 | 归档文件 | 变化次数 |
+|------|----------|----------|
+| - | 暂无归档 | - |
+
+---
+
+## 📅 当前月份记录
+
+"""
+
+_markdown_renderer = ChangelogRenderer()
+
+
+def render_markdown(changes: List[dict], date: str) -> str:
+    """渲染一次检测的 Markdown 条目（以空行结尾）"""
+    return _markdown_renderer.render_to_string(changes, date)
+
+
+def month_key(date: str) -> str:
+    """从 'YYYY-MM-DD HH:MM:SS' 形式的日期中取出 'YYYY-MM'"""
+    return date[:7]
+
+
+def month_title(year_month: str) -> str:
+    """'YYYY-MM' -> 'YYYY年MM月'"""
+    year, month = year_month.split('-')
+    return f"{year}年{month}月"
+
+
+def split_markdown_entries(section: str) -> List[str]:
+    """把一段 Markdown 按 ## 日期 标题拆分成条目（保持原顺序）；
+    每个条目保留到下一个标题之前的全部空行，原样拼接即可还原这一段"""
+    starts = [m.start() for m in ENTRY_HEADER_RE.finditer(section)]
+    return [section[start:end] for start, end in zip(starts, starts[1:] + [len(section)])]
+
+
+def find_month_section(content: str, year_month: str) -> Optional[Tuple[int, int]]:
+    """在 CHANGELOG 内容中定位某月小节，返回 (start, end)；不存在时返回 None"""
+    title = month_title(year_month)
+    for match in MONTH_HEADER_RE.finditer(content):
+        if f"{match.group(1)}年{match.group(2)}月" != title:
+            continue
+        next_match = MONTH_HEADER_RE.search(content, match.end())
+        end = next_match.start() if next_match else len(content)
+        return match.start(), end
+    return None
+
+
+def _locate_month(buffer, year_month: str) -> Optional[Tuple[int, int, int]]:
+    """在 bytes/mmap 中从文件末尾向前查找月份标题（当前月份总在最后），
+    返回 (标题起始, 标题行结束, 小节结束) 的字节偏移；不存在时返回 None"""
+    header = f"### {month_title(year_month)}".encode('utf-8')
+    position = buffer.rfind(header)
+    while position != -1:
+        line_end = buffer.find(b'\n', position)
+        if line_end == -1:
+            line_end = len(buffer)
+        if (position == 0 or buffer[position - 1:position] == b'\n') \
+                and not buffer[position + len(header):line_end].strip(b' \t'):
+            next_match = MONTH_HEADER_BYTES_RE.search(buffer, line_end)
+            return position, line_end, next_match.start() if next_match else len(buffer)
+        position = buffer.rfind(header, 0, position)
+    return None
+
+
+def read_month_section(changelog_file: str, year_month: str) -> Optional[str]:
+    """只读取并解码 CHANGELOG.md 中某月的小节（含月份标题）；不存在时返回 None"""
+    if not os.path.exists(changelog_file) or os.path.getsize(changelog_file) == 0:
+        return None
+    with open(changelog_file, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            location = _locate_month(mm, year_month)
+            if not location:
+                return None
+            return mm[location[0]:location[2]].decode('utf-8')
+
+
+def _rewrite_from(changelog_file: str, year_month: str, build) -> bool:
+    """定位月份小节后，用 build(标题行结束处之后的原内容) 的结果改写这一段之后的字节；
+    月份不存在时 build 收到 None，结果追加到文件末尾。返回文件是否新建"""
+    if not os.path.exists(changelog_file) or os.path.getsize(changelog_file) == 0:
+        with open(changelog_file, 'w', encoding='utf-8') as f:
+            f.write(INITIAL_CHANGELOG_HEADER + build(None).lstrip('\n'))
+        return True
+
+    with open(changelog_file, 'r+b') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            location = _locate_month(mm, year_month)
+            if location:
+                offset = location[1]
+                tail = mm[offset:].decode('utf-8')
+            else:
+                offset = len(mm)
+                tail = None
+        f.seek(offset)
+        f.write(build(tail).encode('utf-8'))
+        f.truncate()
+    return False
+
+
+def _write_and_reindex(changelog_file: str, year_month: str, build):
+    with stage('write'):
+        created = _rewrite_from(changelog_file, year_month, build)
+        # 刷新持久化的条目偏移索引
+        load_offset_index(changelog_file)
+    refresh_changelog_index(changelog_file=changelog_file)
+    if created:
+        print(f"✅ 创建新的 Changelog: {changelog_file}")
+    else:
+        print(f"✅ Changelog已更新: {changelog_file}")
+
+
+def insert_entry(changelog_file: str, year_month: str, entry: str):
+    """把一个新条目插到当前月份标题之后（最新的在前）；只改写该月小节，开销与历史长度无关"""
+    title = month_title(year_month)
+
+    def build(tail: Optional[str]) -> str:
+        if tail is None:
+            return f"\n### {title}\n\n" + entry + ENTRY_SEPARATOR
+        placeholder = EMPTY_MONTH_RE.match(tail)
+        if placeholder:
+            tail = ENTRY_SEPARATOR + tail[placeholder.end():]
+        elif not tail.strip():
+            tail = ENTRY_SEPARATOR
+        return "\n\n" + entry + tail
+
+    _write_and_reindex(changelog_file, year_month, build)
+
+
+def replace_month_section(changelog_file: str, year_month: str, section: str):
+    """用重新渲染的小节（含月份标题）替换某月小节，其余内容逐字节保持不变"""
+    body = section.split('\n', 1)[1] if '\n' in section else ''
+
+    def build(tail: Optional[str]) -> str:
+        if tail is None:
+            return "\n" + section
+        location = MONTH_HEADER_RE.search(tail)
+        end = location.start() if location else len(tail)
+        old_body = tail[:end]
+        if not old_body.strip():
+            return "\n" + body + tail[end:]
+        # 小节末尾到下一个月份标题（或文件末尾）之间的空行沿用文件中原有的
+        trailing = old_body[len(old_body.rstrip('\n')):]
+        return "\n" + body.rstrip('\n') + trailing + tail[end:]
+
+    _write_and_reindex(changelog_file, year_month, build)
+
+
+def seed_month_from_changelog(event_log, changelog_file: str, year_month: str) -> bool:
+    """事件日志还没有该月份时，把 CHANGELOG.md 中已有的条目原样导入（只读取该月小节）"""
+    if event_log.has_month(year_month):
+        return False
+    section = read_month_section(changelog_file, year_month)
+    if not section:
+        return False
+
+    entries = split_markdown_entries(section)
+    # CHANGELOG 中最新的条目在前，事件日志按时间顺序追加
+    event_log.append_legacy_entries(year_month, list(reversed(entries)))
+    return bool(entries)
+
+
+def import_changelog_history(event_log, changelog_file: str) -> int:
+    """把 CHANGELOG.md 中所有尚未进入事件日志的月份导入，返回导入的月份数"""
+    if not os.path.exists(changelog_file):
+        return 0
+
+    with open(changelog_file, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    imported = 0
+    for match in MONTH_HEADER_RE.finditer(content):
+        if seed_month_from_changelog(event_log, changelog_file, f"{match.group(1)}-{match.group(2)}"):
+            imported += 1
+    return imported
+
+
+def render_changelog_month(event_log, changelog_file: str, year_month: str):
+    """用事件日志重新渲染 CHANGELOG.md 中的某个月份小节，其余内容保持不变"""
+    with stage('render'):
+        section = event_log.render_month_section(year_month, render_markdown)
+    replace_month_section(changelog_file, year_month, section)
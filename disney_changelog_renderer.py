@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Disney+ 价格变化渲染器
+一次遍历把变化分桶，再按模板把各小节依次写入文件类对象，支持 Markdown 与 HTML 两种输出
+"""
+
+import html
+import io
+import re
+from string import Template
+from typing import Dict, List, TextIO
+
+BUCKETS = ('price_increases', 'price_decreases', 'new_plans', 'removed_plans')
+
+
+def bucket_changes(changes: List[Dict]) -> Dict[str, List[Dict]]:
+    """一次遍历把变化分为涨价、降价、新增、移除四类（保持原有顺序）"""
+    buckets = {name: [] for name in BUCKETS}
+    for change in changes:
+        change_type = change['type']
+        if change_type == 'price_change':
+            if change['change_amount'] > 0:
+                buckets['price_increases'].append(change)
+            elif change['change_amount'] < 0:
+                buckets['price_decreases'].append(change)
+        elif change_type == 'new_plan':
+            buckets['new_plans'].append(change)
+        elif change_type == 'removed_plan':
+            buckets['removed_plans'].append(change)
+    return buckets
+
+
+def count_changes(changes: List[Dict]) -> Dict[str, int]:
+    """摘要 JSON 使用的各类变化数量"""
+    return {name: len(items) for name, items in bucket_changes(changes).items()}
+
+
+MARKDOWN_TEMPLATES = {
+    'no_changes': Template("## $date\n\n✅ **无价格变化** - 所有套餐价格保持稳定\n\n"),
+    'header': Template("## $date\n\n"),
+    'overview': Template("📊 **变化概览**: $total 项变化\n"),
+    'overview_price_increases': Template("- 📈 涨价: $count 个套餐\n"),
+    'overview_price_decreases': Template("- 📉 降价: $count 个套餐\n"),
+    'overview_new_plans': Template("- 🆕 新增: $count 个套餐\n"),
+    'overview_removed_plans': Template("- ❌ 移除: $count 个套餐\n"),
+    'overview_end': Template("\n"),
+    'section_price_increases': Template("### 📈 价格上涨\n\n"),
+    'section_price_decreases': Template("### 📉 价格下降\n\n"),
+    'section_new_plans': Template("### 🆕 新增套餐\n\n"),
+    'section_removed_plans': Template("### ❌ 移除套餐\n\n"),
+    'section_end': Template(""),
+    'item_price_increases': Template(
+        "- **$country_name ($country) - $plan**\n"
+        "  - 原价: ¥$old_price | 现价: ¥$new_price\n"
+        "  - 涨幅: ¥$change_amount (+$change_percent%)\n"
+        "  - 当地价格: $price_original $currency\n\n"
+    ),
+    'item_price_decreases': Template(
+        "- **$country_name ($country) - $plan**\n"
+        "  - 原价: ¥$old_price | 现价: ¥$new_price\n"
+        "  - 降幅: ¥$change_amount ($change_percent%)\n"
+        "  - 当地价格: $price_original $currency\n\n"
+    ),
+    'item_new_plans': Template(
+        "- **$country_name ($country) - $plan**\n"
+        "  - 价格: ¥$new_price\n"
+        "  - 当地价格: $price_original $currency\n\n"
+    ),
+    'item_removed_plans': Template(
+        "- **$country_name ($country) - $plan**\n"
+        "  - 原价格: ¥$old_price\n"
+        "  - 当地价格: $price_original $currency\n\n"
+    ),
+}
+
+HTML_TEMPLATES = {
+    'no_changes': Template('<section class="changelog-entry">\n<h2>$date</h2>\n'
+                           '<p>✅ <strong>无价格变化</strong> - 所有套餐价格保持稳定</p>\n</section>\n'),
+    'header': Template('<section class="changelog-entry">\n<h2>$date</h2>\n'),
+    'overview': Template('<p>📊 <strong>变化概览</strong>: $total 项变化</p>\n<ul class="overview">\n'),
+    'overview_price_increases': Template('<li>📈 涨价: $count 个套餐</li>\n'),
+    'overview_price_decreases': Template('<li>📉 降价: $count 个套餐</li>\n'),
+    'overview_new_plans': Template('<li>🆕 新增: $count 个套餐</li>\n'),
+    'overview_removed_plans': Template('<li>❌ 移除: $count 个套餐</li>\n'),
+    'overview_end': Template('</ul>\n'),
+    'section_price_increases': Template('<h3>📈 价格上涨</h3>\n<ul>\n'),
+    'section_price_decreases': Template('<h3>📉 价格下降</h3>\n<ul>\n'),
+    'section_new_plans': Template('<h3>🆕 新增套餐</h3>\n<ul>\n'),
+    'section_removed_plans': Template('<h3>❌ 移除套餐</h3>\n<ul>\n'),
+    'section_end': Template('</ul>\n'),
+    'item_price_increases': Template(
+        '<li><strong>$country_name ($country) - $plan</strong><br>'
+        '原价: ¥$old_price | 现价: ¥$new_price<br>'
+        '涨幅: ¥$change_amount (+$change_percent%)<br>'
+        '当地价格: $price_original $currency</li>\n'
+    ),
+    'item_price_decreases': Template(
+        '<li><strong>$country_name ($country) - $plan</strong><br>'
+        '原价: ¥$old_price | 现价: ¥$new_price<br>'
+        '降幅: ¥$change_amount ($change_percent%)<br>'
+        '当地价格: $price_original $currency</li>\n'
+    ),
+    'item_new_plans': Template(
+        '<li><strong>$country_name ($country) - $plan</strong><br>'
+        '价格: ¥$new_price<br>'
+        '当地价格: $price_original $currency</li>\n'
+    ),
+    'item_removed_plans': Template(
+        '<li><strong>$country_name ($country) - $plan</strong><br>'
+        '原价格: ¥$old_price<br>'
+        '当地价格: $price_original $currency</li>\n'
+    ),
+    'footer': Template('</section>\n'),
+}
+
+
+# 套餐条目模板中可用的字段，按位置传给编译后的格式字符串；金额字段带格式说明
+ITEM_FIELDS = {
+    'country_name': '{0}',
+    'country': '{1}',
+    'plan': '{2}',
+    'price_original': '{3}',
+    'currency': '{4}',
+    'old_price': '{5:.2f}',
+    'new_price': '{6:.2f}',
+    'change_amount': '{7:.2f}',
+    'change_percent': '{8:.1f}',
+}
+_PLACEHOLDER_RE = re.compile(r'\$(?:(\$)|(\w+)|\{(\w+)\})')
+
+
+def compile_template(template: Template, fields: Dict[str, str]) -> str:
+    """把 string.Template 一次性编译为 str.format 格式字符串，渲染时不再逐条构造字段字典"""
+    parts = _PLACEHOLDER_RE.split(template.template)
+    pieces = []
+    # split 结果依次为: 普通文本, 三个捕获组, 普通文本, ...
+    for i in range(0, len(parts), 4):
+        pieces.append(parts[i].replace('{', '{{').replace('}', '}}'))
+        if i + 1 < len(parts):
+            escaped, name, braced = parts[i + 1:i + 4]
+            pieces.append('$' if escaped else fields[name or braced])
+    return ''.join(pieces)
+
+
+class ChangelogRenderer:
+    def __init__(self, fmt: str = 'markdown'):
+        if fmt not in ('markdown', 'html'):
+            raise ValueError(f"不支持的输出格式: {fmt}")
+        self.fmt = fmt
+        self.templates = MARKDOWN_TEMPLATES if fmt == 'markdown' else HTML_TEMPLATES
+        self._escape = html.escape if fmt == 'html' else str
+        self._item_formats = {name: compile_template(self.templates[f'item_{name}'], ITEM_FIELDS)
+                              for name in BUCKETS}
+
+    def render(self, changes: List[Dict], date: str, sink: TextIO):
+        """把一次检测的变化逐节写入 sink"""
+        templates = self.templates
+        write = sink.write
+        escape = self._escape
+        date_text = self._escape(date)
+
+        if not changes:
+            write(templates['no_changes'].substitute(date=date_text))
+            return
+
+        buckets = bucket_changes(changes)
+        buckets['price_increases'].sort(key=lambda x: x['change_percent'], reverse=True)
+        buckets['price_decreases'].sort(key=lambda x: x['change_percent'])
+
+        write(templates['header'].substitute(date=date_text))
+        write(templates['overview'].substitute(total=len(changes)))
+        for name in BUCKETS:
+            if buckets[name]:
+                write(templates[f'overview_{name}'].substitute(count=len(buckets[name])))
+        write(templates['overview_end'].substitute())
+
+        for name in BUCKETS:
+            items = buckets[name]
+            if not items:
+                continue
+            write(templates[f'section_{name}'].substitute())
+            item_format = self._item_formats[name].format
+            for change in items:
+                change_amount = change.get('change_amount')
+                write(item_format(
+                    escape(str(change['country_name'])), escape(str(change['country'])),
+                    escape(str(change['plan'])), escape(str(change['price_original'])),
+                    escape(str(change['currency'])),
+                    change.get('old_price_cny'), change.get('new_price_cny'),
+                    abs(change_amount) if change_amount is not None else None, change.get('change_percent'),
+                ))
+            write(templates['section_end'].substitute())
+
+        if 'footer' in templates:
+            write(templates['footer'].substitute())
+
+    def render_to_string(self, changes: List[Dict], date: str) -> str:
+        buffer = io.StringIO()
+        self.render(changes, date, buffer)
+        return buffer.getvalue()
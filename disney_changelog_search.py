@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Disney+ 价格变化记录检索
+把 CHANGELOG.md 与 changelog_archive/*.md 中检测器写出的条目解析为结构化记录
+（国家、套餐、周期、变化类型、新旧 CNY 价格、当地价格），保存在 SQLite 索引 (changelog_index.sqlite3) 中。
+条目由 disney_changelog_splitter 定位，按内容哈希增量更新：文件未变化时不读取，
+变化的文件只解析新增的条目。检测器与归档器写入 Markdown 后自动刷新索引。
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import re
+import sqlite3
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from disney_changelog_splitter import load_offset_index
+from disney_plan_identity import canonical_plan_id
+
+INDEX_FILE = 'changelog_index.sqlite3'
+INDEX_VERSION = 1
+CHANGELOG_FILE = 'CHANGELOG.md'
+ARCHIVE_DIR = 'changelog_archive'
+ARCHIVE_FILE_RE = re.compile(r'^disney_changelog_\d{4}-\d{2}\.md$')
+
+CHANGE_TYPES = ('price_change', 'new_plan', 'removed_plan')
+# 查询时可用的类型：检测器的三种类型，再把价格变化细分为涨价/降价
+TYPE_FILTERS = CHANGE_TYPES + ('price_increase', 'price_decrease')
+PERIODS = {'月付': 'monthly', '年付': 'annual'}
+
+ENTRY_DATE_RE = re.compile(r'^## (\d{4}-\d{2}-\d{2}(?: \d{2}:\d{2}:\d{2})?)')
+SECTION_TYPES = {
+    '### 📈 价格上涨': ('price_change', 1),
+    '### 📉 价格下降': ('price_change', -1),
+    '### 🆕 新增套餐': ('new_plan', 0),
+    '### ❌ 移除套餐': ('removed_plan', 0),
+}
+ITEM_RE = re.compile(r'^- \*\*(?P<country_name>.+?) \((?P<country>[A-Z0-9]{2,3})\) - (?P<plan>.+)\*\*$')
+PLAN_PERIOD_RE = re.compile(r'^(?P<plan>.+)（(?P<period>月付|年付)）$')
+OLD_NEW_RE = re.compile(r'^ {2}- 原价: ¥(?P<old>-?[\d.]+) \| 现价: ¥(?P<new>-?[\d.]+)$')
+AMOUNT_RE = re.compile(r'^ {2}- [涨降]幅: ¥(?P<amount>[\d.]+) \((?P<percent>[+-]?[\d.]+)%\)$')
+NEW_PRICE_RE = re.compile(r'^ {2}- 价格: ¥(?P<new>-?[\d.]+)$')
+OLD_PRICE_RE = re.compile(r'^ {2}- 原价格: ¥(?P<old>-?[\d.]+)$')
+LOCAL_PRICE_RE = re.compile(r'^ {2}- 当地价格: (?P<local>.+)$')
+
+RESULT_COLUMNS = ('date', 'country', 'country_name', 'plan', 'plan_id', 'period', 'type',
+                  'old_price_cny', 'new_price_cny', 'change_amount', 'change_percent',
+                  'price_original', 'currency', 'source')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS sources (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER);
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    date TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    UNIQUE (source, digest)
+);
+CREATE TABLE IF NOT EXISTS changes (
+    entry_id INTEGER NOT NULL REFERENCES entries(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    country TEXT NOT NULL,
+    country_name TEXT,
+    plan TEXT NOT NULL,
+    plan_id TEXT,
+    period TEXT,
+    type TEXT NOT NULL,
+    old_price_cny REAL,
+    new_price_cny REAL,
+    change_amount REAL,
+    change_percent REAL,
+    price_original TEXT,
+    currency TEXT
+);
+CREATE INDEX IF NOT EXISTS changes_country ON changes (country, date);
+CREATE INDEX IF NOT EXISTS changes_type ON changes (type, date);
+CREATE INDEX IF NOT EXISTS changes_plan_id ON changes (plan_id, date);
+CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest);
+"""
+
+
+def parse_entry(text: str) -> List[Dict]:
+    """解析一个 ## 日期 条目中的全部变化；无变化或无法识别的条目返回空列表"""
+    changes = []
+    change_type, sign = None, 0
+    current = None
+    for line in text.splitlines():
+        if line.startswith('### '):
+            change_type, sign = SECTION_TYPES.get(line.strip(), (None, 0))
+            current = None
+            continue
+        if change_type is None:
+            continue
+
+        match = ITEM_RE.match(line)
+        if match:
+            plan, period = match.group('plan'), None
+            period_match = PLAN_PERIOD_RE.match(plan)
+            if period_match:
+                plan, period = period_match.group('plan'), PERIODS[period_match.group('period')]
+            current = {
+                'country': match.group('country'),
+                'country_name': match.group('country_name'),
+                'plan': plan,
+                'plan_id': canonical_plan_id(plan),
+                'period': period,
+                'type': change_type,
+                'old_price_cny': None,
+                'new_price_cny': None,
+                'change_amount': None,
+                'change_percent': None,
+                'price_original': None,
+                'currency': None,
+            }
+            changes.append(current)
+            continue
+        if current is None:
+            continue
+
+        match = OLD_NEW_RE.match(line)
+        if match:
+            current['old_price_cny'], current['new_price_cny'] = float(match.group('old')), float(match.group('new'))
+            continue
+        match = AMOUNT_RE.match(line)
+        if match:
+            # Markdown 中的幅度是绝对值，按小节恢复符号，与事件日志中的 change_amount 一致
+            current['change_amount'] = sign * float(match.group('amount'))
+            current['change_percent'] = sign * abs(float(match.group('percent')))
+            continue
+        match = NEW_PRICE_RE.match(line)
+        if match:
+            current['new_price_cny'] = float(match.group('new'))
+            continue
+        match = OLD_PRICE_RE.match(line)
+        if match:
+            current['old_price_cny'] = float(match.group('old'))
+            continue
+        match = LOCAL_PRICE_RE.match(line)
+        if match:
+            # 模板为 "$price_original $currency"，例如 "TRY 349.99 TRY"
+            local = match.group('local').rsplit(' ', 1)
+            current['price_original'] = local[0]
+            current['currency'] = local[1] if len(local) > 1 else None
+    return changes
+
+
+class DisneyChangelogIndex:
+    def __init__(self, index_file: str = INDEX_FILE, changelog_file: str = CHANGELOG_FILE,
+                 archive_dir: str = ARCHIVE_DIR):
+        self.index_file = index_file
+        self.changelog_file = changelog_file
+        self.archive_dir = archive_dir
+        self.conn = sqlite3.connect(index_file)
+        self.conn.execute('PRAGMA foreign_keys = ON')
+        self._ensure_schema()
+
+    def _ensure_schema(self):
+        row = None
+        try:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        except sqlite3.OperationalError:
+            pass
+        if row is None or row[0] != str(INDEX_VERSION):
+            # 索引只是 Markdown 的派生数据，结构变化时直接重建
+            self.conn.executescript('DROP TABLE IF EXISTS changes; DROP TABLE IF EXISTS entries;'
+                                    'DROP TABLE IF EXISTS sources; DROP TABLE IF EXISTS meta;')
+        self.conn.executescript(SCHEMA)
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (str(INDEX_VERSION),))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def source_files(self) -> List[str]:
+        """主 CHANGELOG 与全部月度归档"""
+        files = [self.changelog_file] if os.path.exists(self.changelog_file) else []
+        if os.path.isdir(self.archive_dir):
+            files += [os.path.join(self.archive_dir, name) for name in sorted(os.listdir(self.archive_dir))
+                      if ARCHIVE_FILE_RE.match(name)]
+        return files
+
+    def _refresh_source(self, path: str) -> Tuple[int, int]:
+        """按条目内容哈希同步一个文件，返回 (新增条目数, 删除条目数)"""
+        existing = dict(self.conn.execute('SELECT digest, id FROM entries WHERE source = ?', (path,)))
+        seen, added = set(), 0
+        entries = load_offset_index(path, persist=False)
+        if entries:
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for entry in entries:
+                    raw = mm[entry.offset:entry.offset + entry.length]
+                    digest = hashlib.sha1(raw).hexdigest()
+                    if digest in seen:
+                        continue
+                    seen.add(digest)
+                    if digest in existing:
+                        # 条目没有变化，只是在文件中的位置可能移动了
+                        self.conn.execute('UPDATE entries SET offset = ?, length = ? WHERE id = ?',
+                                          (entry.offset, entry.length, existing[digest]))
+                        continue
+                    text = raw.decode('utf-8')
+                    header = ENTRY_DATE_RE.match(text)
+                    date = header.group(1) if header else entry.date
+                    cursor = self.conn.execute(
+                        'INSERT INTO entries (source, digest, date, offset, length) VALUES (?, ?, ?, ?, ?)',
+                        (path, digest, date, entry.offset, entry.length))
+                    self.conn.executemany(
+                        'INSERT INTO changes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        [(cursor.lastrowid, position, date, c['country'], c['country_name'], c['plan'],
+                          c['plan_id'], c['period'], c['type'], c['old_price_cny'], c['new_price_cny'],
+                          c['change_amount'], c['change_percent'], c['price_original'], c['currency'])
+                         for position, c in enumerate(parse_entry(text))])
+                    added += 1
+
+        removed = [(entry_id,) for digest, entry_id in existing.items() if digest not in seen]
+        self.conn.executemany('DELETE FROM entries WHERE id = ?', removed)
+        return added, len(removed)
+
+    def refresh(self, rebuild: bool = False) -> Dict[str, int]:
+        """同步索引；大小与修改时间都未变化的文件直接跳过"""
+        stats = {'files': 0, 'scanned': 0, 'added': 0, 'removed': 0}
+        with self.conn:
+            if rebuild:
+                self.conn.execute('DELETE FROM entries')
+                self.conn.execute('DELETE FROM sources')
+            indexed = {path: (size, mtime_ns) for path, size, mtime_ns in self.conn.execute('SELECT * FROM sources')}
+            files = self.source_files()
+            stats['files'] = len(files)
+            for path in files:
+                stat = os.stat(path)
+                signature = (stat.st_size, stat.st_mtime_ns)
+                if indexed.get(path) == signature:
+                    continue
+                added, removed = self._refresh_source(path)
+                stats['scanned'] += 1
+                stats['added'] += added
+                stats['removed'] += removed
+                self.conn.execute('INSERT OR REPLACE INTO sources VALUES (?, ?, ?)', (path, *signature))
+            for path in set(indexed) - set(files):
+                self.conn.execute('DELETE FROM entries WHERE source = ?', (path,))
+                self.conn.execute('DELETE FROM sources WHERE path = ?', (path,))
+        return stats
+
+    def query(self, country: Optional[str] = None, change_type: Optional[str] = None,
+              plan: Optional[str] = None, period: Optional[str] = None, since: Optional[str] = None,
+              until: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        """按条件查询变化记录（最新的在前）。plan 可以是规范 ID 前缀（如 disney/premium）或名称片段；
+        since / until 为 YYYY-MM 或 YYYY-MM-DD，均包含边界"""
+        conditions, params = [], []
+        if country:
+            conditions.append('c.country = ?')
+            params.append(country.upper())
+        if change_type == 'price_increase':
+            conditions.append("c.type = 'price_change' AND c.change_amount > 0")
+        elif change_type == 'price_decrease':
+            conditions.append("c.type = 'price_change' AND c.change_amount < 0")
+        elif change_type:
+            conditions.append('c.type = ?')
+            params.append(change_type)
+        if plan:
+            conditions.append("(c.plan_id = ? OR c.plan_id LIKE ? OR c.plan LIKE ?)")
+            params += [plan, plan.rstrip('/') + '/%', f'%{plan}%']
+        if period:
+            conditions.append('c.period = ?')
+            params.append(period)
+        if since:
+            conditions.append('c.date >= ?')
+            params.append(since)
+        if until:
+            # '2026-03' 包含整个三月，'2026-03-31' 包含当天
+            conditions.append('substr(c.date, 1, ?) <= ?')
+            params += [len(until), until]
+        # 同一条目同时出现在主 CHANGELOG 和归档中时只返回一次
+        conditions.append('e.id IN (SELECT MIN(id) FROM entries GROUP BY digest)')
+
+        sql = (f"SELECT c.date, c.country, c.country_name, c.plan, c.plan_id, c.period, c.type, "
+               f"c.old_price_cny, c.new_price_cny, c.change_amount, c.change_percent, c.price_original, "
+               f"c.currency, e.source FROM changes c JOIN entries e ON e.id = c.entry_id "
+               f"WHERE {' AND '.join(conditions)} ORDER BY c.date DESC, c.entry_id, c.position")
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return [dict(zip(RESULT_COLUMNS, row)) for row in self.conn.execute(sql, params)]
+
+    def stats(self) -> Dict:
+        entries, first, last = self.conn.execute(
+            'SELECT COUNT(DISTINCT digest), MIN(date), MAX(date) FROM entries').fetchone()
+        by_type = dict(self.conn.execute(
+            'SELECT type, COUNT(*) FROM changes WHERE entry_id IN (SELECT MIN(id) FROM entries GROUP BY digest) '
+            'GROUP BY type'))
+        return {'entries': entries, 'first': first, 'last': last, 'changes': by_type,
+                'sources': self.conn.execute('SELECT COUNT(*) FROM sources').fetchone()[0]}
+
+
+def refresh_changelog_index(index_file: str = INDEX_FILE, changelog_file: str = CHANGELOG_FILE,
+                            archive_dir: str = ARCHIVE_DIR):
+    """检测器和归档器写入 Markdown 后调用；索引只是派生数据，失败时不影响主流程"""
+    try:
+        with DisneyChangelogIndex(index_file, changelog_file, archive_dir) as index:
+            stats = index.refresh()
+        if stats['scanned']:
+            print(f"✅ 变化记录索引已更新: 新增 {stats['added']} 个条目,移除 {stats['removed']} 个")
+    except (sqlite3.Error, OSError) as e:
+        print(f"⚠️ 更新变化记录索引失败: {e}")
+
+
+def format_change(change: Dict) -> str:
+    plan = change['plan'] + {'monthly': '（月付）', 'annual': '（年付）'}.get(change['period'], '')
+    head = f"{change['date']}  {change['country']:<3} {change['country_name']} - {plan}"
+    if change['type'] == 'price_change':
+        arrow = '📈' if (change['change_amount'] or 0) > 0 else '📉'
+        detail = f"{arrow} ¥{change['old_price_cny']:.2f} → ¥{change['new_price_cny']:.2f}"
+        if change['change_percent'] is not None:
+            detail += f" ({change['change_percent']:+.1f}%)"
+    elif change['type'] == 'new_plan':
+        detail = f"🆕 ¥{change['new_price_cny']:.2f}" if change['new_price_cny'] is not None else '🆕'
+    else:
+        detail = f"❌ ¥{change['old_price_cny']:.2f}" if change['old_price_cny'] is not None else '❌'
+    local = f"  [{change['price_original']}]" if change['price_original'] else ''
+    return f"{head}  {detail}{local}"
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='检索 Disney+ 价格变化记录')
+    parser.add_argument('--index', default=INDEX_FILE, help=f'索引文件 (默认: {INDEX_FILE})')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    refresh_parser = subparsers.add_parser('refresh', help='增量更新索引')
+    refresh_parser.add_argument('--rebuild', action='store_true', help='丢弃现有索引并重新解析全部文件')
+
+    subparsers.add_parser('stats', help='索引概况')
+
+    query_parser = subparsers.add_parser('query', help='查询变化记录')
+    query_parser.add_argument('--country', help='国家代码，如 TR')
+    query_parser.add_argument('--type', dest='change_type', choices=TYPE_FILTERS, help='变化类型')
+    query_parser.add_argument('--plan', help='规范套餐 ID（前缀）或名称片段，如 disney/premium')
+    query_parser.add_argument('--period', choices=sorted(PERIODS.values()), help='计费周期')
+    query_parser.add_argument('--since', help='起始日期 YYYY-MM[-DD]')
+    query_parser.add_argument('--until', help='结束日期 YYYY-MM[-DD]（包含）')
+    query_parser.add_argument('--limit', type=int, help='最多返回条数')
+    query_parser.add_argument('--json', action='store_true', help='以 JSON 输出')
+    query_parser.add_argument('--no-refresh', action='store_true', help='查询前不检查文件变化')
+
+    args = parser.parse_args(argv)
+    with DisneyChangelogIndex(args.index) as index:
+        if args.command == 'refresh':
+            start = time.perf_counter()
+            stats = index.refresh(rebuild=args.rebuild)
+            print(f"✅ 检查 {stats['files']} 个文件,重新扫描 {stats['scanned']} 个,新增 {stats['added']} 个条目,"
+                  f"移除 {stats['removed']} 个,耗时 {(time.perf_counter() - start) * 1000:.1f} ms")
+        elif args.command == 'stats':
+            stats = index.stats()
+            print(f"索引: {args.index} ({stats['sources']} 个文件)")
+            print(f"条目: {stats['entries']} ({stats['first']} ~ {stats['last']})")
+            for change_type in CHANGE_TYPES:
+                print(f"  {change_type:<13} {stats['changes'].get(change_type, 0)}")
+        elif args.command == 'query':
+            if not args.no_refresh:
+                index.refresh()
+            start = time.perf_counter()
+            results = index.query(args.country, args.change_type, args.plan, args.period,
+                                  args.since, args.until, args.limit)
+            elapsed = (time.perf_counter() - start) * 1000
+            if args.json:
+                print(json.dumps(results, ensure_ascii=False, indent=2))
+                return
+            for change in results:
+                print(format_change(change))
+            print(f"共 {len(results)} 条,查询耗时 {elapsed:.1f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Disney+ CHANGELOG 条目切分器
+用 mmap 单遍扫描 Markdown，记录每个 ## YYYY-MM-DD 条目的 (日期, 字节偏移, 长度)，
+并把偏移索引持久化到 <文件名>.offsets.json，方便其他工具直接定位到某天的条目
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import re
+import sys
+from datetime import datetime
+from typing import List, NamedTuple, Optional
+
+# 条目只会在下一个一级/二级标题处结束（### 小节标题属于条目内容）
+HEADING_RE = re.compile(rb'^#{1,2} ', re.MULTILINE)
+# 匹配格式如: ## 2025-08-05 14:30:22 或 ## 2025-08-05
+ENTRY_RE = re.compile(rb'## (\d{4}-\d{2}-\d{2})')
+
+
+class ChangelogEntry(NamedTuple):
+    date: str
+    offset: int
+    length: int
+
+
+def index_path_for(path: str) -> str:
+    """CHANGELOG.md -> CHANGELOG.offsets.json"""
+    return os.path.splitext(path)[0] + '.offsets.json'
+
+
+def _valid_date(date: str) -> bool:
+    try:
+        datetime.strptime(date, '%Y-%m-%d')
+        return True
+    except ValueError:
+        return False
+
+
+def split_buffer(buffer) -> List[ChangelogEntry]:
+    """在 bytes/mmap 上单遍查找所有日期条目"""
+    entries = []
+    current_date = None
+    current_start = 0
+
+    for match in HEADING_RE.finditer(buffer):
+        position = match.start()
+        if current_date is not None:
+            # 条目不包含下一个标题前的换行符
+            entries.append(ChangelogEntry(current_date, current_start, position - 1 - current_start))
+            current_date = None
+
+        entry_match = ENTRY_RE.match(buffer, position)
+        if entry_match:
+            date = entry_match.group(1).decode('ascii')
+            if _valid_date(date):
+                current_date = date
+                current_start = position
+
+    if current_date is not None:
+        entries.append(ChangelogEntry(current_date, current_start, len(buffer) - current_start))
+    return entries
+
+
+def split_changelog(path: str) -> List[ChangelogEntry]:
+    """对文件做 mmap 后切分；文件不存在或为空时返回空列表"""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return []
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return split_buffer(mm)
+
+
+def file_signature(path: str) -> dict:
+    """文件大小与内容哈希；不依赖 mtime，git 检出或复制之后索引仍然有效"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return {'size': os.path.getsize(path), 'sha256': digest.hexdigest()}
+
+
+def write_offset_index(path: str, entries: List[ChangelogEntry], signature: Optional[dict] = None) -> str:
+    """把偏移索引写入 <文件名>.offsets.json"""
+    index_file = index_path_for(path)
+    index = {
+        'source': os.path.basename(path),
+        **(signature or file_signature(path)),
+        'entries': [list(entry) for entry in entries],
+    }
+    tmp_file = index_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_file, index_file)
+    return index_file
+
+
+def load_offset_index(path: str, persist: bool = True) -> List[ChangelogEntry]:
+    """读取偏移索引；索引缺失或文件已变化时重新切分（persist 时同时更新索引文件）"""
+    if not os.path.exists(path):
+        return []
+
+    index_file = index_path_for(path)
+    signature = None
+    try:
+        with open(index_file, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        # 先比较大小，大小一致时才计算内容哈希
+        if index.get('size') == os.path.getsize(path):
+            signature = file_signature(path)
+            if index.get('sha256') == signature['sha256']:
+                return [ChangelogEntry(*entry) for entry in index['entries']]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError):
+        pass
+
+    entries = split_changelog(path)
+    if persist:
+        write_offset_index(path, entries, signature)
+    return entries
+
+
+def read_entry(path: str, entry: ChangelogEntry) -> str:
+    """按偏移直接读取一个条目"""
+    with open(path, 'rb') as f:
+        f.seek(entry.offset)
+        return f.read(entry.length).decode('utf-8')
+
+
+def find_entries(path: str, date: str) -> List[str]:
+    """返回某一天（YYYY-MM-DD）的全部条目"""
+    return [read_entry(path, entry) for entry in load_offset_index(path) if entry.date == date]
+
+
+def main(argv: Optional[List[str]] = None):
+    """用法: python disney_changelog_splitter.py [文件] [YYYY-MM-DD]"""
+    args = sys.argv[1:] if argv is None else argv
+    path = args[0] if args else 'CHANGELOG.md'
+
+    if len(args) > 1:
+        for entry in find_entries(path, args[1]):
+            print(entry)
+        return
+
+    entries = load_offset_index(path)
+    print(f"✅ {path}: {len(entries)} 个条目，索引已写入 {index_path_for(path)}")
+    for entry in entries:
+        print(f"  {entry.date}  offset={entry.offset}  length={entry.length}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Disney+ 帮助中心 HTML 片段存储
+爬虫把每个国家抓到的 HowTo_Details__c 片段按 sha256 去重保存到 html_fragments/objects/，
+manifest.json 记录每个国家最近一次抓取对应的片段、locale 与 LastPublishedDate。
+修改 extract_price 之后用 reparse 离线、并行地重新生成 disneyplus_prices.json，不需要重新启动 Chromium 抓取；
+保存下来的真实片段同时作为解析器基准测试的语料。
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+FRAGMENT_DIR = 'html_fragments'
+MANIFEST_VERSION = 1
+
+
+def fragment_digest(html: str) -> str:
+    return hashlib.sha256(html.encode('utf-8')).hexdigest()
+
+
+class DisneyFragmentStore:
+    def __init__(self, root: str = FRAGMENT_DIR, manifest_name: str = 'manifest.json'):
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        # 分片抓取时每个分片写自己的清单，合并时再并入 manifest.json
+        self.manifest_file = os.path.join(root, manifest_name)
+        self.countries: Dict[str, Dict[str, Any]] = self._load_manifest()
+
+    def _load_manifest(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        return manifest.get('countries', {})
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], f"{digest}.html")
+
+    def write_object(self, html: str) -> str:
+        """保存片段内容，已存在相同内容时不重复写入，返回 sha256"""
+        digest = fragment_digest(html)
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 多个线程可能同时写入相同内容，临时文件按线程区分
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+                f.write(html)
+            os.replace(tmp_path, path)
+        return digest
+
+    def read_object(self, digest: str) -> str:
+        with open(self.object_path(digest), 'r', encoding='utf-8', newline='') as f:
+            return f.read()
+
+    def put(self, country_code: str, html: str, locale_code: Optional[str] = None,
+            last_published_date: Optional[str] = None) -> str:
+        """保存一个国家本次抓取到的片段并更新内存中的清单，由调用方在抓取结束后统一 save_manifest。
+        片段内容没有变化时保留原来的 fetched_at，清单不会因为重新抓取到相同内容而改变"""
+        digest = self.write_object(html)
+        previous = self.countries.get(country_code) or {}
+        self.countries[country_code] = {
+            'sha256': digest,
+            'locale': locale_code,
+            'last_published_date': last_published_date,
+            'fetched_at': (previous.get('fetched_at') if previous.get('sha256') == digest else None)
+                          or datetime.now().isoformat(timespec='seconds'),
+        }
+        return digest
+
+    def save_manifest(self, order: Optional[Iterable[str]] = None):
+        """写出清单；给定 order 时按该顺序（如国家列表顺序）排列，其余国家排在后面"""
+        if order is not None:
+            order = [code for code in order if code in self.countries]
+            order += [code for code in self.countries if code not in order]
+            self.countries = {code: self.countries[code] for code in order}
+        os.makedirs(self.root, exist_ok=True)
+        tmp_file = self.manifest_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'countries': self.countries}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.manifest_file)
+
+    def all_digests(self) -> List[str]:
+        """objects/ 中的全部片段（包含已不在清单中的历史版本）"""
+        digests = []
+        if not os.path.isdir(self.objects_dir):
+            return digests
+        for prefix in sorted(os.listdir(self.objects_dir)):
+            directory = os.path.join(self.objects_dir, prefix)
+            if os.path.isdir(directory):
+                digests += sorted(name[:-5] for name in os.listdir(directory) if name.endswith('.html'))
+        return digests
+
+    def corpus(self) -> List[str]:
+        """基准测试语料：全部去重后的真实片段"""
+        return [self.read_object(digest) for digest in self.all_digests()]
+
+
+def _parse_fragment(path: str) -> List[Dict[str, Any]]:
+    # 在子进程中运行；disney 模块较重，只在需要解析时导入
+    from disney import extract_price
+
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return extract_price(f.read())
+
+
+def reparse(store: DisneyFragmentStore, countries: Optional[List[str]] = None,
+            workers: Optional[int] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """用保存的片段重新生成原始价格数据（与 disney.main 的输出结构相同）"""
+    selected = [code for code in store.countries if not countries or code in countries]
+    # 相同内容的片段只解析一次
+    digests = list(dict.fromkeys(store.countries[code]['sha256'] for code in selected))
+    paths = [store.object_path(digest) for digest in digests]
+    if workers == 1 or len(paths) < 2:
+        parsed = dict(zip(digests, map(_parse_fragment, paths)))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            parsed = dict(zip(digests, executor.map(_parse_fragment, paths, chunksize=4)))
+
+    results = {}
+    for code in selected:
+        entry = store.countries[code]
+        plans = [dict(plan) for plan in parsed[entry['sha256']]]
+        for plan in plans:
+            plan['last_published_date'] = entry.get('last_published_date')
+        results[code] = plans
+    return results
+
+
+def diff_raw(old: Dict[str, Any], new: Dict[str, Any]) -> Tuple[List[str], List[str], List[str]]:
+    """返回 (新增国家, 删除国家, 套餐有变化的国家)"""
+    added = [code for code in new if code not in old]
+    removed = [code for code in old if code not in new]
+    changed = [code for code in new if code in old and old[code] != new[code]]
+    return added, removed, changed
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Disney+ 帮助中心 HTML 片段存储')
+    parser.add_argument('--root', default=FRAGMENT_DIR, help=f'片段目录 (默认: {FRAGMENT_DIR})')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('list', help='列出清单中每个国家的片段')
+
+    reparse_parser = subparsers.add_parser('reparse', help='用保存的片段离线重新生成原始价格数据')
+    reparse_parser.add_argument('--output', default='disneyplus_prices.json', help='输出文件 (默认: disneyplus_prices.json)')
+    reparse_parser.add_argument('--countries', nargs='+', help='只重新解析这些国家')
+    reparse_parser.add_argument('--workers', type=int, help='解析进程数 (默认: CPU 核数)')
+    reparse_parser.add_argument('--dry-run', action='store_true', help='只与现有输出文件对比，不写入')
+
+    args = parser.parse_args(argv)
+    store = DisneyFragmentStore(args.root)
+    if not store.countries:
+        print(f"❌ {store.manifest_file} 中没有片段记录,请先运行一次爬虫")
+        sys.exit(1)
+
+    if args.command == 'list':
+        for code, entry in store.countries.items():
+            size = os.path.getsize(store.object_path(entry['sha256']))
+            print(f"  {code:<3} {entry['sha256'][:12]}  {size / 1024:6.1f} KB  {entry.get('locale') or '-':<6} "
+                  f"发布 {entry.get('last_published_date') or '-'}  抓取 {entry.get('fetched_at')}")
+        print(f"共 {len(store.countries)} 个国家,{len(store.all_digests())} 个不同片段")
+        return
+
+    start = time.perf_counter()
+    results = reparse(store, args.countries, args.workers)
+    elapsed = time.perf_counter() - start
+    print(f"✅ 重新解析 {len(results)} 个国家,共 {sum(len(plans) for plans in results.values())} 个套餐,"
+          f"耗时 {elapsed:.2f} 秒")
+
+    old = {}
+    if os.path.exists(args.output):
+        with open(args.output, 'r', encoding='utf-8') as f:
+            old = json.load(f)
+    if args.countries:
+        # 只替换指定国家，其余国家保持原样
+        results = {**old, **results}
+    added, removed, changed = diff_raw(old, results)
+    print(f"与 {args.output} 相比: 新增 {len(added)} 个国家,删除 {len(removed)} 个,套餐有变化 {len(changed)} 个")
+    for label, codes in (('新增', added), ('删除', removed), ('变化', changed)):
+        if codes:
+            print(f"  {label}: {', '.join(codes)}")
+
+    if args.dry_run:
+        return
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Disney+ 历史数据回填（从 git 对象库）
+用一次 `git log --raw` 找出 disneyplus_prices*.json 与 archive/ 下归档文件的每个历史版本（blob），
+再用一个 `git cat-file --batch` 进程批量读取，不需要逐个 checkout 提交，也不需要网络。
+每个 blob 只读取和解析一次；归档文件使用文件名中的时间戳，根目录文件使用提交时间。
+同一次运行会把相同内容同时写进根目录文件和归档/快照，这类根目录版本会被跳过。
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from disney_snapshot_store import KINDS, DisneySnapshotStore, object_digest, parse_archive_filename
+
+ROOT_FILES = {
+    'disneyplus_prices.json': 'raw',
+    'disneyplus_prices_processed.json': 'processed',
+}
+ARCHIVE_DIR = 'archive'
+NULL_SHA = '0' * 40
+# 归档或快照与提交时间相差在这个范围内、且内容相同时，视为同一次运行的结果
+SAME_RUN_WINDOW = timedelta(hours=2)
+
+
+class BlobVersion(NamedTuple):
+    blob: str
+    kind: str
+    ts: str
+    source: str   # 'archive'：时间戳来自归档文件名；'commit'：时间戳来自提交时间
+    path: str
+    commit: str
+
+
+def _git(repo: str, *args: str) -> List[str]:
+    return ['git', '-C', repo, '-c', 'core.quotepath=off', *args]
+
+
+def commit_timestamp(epoch: int) -> str:
+    # 工作流在 UTC 环境运行，归档文件名中的时间戳也是 UTC
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime('%Y%m%d_%H%M%S')
+
+
+def parse_timestamp(ts: str) -> datetime:
+    return datetime.strptime(ts, '%Y%m%d_%H%M%S')
+
+
+def same_run(ts: str, others) -> bool:
+    moment = parse_timestamp(ts)
+    return any(abs(parse_timestamp(other) - moment) <= SAME_RUN_WINDOW for other in others)
+
+
+def list_blob_versions(repo: str = '.', rev: str = 'HEAD') -> List[BlobVersion]:
+    """按提交时间顺序列出所有价格文件的历史版本"""
+    output = subprocess.run(
+        _git(repo, 'log', rev, '--reverse', '--raw', '--no-abbrev', '--no-renames', '--format=@%H %ct',
+             '--', *ROOT_FILES, ARCHIVE_DIR),
+        check=True, capture_output=True, text=True, encoding='utf-8',
+    ).stdout
+
+    versions = []
+    commit, epoch = None, 0
+    for line in output.splitlines():
+        if line.startswith('@'):
+            commit, epoch = line[1:].split()
+            epoch = int(epoch)
+            continue
+        if not line.startswith(':'):
+            continue
+        meta, path = line[1:].split('\t', 1)
+        _, _, _, new_blob, status = meta.split()
+        if status.startswith('D') or new_blob == NULL_SHA:
+            continue
+
+        if path in ROOT_FILES:
+            versions.append(BlobVersion(new_blob, ROOT_FILES[path], commit_timestamp(epoch), 'commit', path, commit))
+        elif path.startswith(ARCHIVE_DIR + '/'):
+            parsed = parse_archive_filename(path)
+            if parsed:
+                versions.append(BlobVersion(new_blob, parsed[0], parsed[1], 'archive', path, commit))
+    return versions
+
+
+def plan_backfill(versions: List[BlobVersion]) -> List[BlobVersion]:
+    """归档文件每个 (类型, 时间戳) 保留一个版本；根目录文件与同一次运行的归档文件 blob 相同时跳过。
+    价格改回旧值时根目录文件会重新出现旧的 blob，这种版本仍然保留"""
+    archive_times: Dict[Tuple[str, str], List[str]] = {}
+    for version in versions:
+        if version.source == 'archive':
+            archive_times.setdefault((version.kind, version.blob), []).append(version.ts)
+
+    planned: Dict[Tuple[str, str], BlobVersion] = {}
+    for version in versions:
+        if version.source == 'archive':
+            # 归档文件不可变；同一文件被改写时以最后一个版本为准
+            planned[(version.kind, version.ts)] = version
+        elif not same_run(version.ts, archive_times.get((version.kind, version.blob), [])):
+            planned.setdefault((version.kind, version.ts), version)
+    return sorted(planned.values(), key=lambda v: (v.ts, KINDS.index(v.kind)))
+
+
+def iter_blobs(repo: str, blobs: List[str]):
+    """用一个 git cat-file --batch 进程依次产出 (blob, 内容)；写入请求放在后台线程，避免管道写满互相等待"""
+    process = subprocess.Popen(_git(repo, 'cat-file', '--batch'), stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def feed():
+        try:
+            for blob in blobs:
+                process.stdin.write(blob.encode('ascii') + b'\n')
+        finally:
+            process.stdin.close()
+
+    writer = threading.Thread(target=feed, daemon=True)
+    writer.start()
+    try:
+        for _ in blobs:
+            header = process.stdout.readline().decode('ascii').split()
+            if len(header) != 3:
+                raise RuntimeError(f"git cat-file 返回了无法识别的内容: {' '.join(header)}")
+            blob, _, size = header
+            content = process.stdout.read(int(size))
+            process.stdout.read(1)  # 每个对象后面的换行
+            yield blob, content
+    finally:
+        writer.join()
+        process.stdout.close()
+        process.wait()
+
+
+def existing_signatures(store: DisneySnapshotStore) -> Dict[str, Dict[Tuple, List[str]]]:
+    """{类型: {快照内容签名: [时间戳]}}"""
+    signatures: Dict[str, Dict[Tuple, List[str]]] = {kind: {} for kind in KINDS}
+    for kind in KINDS:
+        for ts in store.list_snapshots(kind, include_archive=False):
+            signatures[kind].setdefault(store.manifest_signature(ts, kind), []).append(ts)
+    return signatures
+
+
+def backfill(repo: str = '.', rev: str = 'HEAD', store: Optional[DisneySnapshotStore] = None,
+             dry_run: bool = False) -> Dict[str, int]:
+    store = store or DisneySnapshotStore()
+    start = time.perf_counter()
+    versions = list_blob_versions(repo, rev)
+    planned = plan_backfill(versions)
+    stats = {'versions': len(versions), 'planned': len(planned), 'blobs': 0, 'added': 0,
+             'existing': 0, 'duplicate': 0, 'invalid': 0}
+
+    pending = [v for v in planned if not store.has_snapshot(v.ts, v.kind)]
+    stats['existing'] = len(planned) - len(pending)
+    by_blob: Dict[str, List[BlobVersion]] = {}
+    for version in pending:
+        by_blob.setdefault(version.blob, []).append(version)
+
+    signatures = existing_signatures(store)
+    for blob, content in iter_blobs(repo, list(by_blob)):
+        stats['blobs'] += 1
+        try:
+            data = json.loads(content.decode('utf-8'))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            stats['invalid'] += len(by_blob[blob])
+            print(f"⚠️ 跳过无法解析的版本: {blob[:12]} ({by_blob[blob][0].path})")
+            continue
+        if not isinstance(data, dict):
+            stats['invalid'] += len(by_blob[blob])
+            continue
+
+        signature = tuple((key, object_digest(value)) for key, value in data.items())
+        for version in by_blob[blob]:
+            # 提交时间对应的版本与同一次运行写入的快照内容相同时不再重复保存
+            if version.source == 'commit' and same_run(version.ts, signatures[version.kind].get(signature, [])):
+                stats['duplicate'] += 1
+                continue
+            if dry_run:
+                print(f"  {version.kind:<9} {version.ts}  {version.source:<7} {version.commit[:10]}  {version.path}")
+            else:
+                store.add_snapshot(data, version.ts, version.kind)
+            signatures[version.kind].setdefault(signature, []).append(version.ts)
+            stats['added'] += 1
+
+    stats['seconds'] = round(time.perf_counter() - start, 2)
+    return stats
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='从 git 历史回填 Disney+ 价格快照')
+    parser.add_argument('--repo', default='.', help='git 仓库路径 (默认: 当前目录)')
+    parser.add_argument('--rev', default='HEAD', help='从哪个提交开始回溯 (默认: HEAD)')
+    parser.add_argument('--root', default='snapshot_store', help='快照存储目录 (默认: snapshot_store)')
+    parser.add_argument('--dry-run', action='store_true', help='只列出将要写入的快照')
+    args = parser.parse_args(argv)
+
+    store = DisneySnapshotStore(args.root)
+    try:
+        stats = backfill(args.repo, args.rev, store, dry_run=args.dry_run)
+    except subprocess.CalledProcessError as e:
+        print(f"❌ git 命令失败: {e.stderr.strip() if e.stderr else e}", file=sys.stderr)
+        sys.exit(1)
+
+    action = '将写入' if args.dry_run else '新增'
+    print(f"🎉 回填完成: {stats['versions']} 个历史版本,读取 {stats['blobs']} 个 blob,{action} {stats['added']} 个快照,"
+          f"已存在 {stats['existing']} 个,内容重复 {stats['duplicate']} 个,无法解析 {stats['invalid']} 个,"
+          f"耗时 {stats['seconds']} 秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Disney+ 帮助中心本地模拟服务
+实现爬虫用到的接口：getCountryLanguageLocalization、/webruntime/api/apex/execute 上的 loadArticle，
+以及一个加载后会发出 loadArticle 请求的最小文章页面。国家与 locale 数量、延迟、错误率、
+限流容量和价格片段大小均可配置；loadtest 命令以逐级增加的并发驱动 disney.py 抓取模拟服务，
+报告吞吐量和尾延迟，用来评估单个 runner 能扩展到多大并发。
+"""
+
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import json
+import os
+import random
+import shutil
+import string
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import product
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from disney_fragment_store import DisneyFragmentStore
+from disney_rate_limiter import DisneyRateLimiter, percentile
+
+PLAN_NAMES = [
+    'Disney+ Basic',
+    'Disney+ Standard with Ads',
+    'Disney+ Standard',
+    'Disney+ Premium',
+    'Disney+, Hulu Bundle Basic',
+    'Disney+, Hulu, ESPN+ Bundle Premium',
+]
+CURRENCIES = ['USD', 'EUR', 'GBP', 'JPY', 'KRW', 'BRL', 'INR', 'AUD']
+
+
+def synthetic_country_codes(count: int) -> List[str]:
+    """AA, AB, ... 最多 676 个两位国家代码"""
+    codes = [''.join(pair) for pair in product(string.ascii_uppercase, repeat=2)]
+    if count > len(codes):
+        raise ValueError(f"最多支持 {len(codes)} 个国家")
+    return codes[:count]
+
+
+class MockHelpCenter:
+    def __init__(self, countries: int = 80, locales: int = 20, latency: float = 0.05,
+                 error_rate: float = 0.0, capacity: Optional[int] = None, plans: int = 4,
+                 padding: int = 0, seed: int = 0, port: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.capacity = capacity
+        self.random = random.Random(seed)
+        self.country_codes = synthetic_country_codes(countries)
+        self.locales = [f"en-{code.lower()}" for code in self.country_codes[:max(min(locales, countries), 1)]]
+        self.country_locale = {code: self.locales[i % len(self.locales)] for i, code in enumerate(self.country_codes)}
+        self.article_ids = {
+            locale: 'ka0' + hashlib.sha1(locale.encode('utf-8')).hexdigest()[:15] for locale in self.locales
+        }
+        self.fragments = {code: self._fragment(code, plans, padding) for code in self.country_codes}
+
+        self.inflight = 0
+        self.counts: Dict[str, int] = {}
+        self.latencies: List[float] = []
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def _fragment(self, code: str, plans: int, padding: int) -> str:
+        currency = CURRENCIES[sum(map(ord, code)) % len(CURRENCIES)]
+        rows = ['<tr><th>Plan</th><th>Features</th><th>Price</th></tr>']
+        for i in range(plans):
+            name = PLAN_NAMES[i % len(PLAN_NAMES)]
+            monthly = round(self.random.uniform(3, 30), 2)
+            rows.append(f"<tr><td>{name}</td><td>HD</td><td>{currency} {monthly:.2f}/month<br>"
+                        f"{currency} {monthly * 10:.2f}/year</td></tr>")
+        # 填充文字用于模拟较大的文章片段
+        filler = f"<p>{'Lorem ipsum dolor sit amet. ' * (padding // 28 + 1)}</p>"[:padding] if padding else ''
+        return f"<h2>Disney+ in {code}</h2><table>{''.join(rows)}</table>{filler}"
+
+    def reset_stats(self):
+        with self._lock:
+            self.counts = {}
+            self.latencies = []
+
+    def localization(self) -> Dict:
+        return {
+            code: {'lanInfo': [{'localeCode': self.country_locale[code], 'masterLabel': f"{code}_en"}]}
+            for code in self.country_codes
+        }
+
+    def article_page(self, locale: str) -> str:
+        body = json.dumps({
+            'namespace': '', 'classname': '@udd/01p5f00000ebl3g', 'method': 'loadArticle',
+            'isContinuation': False, 'params': {'articleId': self.article_ids[locale], 'brand': 'Disney'},
+            'cacheable': False,
+        })
+        return (
+            "<!DOCTYPE html><html><head><title>Disney+ Price</title></head><body>"
+            f"<script>fetch('/{locale}/webruntime/api/apex/execute', {{method: 'POST', "
+            f"headers: {{'Content-Type': 'application/json'}}, body: JSON.stringify({body})}});</script>"
+            "</body></html>"
+        )
+
+    def load_article(self, locale: str, payload: Dict):
+        params = payload.get('params', {})
+        country = params.get('country')
+        if params.get('articleId') != self.article_ids.get(locale):
+            return 404, {'error': 'article not found'}
+        if country is None:
+            # 文章页面自己发出的请求，只需要成功返回
+            return 200, {'returnValue': {}}
+        if country not in self.fragments:
+            return 404, {'error': f'unknown country {country}'}
+        return 200, {'returnValue': {
+            'HowTo_Details__c': self.fragments[country],
+            'LastPublishedDate': '2026-01-01T00:00:00.000Z',
+        }}
+
+    def _make_handler(self):
+        center = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _route(self, method: str):
+                url = urlparse(self.path)
+                parts = [part for part in url.path.split('/') if part]
+                locale = parts[0] if parts else ''
+                if method == 'GET' and parts[1:] == ['webruntime', 'api', 'apex', 'execute']:
+                    if parse_qs(url.query).get('method') == ['getCountryLanguageLocalization']:
+                        return 'localization', 200, 'application/json', {'returnValue': center.localization()}
+                if method == 'GET' and parts[1:] == ['article', 'disneyplus-price'] and locale in center.article_ids:
+                    return 'article_page', 200, 'text/html; charset=utf-8', center.article_page(locale)
+                if method == 'POST' and parts[1:] == ['webruntime', 'api', 'apex', 'execute']:
+                    length = int(self.headers.get('Content-Length') or 0)
+                    try:
+                        payload = json.loads(self.rfile.read(length) or b'{}')
+                    except ValueError:
+                        return 'bad_request', 400, 'application/json', {'error': 'invalid json'}
+                    if payload.get('method') == 'loadArticle':
+                        status, body = center.load_article(locale, payload)
+                        return 'load_article', status, 'application/json', body
+                return 'not_found', 404, 'application/json', {'error': 'not found'}
+
+            def _handle(self, method: str):
+                start = time.monotonic()
+                with center._lock:
+                    center.inflight += 1
+                    load = center.inflight
+                endpoint, status = 'error', 500
+                try:
+                    endpoint, status, content_type, body = self._route(method)
+                    if center.latency > 0:
+                        time.sleep(center.random.expovariate(1 / center.latency))
+                    headers = {}
+                    if center.capacity and load > center.capacity:
+                        status, body, headers = 429, {'error': 'too many requests'}, {'Retry-After': '1'}
+                    elif status == 200 and center.random.random() < center.error_rate:
+                        status, body = 500, {'error': 'injected error'}
+                    if isinstance(body, str) and status == 200:
+                        data = body.encode('utf-8')
+                    else:
+                        content_type = 'application/json'
+                        data = json.dumps(body).encode('utf-8')
+
+                    self.send_response(status)
+                    self.send_header('Content-Type', content_type)
+                    self.send_header('Content-Length', str(len(data)))
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.end_headers()
+                    self.wfile.write(data)
+                finally:
+                    with center._lock:
+                        center.inflight -= 1
+                        key = f"{endpoint} {status}"
+                        center.counts[key] = center.counts.get(key, 0) + 1
+                        center.latencies.append(time.monotonic() - start)
+
+            def do_GET(self):
+                self._handle('GET')
+
+            def do_POST(self):
+                self._handle('POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+async def scrape_once(center: MockHelpCenter, limiter: DisneyRateLimiter) -> Dict:
+    """以给定的限流器对模拟服务完整运行一次 disney.main"""
+    import disney
+
+    disney.HELP_CENTER_URL = center.url
+    center.reset_stats()
+    work_dir = tempfile.mkdtemp(prefix='disney_loadtest_')
+    checkpoint_file = os.path.join(work_dir, 'checkpoint.jsonl')
+    # 压测抓到的片段写到临时目录，不混进真实的片段存储
+    fragments = DisneyFragmentStore(os.path.join(work_dir, 'html_fragments'))
+    start = time.monotonic()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        results = await disney.main(checkpoint_file=checkpoint_file, limiter=limiter, fragments=fragments)
+    elapsed = time.monotonic() - start
+    shutil.rmtree(work_dir)
+
+    host = limiter.summary().get(disney.help_center_host(), {})
+    return {
+        'elapsed_seconds': round(elapsed, 3),
+        'countries': len(results),
+        'failed_countries': len(center.country_codes) - len(results),
+        'countries_per_second': round(len(results) / elapsed, 2) if elapsed > 0 else None,
+        'requests_per_second': round(host.get('completed', 0) / elapsed, 2) if elapsed > 0 else None,
+        'latency': host.get('latency_percentiles', {}),
+        'settled_limit': host.get('settled_limit'),
+        'client_outcomes': host.get('outcomes', {}),
+        'server_counts': dict(sorted(center.counts.items())),
+        'server_p99': round(percentile(center.latencies, 99) or 0, 4),
+    }
+
+
+def run_loadtest(center: MockHelpCenter, levels: List[int], adaptive: bool) -> List[Dict]:
+    rows = []
+    for level in levels:
+        # 固定并发：初始、最小、最大并发相同
+        limiter = DisneyRateLimiter(initial_limit=level, min_limit=level, max_limit=level, verbose=False)
+        rows.append({'concurrency': level, **asyncio.run(scrape_once(center, limiter))})
+    if adaptive:
+        limiter = DisneyRateLimiter(max_limit=max(levels), verbose=False)
+        rows.append({'concurrency': 'adaptive', **asyncio.run(scrape_once(center, limiter))})
+    return rows
+
+
+def print_rows(rows: List[Dict]):
+    fmt_ms = lambda v: f"{v * 1000:.0f}" if v is not None else "-"
+    print(f"{'并发':>8}{'耗时(s)':>10}{'国家/秒':>10}{'请求/秒':>10}{'p50(ms)':>10}{'p95(ms)':>10}"
+          f"{'p99(ms)':>10}{'失败国家':>10}{'稳定并发':>10}")
+    for row in rows:
+        latency = row['latency']
+        print(f"{row['concurrency']!s:>8}{row['elapsed_seconds']:>10.2f}{row['countries_per_second']!s:>10}"
+              f"{row['requests_per_second']!s:>10}{fmt_ms(latency.get('p50')):>10}{fmt_ms(latency.get('p95')):>10}"
+              f"{fmt_ms(latency.get('p99')):>10}{row['failed_countries']:>10}{row['settled_limit']!s:>10}")
+
+    fixed = [row for row in rows if isinstance(row['concurrency'], int) and not row['failed_countries']]
+    if fixed:
+        best = max(fixed, key=lambda row: row['countries_per_second'] or 0)
+        print(f"📈 无失败时吞吐最高的并发: {best['concurrency']} ({best['countries_per_second']} 国家/秒)")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Disney+ 帮助中心本地模拟服务')
+    subparsers = parser.add_subparsers(dest='command')
+
+    def add_server_args(sub):
+        sub.add_argument('--countries', type=int, default=80, help='模拟国家数量 (默认: 80)')
+        sub.add_argument('--locales', type=int, default=20, help='模拟 locale 数量，国家轮流共用 (默认: 20)')
+        sub.add_argument('--latency', type=float, default=0.05, help='平均响应延迟（秒），按指数分布抖动 (默认: 0.05)')
+        sub.add_argument('--error-rate', type=float, default=0.0, help='随机返回 500 的比例 (默认: 0)')
+        sub.add_argument('--capacity', type=int, help='同时处理的请求超过该数量时返回 429')
+        sub.add_argument('--plans', type=int, default=4, help='每个国家的套餐行数 (默认: 4)')
+        sub.add_argument('--padding', type=int, default=0, help='每个文章片段附加的填充字节数 (默认: 0)')
+        sub.add_argument('--seed', type=int, default=0)
+
+    serve_parser = subparsers.add_parser('serve', help='启动模拟服务')
+    add_server_args(serve_parser)
+    serve_parser.add_argument('--port', type=int, default=8766)
+
+    loadtest_parser = subparsers.add_parser('loadtest', help='以逐级增加的并发驱动爬虫并报告吞吐与尾延迟')
+    add_server_args(loadtest_parser)
+    loadtest_parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32],
+                                 help='依次测试的固定并发 (默认: 1 2 4 8 16 32)')
+    loadtest_parser.add_argument('--adaptive', action='store_true', help='额外用自适应限流跑一轮')
+    loadtest_parser.add_argument('--json', help='把结果写入 JSON 文件')
+
+    args = parser.parse_args(argv)
+    if args.command not in ('serve', 'loadtest'):
+        parser.print_help()
+        return
+
+    center = MockHelpCenter(countries=args.countries, locales=args.locales, latency=args.latency,
+                            error_rate=args.error_rate, capacity=args.capacity, plans=args.plans,
+                            padding=args.padding, seed=args.seed,
+                            port=args.port if args.command == 'serve' else 0)
+
+    if args.command == 'serve':
+        print(f"🚀 模拟帮助中心已启动: {center.url} ({len(center.country_codes)} 个国家,{len(center.locales)} 个 locale)")
+        print(f"   DISNEY_HELP_CENTER_URL={center.url} python disney.py")
+        try:
+            center.httpd.serve_forever()
+        except KeyboardInterrupt:
+            print("\n👋 服务已停止")
+        finally:
+            center.httpd.server_close()
+        return
+
+    with center:
+        rows = run_loadtest(center, args.concurrency, args.adaptive)
+    print_rows(rows)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+    if any(row['countries'] == 0 for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Disney+ 金额表示
+Money 以整数最小单位 (minor units) 加 ISO 4217 货币代码保存金额，小数位数由 ISO 4217 决定
+（如 CNY/EUR 为 2 位，JPY/KRW/CLP 为 0 位），比较、排序、求差都是精确的整数运算。
+处理后数据中的 "CNY 87.59" 字符串保持不变，旁边的 *_minor 字段就是对应的整数。
+"""
+
+import re
+from decimal import Decimal, ROUND_HALF_UP
+from typing import NamedTuple, Optional, Tuple
+
+# ISO 4217 中小数位数不是 2 的货币；其余货币使用 DEFAULT_EXPONENT
+ISO_4217_EXPONENTS = {
+    'BIF': 0, 'CLP': 0, 'DJF': 0, 'GNF': 0, 'ISK': 0, 'JPY': 0, 'KMF': 0, 'KRW': 0, 'PYG': 0,
+    'RWF': 0, 'UGX': 0, 'UYI': 0, 'VND': 0, 'VUV': 0, 'XAF': 0, 'XOF': 0, 'XPF': 0,
+    'BHD': 3, 'IQD': 3, 'JOD': 3, 'KWD': 3, 'LYD': 3, 'OMR': 3, 'TND': 3,
+    'CLF': 4, 'UYW': 4,
+}
+DEFAULT_EXPONENT = 2
+
+# "CNY 87.59"、"KRW 9900"、"EUR -1.50"
+AMOUNT_TEXT_RE = re.compile(r'^([A-Z]{3}) (-?)(\d+)(?:\.(\d+))?$')
+
+
+def currency_exponent(currency: Optional[str]) -> int:
+    """ISO 4217 小数位数；未知货币（包括 'N/A'）按 2 位处理"""
+    return ISO_4217_EXPONENTS.get(currency or '', DEFAULT_EXPONENT)
+
+
+def parse_scaled(text: Optional[str]) -> Optional[Tuple[str, int, int]]:
+    """按字符串本身的小数位数拆分金额：'TWD 335' -> ('TWD', 335, 0)，'USD 12.99' -> ('USD', 1299, 2)。
+    只做整数运算；格式不符时返回 None。二进制快照用它无损保存原字符串"""
+    # 与 AMOUNT_TEXT_RE 相同的格式（只接受 ASCII 数字）；变化检测和聚合对每个价格都会调用，用字符串方法代替正则
+    if not isinstance(text, str) or text[3:4] != ' ':
+        return None
+    currency = text[:3]
+    whole, dot, fraction = text[4:].partition('.')
+    sign = whole[:1] == '-'
+    if sign:
+        whole = whole[1:]
+    if not (currency.isascii() and currency.isalpha() and currency.isupper()
+            and whole.isascii() and whole.isdigit()
+            and (not dot or (fraction.isascii() and fraction.isdigit()))):
+        return None
+    value = int(whole + fraction)
+    return currency, -value if sign else value, len(fraction)
+
+
+def format_scaled(value: int, places: int) -> str:
+    """(1299, 2) -> '12.99'，(9900, 0) -> '9900'"""
+    sign = '-' if value < 0 else ''
+    digits = str(abs(value)).rjust(places + 1, '0')
+    if not places:
+        return sign + digits
+    return f"{sign}{digits[:-places]}.{digits[-places:]}"
+
+
+class Money(NamedTuple):
+    minor: int
+    currency: str
+
+    @property
+    def exponent(self) -> int:
+        return currency_exponent(self.currency)
+
+    @classmethod
+    def from_decimal(cls, amount: Decimal, currency: str) -> 'Money':
+        """按货币的小数位数四舍五入（ROUND_HALF_UP，与汇率转换一致）"""
+        return cls(int(amount.scaleb(currency_exponent(currency)).quantize(Decimal(1), rounding=ROUND_HALF_UP)),
+                   currency)
+
+    @classmethod
+    def parse(cls, text: Optional[str]) -> Optional['Money']:
+        """'CNY 87.59' -> Money(8759, 'CNY')；None 或格式不符时返回 None"""
+        scaled = parse_scaled(text)
+        if scaled is None:
+            return None
+        return cls.from_scaled(*scaled)
+
+    @classmethod
+    def from_scaled(cls, currency: str, value: int, places: int) -> 'Money':
+        """('TWD', 335, 0) -> Money(33500, 'TWD')；位数多于货币小数位数时四舍五入"""
+        exponent = currency_exponent(currency)
+        if places <= exponent:
+            return cls(value * 10 ** (exponent - places), currency)
+        return cls.from_decimal(Decimal(value).scaleb(-places), currency)
+
+    @classmethod
+    def from_fields(cls, minor: Optional[int], text: Optional[str]) -> Optional['Money']:
+        """优先使用处理后数据中的 *_minor 字段，旧数据没有时再解析字符串。
+        有整数字段时只从字符串前缀取货币代码，不再用正则解析金额（两者是否一致由校验器检查）"""
+        if type(minor) is int and isinstance(text, str) and text[3:4] == ' ' and text[:3].isupper():
+            return cls(minor, text[:3])
+        return cls.parse(text)
+
+    @property
+    def amount(self) -> Decimal:
+        return Decimal(self.minor).scaleb(-self.exponent)
+
+    def to_float(self) -> float:
+        # int / int 是正确舍入的，8759 / 100 与 float('87.59') 完全相同
+        return self.minor / 10 ** self.exponent
+
+    def __str__(self) -> str:
+        return f"{self.currency} {format_scaled(self.minor, self.exponent)}"
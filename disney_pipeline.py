@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Disney+ 单进程流水线
+在同一个进程里依次执行 抓取 → 汇率转换 → 变化检测 → 归档，各阶段之间直接传递内存中的数据；
+汇率请求在后台线程中与抓取并行，中间文件只在最后统一写入一次。
+各阶段脚本（disney.py / disney_rate_converter.py / disney_price_change_detector.py）仍可单独运行。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import disney
+from disney_aggregates import write_aggregates
+from disney_binary_snapshot import sidecar_path, write_sidecar, write_store_sidecar
+from disney_price_change_detector import (
+    ChangeSet,
+    DisneyPriceChangeDetector,
+    archive_changelog_if_due,
+    rollup_summaries,
+    write_github_output,
+)
+from disney_profiling import setup as setup_profiling
+from disney_rate_converter import (
+    API_URL_TEMPLATE,
+    convert_prices,
+    get_exchange_rates,
+    load_api_keys,
+    report_exchange_rates,
+    save_processed_data,
+)
+from disney_snapshot_store import DisneySnapshotStore
+from disney_validator import ERROR, DisneyDataValidator, latest_baseline
+
+# 已经写入快照、但还没有写入事件日志 / CHANGELOG / 摘要的变化
+PENDING_CHANGES_FILE = 'disneyplus_pending_changes.json'
+
+
+def save_pending_changes(change_set: ChangeSet, snapshot_timestamp: str, path: str = PENDING_CHANGES_FILE):
+    """在写入快照之前保存本次检测结果；快照写入后再失败时，重跑会先补写这些变化"""
+    pending = {'snapshot': snapshot_timestamp, 'date': change_set.date, 'changes': change_set.changes}
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(pending, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def report_pending_changes(detector: DisneyPriceChangeDetector, store: DisneySnapshotStore,
+                           path: str = PENDING_CHANGES_FILE) -> Optional[Tuple[int, str]]:
+    """写入上次保存的检测结果并删除文件，返回 (变化数量, 摘要文件)；没有待写入的变化时返回 None。
+    对应的快照没有写入时这些变化不算数（重跑会与同一个旧快照对比，重新检测出来），直接丢弃"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        pending = json.load(f)
+    if pending['snapshot'] not in store.list_snapshots('processed'):
+        print(f"⚠️ 上次保存的变化对应的快照 {pending['snapshot']} 没有写入,丢弃后重新检测")
+        os.remove(path)
+        return None
+
+    print(f"🔁 写入上次运行(快照 {pending['snapshot']})尚未记录的价格变化...")
+    result = detector.report_changes(ChangeSet(pending['date'], pending['changes']))
+    os.remove(path)
+    return result
+
+
+def validate_outputs(raw_data: Dict, processed_data: Dict, store: DisneySnapshotStore) -> Dict:
+    """在检测变化之前校验本次结果，以最近一次快照为 CNY 变化基线"""
+    baseline_name, baseline = latest_baseline(store)
+    report = DisneyDataValidator().validate(raw_data, processed_data, baseline, baseline_name)
+    for issue in report['issues']:
+        print(f"{'❌' if issue['severity'] == ERROR else '⚠️'} [{issue['check']}] {issue['message']}")
+    stats = report['stats']
+    print(f"✅ 数据校验完成: {stats.get('processed_countries', 0)} 个国家,{stats.get('priced_plans', 0)} 个已转换价格,"
+          f"{report['errors']} 个错误,{report['warnings']} 个警告")
+    return report
+
+
+async def scrape_and_fetch_rates(raw_file: Optional[str] = None, resume: bool = False) -> Tuple[Dict, Optional[Dict]]:
+    """抓取价格的同时在后台线程获取汇率；指定 raw_file 时跳过抓取，直接读取已有的原始数据"""
+    api_keys = load_api_keys()
+    print("正在获取汇率（与抓取并行）...")
+    rates_task = asyncio.ensure_future(asyncio.to_thread(get_exchange_rates, api_keys, API_URL_TEMPLATE))
+
+    if raw_file:
+        print(f"正在从 {raw_file} 加载原始数据，跳过抓取...")
+        with open(raw_file, 'r', encoding='utf-8') as f:
+            raw_data = json.load(f)
+    else:
+        raw_data = await disney.main(resume=resume)
+
+    return raw_data, await rates_task
+
+
+def run_pipeline(raw_file: Optional[str] = None, snapshot: bool = True, resume: bool = False) -> Tuple[int, str]:
+    """执行完整流水线，返回 (变化数量, 摘要文件)；resume 时跳过断点日志中已抓取完成的国家"""
+    store = DisneySnapshotStore()
+    detector = DisneyPriceChangeDetector()
+    # 上次运行写入快照之后、记录变化之前失败：先补写这些变化，否则重跑时与新快照对比会把它们漏掉
+    replayed = report_pending_changes(detector, store)
+    if replayed is not None and resume:
+        # 上次运行的结果文件与快照都已写入，只差变化记录，不需要重新抓取
+        rollup_summaries(detector.summary_dir)
+        archive_changelog_if_due()
+        return replayed
+
+    raw_data, rates = asyncio.run(scrape_and_fetch_rates(raw_file, resume))
+
+    if not raw_data:
+        raise SystemExit("❌ 所有国家抓取失败,results 为空,中止执行")
+    if not rates:
+        raise SystemExit("❌ 无法获取汇率，中止执行")
+    report_exchange_rates(rates)
+
+    processed_data = convert_prices(raw_data, rates)
+    if not validate_outputs(raw_data, processed_data, store)['ok']:
+        raise SystemExit("❌ 数据校验未通过，中止执行（未写入任何文件）")
+
+    # 检测必须在写入本次快照之前进行，才能和上一次快照对比；这里只计算变化，不写文件
+    change_set = detector.detect_changes(processed_data)
+
+    # 所有阶段成功后统一写入结果文件
+    if not raw_file:
+        disney.save_prices(raw_data)
+    save_processed_data(processed_data, detector.current_file)
+    write_aggregates(processed_data.items(), detector.current_file)
+    write_sidecar(processed_data, sidecar_path(detector.current_file))
+
+    if snapshot:
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        # 快照写入后再检测就只能和本次数据对比，先把本次的变化保存下来
+        if change_set is not None:
+            save_pending_changes(change_set, timestamp)
+        store.add_snapshot(raw_data, timestamp, 'raw')
+        store.add_snapshot(processed_data, timestamp, 'processed')
+        write_store_sidecar(store, timestamp, processed_data)
+        print(f"归档完成，快照时间戳: {timestamp}")
+    # 快照写入后才删除断点日志，之前任何一步失败都可以 --resume
+    if not raw_file:
+        disney.clear_checkpoint()
+
+    # 最后才记录变化：快照之前的步骤失败时重跑仍与同一个旧快照对比，不会重复记录；
+    # 记录变化失败时重跑会从保存的结果补写，写入按检测时间幂等
+    if snapshot:
+        changes_count, summary_file = report_pending_changes(detector, store) or (0, "")
+    else:
+        changes_count, summary_file = detector.report_changes(change_set)
+
+    rollup_summaries(detector.summary_dir)
+    archive_changelog_if_due()
+    return changes_count, summary_file
+
+
+def main(argv: Optional[List[str]] = None):
+    setup_profiling('disney_pipeline', argv)
+    parser = argparse.ArgumentParser(description='Disney+ 单进程流水线：抓取 → 转换 → 检测 → 归档')
+    parser.add_argument('--raw', help='使用已有的原始数据文件，跳过抓取阶段')
+    parser.add_argument('--no-snapshot', action='store_true', help='不把本次结果写入快照存储')
+    parser.add_argument('--resume', action='store_true', help='从抓取断点日志恢复，只抓取上次未完成的国家')
+    args = parser.parse_args(argv)
+
+    changes_count, summary_file = run_pipeline(args.raw, snapshot=not args.no_snapshot, resume=args.resume)
+    write_github_output(changes_count, summary_file)
+    print(f"🎉 流水线完成，发现 {changes_count} 项变化")
+
+
+if __name__ == "__main__":
+    main()
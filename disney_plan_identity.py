@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Disney+ 套餐标识规范化
+把各语言、各种写法的套餐名称解析为稳定的规范 ID（组成服务 / 档位 / 是否含广告），
+例如 "Disney+ Estándar con anuncios" 与 "Disney+ Standard with Ads" 都是 disney/standard/ads。
+解析结果带缓存；无法完全识别的名称可以通过 report 命令列出。
+"""
+
+import argparse
+import json
+import re
+import sys
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+
+def _phrase(pattern: str) -> str:
+    # 名称中含 "+" 等非单词字符，不能直接用 \b
+    return r'(?<!\w)(?:' + pattern + r')(?!\w)'
+
+
+# 组成服务，按顺序匹配（长的在前，例如 "espn unlimited" 先于 "espn+"）
+COMPONENT_PATTERNS: List[Tuple[str, re.Pattern]] = [
+    (name, re.compile(_phrase(pattern))) for name, pattern in [
+        ('nfl-plus', r'nfl\+(?: premium)?'),
+        ('espn-unlimited', r'espn unlimited'),
+        ('espn-select', r'espn select'),
+        ('espn-plus', r'espn\+'),
+        ('hbo-max', r'(?:hbo )?max'),
+        ('hulu', r'hulu'),
+        ('crave', r'crave'),
+        ('tsn', r'tsn'),
+        ('tving', r'tving'),
+        ('wavve', r'wavve'),
+        ('disney', r'disney\+'),
+    ]
+]
+
+ADS_PATTERNS: List[Tuple[str, re.Pattern]] = [
+    (name, re.compile(_phrase(pattern))) for name, pattern in [
+        ('no-ads', r'no ads|without ads|sin anuncios|sem anúncios|sans pub'),
+        ('ads', r'with ads|con anuncios|com anúncios|avec pub'),
+    ]
+]
+
+TIER_PATTERNS: List[Tuple[str, re.Pattern]] = [
+    (name, re.compile(_phrase(pattern))) for name, pattern in [
+        ('extra-member', r'extra member|miembro extra|membro extra|abonné supplémentaire|extra gebruiker'),
+        ('premium', r'premium'),
+        ('standard', r'standard|estándar|padrão|standaard'),
+        ('basic', r'basic|básico'),
+        ('legacy', r'legacy'),
+    ]
+]
+
+# 不携带含义的连接词与标点
+FILLER_RE = re.compile(_phrase(r'bundle|and|with|y|e|et|und') + r'|[,+*()&/]')
+# 修正抓取时丢失的空格，如 "BundlePremium" -> "Bundle Premium"
+CAMEL_JOIN_RE = re.compile(r'(?<=[a-z])(?=[A-Z])')
+
+
+class PlanIdentity(NamedTuple):
+    components: Tuple[str, ...]
+    tier: str
+    ads: Optional[str]
+    unknown: Tuple[str, ...]
+
+    @property
+    def plan_id(self) -> str:
+        parts = ['+'.join(self.components) or 'unknown', self.tier]
+        if self.ads:
+            parts.append(self.ads)
+        if self.unknown:
+            parts.append('x-' + '-'.join(self.unknown))
+        return '/'.join(parts)
+
+    @property
+    def is_mapped(self) -> bool:
+        return not self.unknown and bool(self.components)
+
+
+def _normalize(name: str) -> str:
+    return ' '.join(CAMEL_JOIN_RE.sub(' ', name).lower().split())
+
+
+def _consume(text: str, patterns: List[Tuple[str, re.Pattern]]) -> Tuple[str, List[str]]:
+    found = []
+    for name, pattern in patterns:
+        text, count = pattern.subn(' ', text)
+        if count:
+            found.append(name)
+    return text, found
+
+
+@lru_cache(maxsize=4096)
+def parse_plan_name(name: str) -> PlanIdentity:
+    """解析套餐名称（原始名称或 standardize_plan_name 之后的名称均可）"""
+    text = _normalize(name)
+    text, components = _consume(text, COMPONENT_PATTERNS)
+    text, ads = _consume(text, ADS_PATTERNS)
+    text, tiers = _consume(text, TIER_PATTERNS)
+    unknown = tuple(FILLER_RE.sub(' ', text).split())
+    if not components and tiers:
+        # "Extra Member" 之类的附加项不写服务名，默认属于 Disney+
+        components = ['disney']
+
+    # Disney+ 总是排在第一位，其余服务按字母顺序
+    components.sort(key=lambda component: (component != 'disney', component))
+    return PlanIdentity(
+        components=tuple(components),
+        tier='-'.join(sorted(tiers)) or 'base',
+        ads=ads[0] if ads else None,
+        unknown=unknown,
+    )
+
+
+def canonical_plan_id(name: str) -> str:
+    return parse_plan_name(name).plan_id
+
+
+def plan_keys(names: Iterable[str]) -> Dict[str, str]:
+    """同一国家的套餐名称 -> 对比用的键。通常就是规范 ID；多个不同名称解析到同一 ID 时，
+    这些名称的键都附加原始名称 (plan_id#名称)，结果与套餐在列表中的顺序无关"""
+    by_id: Dict[str, set] = {}
+    for name in names:
+        by_id.setdefault(canonical_plan_id(name), set()).add(name)
+    return {
+        name: plan_id if len(group) == 1 else f"{plan_id}#{name}"
+        for plan_id, group in by_id.items() for name in group
+    }
+
+
+def _iter_plan_names(data: Dict) -> Iterable[Tuple[str, str]]:
+    """从原始或处理后的数据中逐个取出 (国家代码, 套餐名称)"""
+    for country, value in data.items():
+        if country.startswith('_'):
+            continue
+        plans = value.get('plans', []) if isinstance(value, dict) else value
+        if not isinstance(plans, list):
+            continue
+        for plan in plans:
+            if not isinstance(plan, dict):
+                continue
+            name = plan.get('plan_name') or plan.get('plan')
+            if name:
+                yield country, name
+
+
+def collect_plan_names(data: Dict) -> Dict[str, List[str]]:
+    """从原始或处理后的数据中收集 {套餐名称: [国家代码]}"""
+    names: Dict[str, List[str]] = {}
+    for country, name in _iter_plan_names(data):
+        names.setdefault(name, []).append(country)
+    return names
+
+
+def find_collisions(data: Dict) -> Dict[str, Dict[str, List[str]]]:
+    """同一国家中多个不同名称解析到同一规范 ID 的情况: {国家代码: {规范 ID: [名称]}}"""
+    by_country: Dict[str, Dict[str, set]] = {}
+    for country, name in _iter_plan_names(data):
+        by_country.setdefault(country, {}).setdefault(canonical_plan_id(name), set()).add(name)
+    return {
+        country: {plan_id: sorted(names) for plan_id, names in sorted(ids.items()) if len(names) > 1}
+        for country, ids in sorted(by_country.items())
+        if any(len(names) > 1 for names in ids.values())
+    }
+
+
+def build_report(paths: Iterable[str]) -> Dict:
+    names: Dict[str, List[str]] = {}
+    collisions: Dict[str, Dict[str, List[str]]] = {}
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for name, countries in collect_plan_names(data).items():
+            names.setdefault(name, [])
+            names[name].extend(c for c in countries if c not in names[name])
+        for country, ids in find_collisions(data).items():
+            for plan_id, colliding in ids.items():
+                merged = collisions.setdefault(country, {}).setdefault(plan_id, [])
+                merged.extend(name for name in colliding if name not in merged)
+
+    mapped, unmapped = {}, {}
+    for name in sorted(names):
+        identity = parse_plan_name(name)
+        target = mapped if identity.is_mapped else unmapped
+        target[name] = {'plan_id': identity.plan_id, 'countries': sorted(names[name])}
+    return {'mapped': mapped, 'unmapped': unmapped, 'collisions': collisions}
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Disney+ 套餐规范 ID')
+    subparsers = parser.add_subparsers(dest='command')
+
+    report_parser = subparsers.add_parser('report', help='列出数据文件中的套餐名称及其规范 ID')
+    report_parser.add_argument('files', nargs='*', default=['disneyplus_prices.json'])
+    report_parser.add_argument('--json', action='store_true', help='以 JSON 输出')
+    report_parser.add_argument('--unmapped-only', action='store_true', help='只列出无法完全识别或同一国家内 ID 冲突的名称')
+
+    id_parser = subparsers.add_parser('id', help='输出单个套餐名称的规范 ID')
+    id_parser.add_argument('name')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'id':
+        print(canonical_plan_id(args.name))
+    elif args.command == 'report':
+        report = build_report(args.files)
+        if args.unmapped_only:
+            report = {'unmapped': report['unmapped'], 'collisions': report['collisions']}
+        if args.json:
+            print(json.dumps(report, ensure_ascii=False, indent=2))
+        else:
+            for section, title in (('mapped', '✅ 已识别'), ('unmapped', '⚠️ 未识别')):
+                if section not in report:
+                    continue
+                print(f"{title}: {len(report[section])} 个名称")
+                for name, info in report[section].items():
+                    print(f"  {info['plan_id']:<45} {name}  ({', '.join(info['countries'])})")
+            if report['collisions']:
+                # 变化检测会改用 plan_id#名称 区分这些套餐，名称措辞调整时会记成一次删除加一次新增
+                print(f"⚠️ 同一国家多个名称对应同一 ID: {len(report['collisions'])} 个国家")
+                for country, ids in report['collisions'].items():
+                    for plan_id, colliding in ids.items():
+                        print(f"  {country}  {plan_id:<42} {' | '.join(colliding)}")
+        if report['unmapped'] or report['collisions']:
+            sys.exit(1)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -9,30 +9,57 @@ import json
 import os
 import re
 from datetime import datetime
-from typing import Dict, List, Tuple, Optional
-import glob
+from decimal import Decimal
+from typing import Dict, List, NamedTuple, Tuple, Optional
+
+from disney_changelog_archiver import DisneyChangelogArchiver
+from disney_money import Money
+from disney_plan_identity import plan_keys
+from disney_profiling import setup as setup_profiling, stage
+from disney_snapshot_store import DisneySnapshotStore
+from disney_changelog_renderer import ChangelogRenderer, count_changes
+from disney_changelog_events import DisneyChangelogEventLog
+from disney_changelog_markdown import (
+    import_changelog_history,
+    insert_entry,
+    month_key,
+    render_changelog_month,
+    seed_month_from_changelog,
+)
+
+# 与上次相差超过 1 分（0.01 元）才记为价格变化，用于忽略汇率换算的末位抖动
+MIN_CHANGE_MINOR = 1
+
+
+class ChangeSet(NamedTuple):
+    """一次检测的结果；changes 为 None 表示没有可对比的历史快照"""
+    date: str
+    changes: Optional[List[Dict]]
+
 
 class DisneyPriceChangeDetector:
     def __init__(self):
         self.current_file = "disneyplus_prices_processed.json"
         self.changelog_file = "CHANGELOG.md"
         self.summary_dir = "summaries"
+        self.snapshot_store = DisneySnapshotStore()
+        self.event_log = DisneyChangelogEventLog()
+        self.renderer = ChangelogRenderer()
 
-    def _archive_sort_key(self, file_path: str) -> str:
-        match = re.search(r'disneyplus_prices_processed_(\d{8})_(\d{6})\.json$', os.path.basename(file_path))
-        if match:
-            return f"{match.group(1)}{match.group(2)}"
-        return ""
-
-    def _parse_cny_value(self, value) -> Optional[float]:
+    def _parse_cny_minor(self, value, minor=None) -> Optional[int]:
+        """CNY 价格的整数分：优先使用处理后数据中的 *_minor 字段，旧快照再解析字符串或数值"""
         if value is None:
             return None
-        if isinstance(value, (int, float)):
-            return float(value)
         if isinstance(value, str):
+            money = Money.from_fields(minor, value)
+            if money is not None and money.currency == 'CNY':
+                return money.minor
             match = re.search(r'-?\d+(?:\.\d+)?', value.replace(',', ''))
             if match:
-                return float(match.group(0))
+                return Money.from_decimal(Decimal(match.group(0)), 'CNY').minor
+            return None
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return Money.from_decimal(Decimal(repr(value)), 'CNY').minor
         return None
 
     def _extract_price_entries(self, data: Dict) -> Dict:
@@ -47,18 +74,22 @@ class DisneyPriceChangeDetector:
                 continue
 
             country_name = country_data.get('name_cn') or country_data.get('country_name') or country
+            named_plans = [
+                (plan.get('plan_name') or plan.get('plan'), plan)
+                for plan in plans if isinstance(plan, dict) and (plan.get('plan_name') or plan.get('plan'))
+            ]
+            # 两侧都由名称重新计算规范 ID，旧快照没有 plan_id 字段也能对上；
+            # 同一国家多个名称解析到同一 ID 时，这些套餐都按 ID + 原始名称区分，与列表顺序无关
+            keys = plan_keys(plan_name for plan_name, _ in named_plans)
 
-            for plan in plans:
-                if not isinstance(plan, dict):
-                    continue
-
-                plan_name = plan.get('plan_name') or plan.get('plan')
-                if not plan_name:
-                    continue
+            for plan_name, plan in named_plans:
+                plan_key = keys[plan_name]
 
                 candidates = [
-                    ('monthly', '月付', plan.get('monthly_price_cny'), plan.get('monthly_price_original'), plan.get('currency_code')),
-                    ('annual', '年付', plan.get('annual_price_cny'), plan.get('annual_price_original'), plan.get('currency_code')),
+                    ('monthly', '月付', plan.get('monthly_price_cny'), plan.get('monthly_price_cny_minor'),
+                     plan.get('monthly_price_original'), plan.get('currency_code')),
+                    ('annual', '年付', plan.get('annual_price_cny'), plan.get('annual_price_cny_minor'),
+                     plan.get('annual_price_original'), plan.get('currency_code')),
                 ]
 
                 if 'price_cny' in plan:
@@ -66,46 +97,66 @@ class DisneyPriceChangeDetector:
                         'price',
                         '',
                         plan.get('price_cny'),
+                        None,
                         plan.get('price_original'),
                         plan.get('currency'),
                     ))
 
-                for period, period_label, price_cny, price_original, currency in candidates:
-                    parsed_price = self._parse_cny_value(price_cny)
+                for period, period_label, price_cny, price_cny_minor, price_original, currency in candidates:
+                    parsed_price = self._parse_cny_minor(price_cny, price_cny_minor)
                     if parsed_price is None:
                         continue
 
                     display_plan = f"{plan_name}（{period_label}）" if period_label else plan_name
-                    key = f"{country}_{plan_name}_{period}"
+                    key = f"{country}_{plan_key}_{period}"
+                    if key in prices:
+                        # 同名套餐重复出现时只保留第一条
+                        continue
                     prices[key] = {
                         'country': country,
                         'country_name': country_name,
                         'plan': display_plan,
-                        'price_cny': parsed_price,
+                        'plan_name': plan_name,
+                        'period': period,
+                        'price_cny_minor': parsed_price,
                         'price_original': price_original or 'N/A',
                         'currency': currency or 'N/A',
                     }
 
         return prices
 
-    def find_latest_archive_file(self) -> Optional[str]:
-        """查找最新的归档价格文件"""
-        # 查找archive目录下的所有processed文件
-        pattern = "archive/**/disneyplus_prices_processed_*.json"
-        archive_files = glob.glob(pattern, recursive=True)
+    @staticmethod
+    def _pair_entries(old_prices: Dict, new_prices: Dict) -> Dict[str, str]:
+        """新旧条目配对，返回 {新键: 旧键}。键相同的直接配对；只有一侧出现 ID 冲突时
+        (例如新增了一个解析到同一 ID 的套餐)，剩下的条目按 国家 + 原始名称 + 周期 配对"""
+        pairs = {key: key for key in new_prices if key in old_prices}
+        alias = lambda entry: (entry['country'], entry['plan_name'], entry['period'])
+        unpaired_old = {alias(entry): key for key, entry in old_prices.items() if key not in pairs}
+        for key, entry in new_prices.items():
+            if key not in pairs and alias(entry) in unpaired_old:
+                pairs[key] = unpaired_old.pop(alias(entry))
+        return pairs
+
+    def find_latest_archive_snapshot(self) -> Optional[Tuple[str, Dict]]:
+        """查找最新的有效归档快照，返回 (时间戳, 数据)"""
+        # 快照存储与尚未迁移的 archive/ 文件统一按时间戳查找
+        timestamps = self.snapshot_store.list_snapshots('processed')
         
-        if not archive_files:
+        if not timestamps:
             print("没有找到历史归档文件")
             return None
 
         # 按完整时间戳倒序查找，跳过只有 _top_10 空壳的无效归档。
-        archive_files.sort(key=self._archive_sort_key, reverse=True)
-        for archive_file in archive_files:
-            archive_data = self.load_price_data(archive_file)
+        for ts in reversed(timestamps):
+            try:
+                archive_data = self.snapshot_store.load_snapshot(ts, 'processed')
+            except (OSError, ValueError, KeyError) as e:
+                print(f"跳过无法读取的归档快照: {ts} - {e}")
+                continue
             if self._extract_price_entries(archive_data):
-                print(f"找到最新有效归档文件: {archive_file}")
-                return archive_file
-            print(f"跳过无有效套餐价格的归档文件: {archive_file}")
+                print(f"找到最新有效归档快照: {ts}")
+                return ts, archive_data
+            print(f"跳过无有效套餐价格的归档快照: {ts}")
 
         print("没有找到包含有效套餐价格的历史归档文件")
         return None
@@ -128,25 +179,27 @@ class DisneyPriceChangeDetector:
 
         old_prices = self._extract_price_entries(old_data)
         new_prices = self._extract_price_entries(new_data)
-        
+        pairs = self._pair_entries(old_prices, new_prices)
+
         # 对比价格变化
         for key, new_price in new_prices.items():
-            if key in old_prices:
-                old_price = old_prices[key]
-                old_cny = old_price['price_cny']
-                new_cny = new_price['price_cny']
-                
-                if abs(old_cny - new_cny) > 0.01:  # 价格变化超过0.01元
-                    change_amount = new_cny - old_cny
-                    change_percent = (change_amount / old_cny) * 100 if old_cny > 0 else 0
-                    
+            if key in pairs:
+                old_price = old_prices[pairs[key]]
+                old_minor = old_price['price_cny_minor']
+                new_minor = new_price['price_cny_minor']
+
+                # 整数分比较，结果不再受浮点误差影响
+                if abs(new_minor - old_minor) > MIN_CHANGE_MINOR:
+                    change_minor = new_minor - old_minor
+                    change_percent = (change_minor / old_minor) * 100 if old_minor > 0 else 0
+
                     changes.append({
                         'country': new_price['country'],
                         'country_name': new_price['country_name'],
                         'plan': new_price['plan'],
-                        'old_price_cny': old_cny,
-                        'new_price_cny': new_cny,
-                        'change_amount': change_amount,
+                        'old_price_cny': Money(old_minor, 'CNY').to_float(),
+                        'new_price_cny': Money(new_minor, 'CNY').to_float(),
+                        'change_amount': Money(change_minor, 'CNY').to_float(),
                         'change_percent': change_percent,
                         'price_original': new_price['price_original'],
                         'currency': new_price['currency'],
@@ -158,20 +211,21 @@ class DisneyPriceChangeDetector:
                     'country': new_price['country'],
                     'country_name': new_price['country_name'],
                     'plan': new_price['plan'],
-                    'new_price_cny': new_price['price_cny'],
+                    'new_price_cny': Money(new_price['price_cny_minor'], 'CNY').to_float(),
                     'price_original': new_price['price_original'],
                     'currency': new_price['currency'],
                     'type': 'new_plan'
                 })
         
         # 检查删除的套餐
+        paired_old = set(pairs.values())
         for key, old_price in old_prices.items():
-            if key not in new_prices:
+            if key not in paired_old:
                 changes.append({
                     'country': old_price['country'],
                     'country_name': old_price['country_name'],
                     'plan': old_price['plan'],
-                    'old_price_cny': old_price['price_cny'],
+                    'old_price_cny': Money(old_price['price_cny_minor'], 'CNY').to_float(),
                     'price_original': old_price['price_original'],
                     'currency': old_price['currency'],
                     'type': 'removed_plan'
@@ -181,173 +235,102 @@ class DisneyPriceChangeDetector:
     
     def generate_changelog_content(self, changes: List[Dict], date: str) -> str:
         """生成changelog内容"""
-        if not changes:
-            return f"## {date}\n\n✅ **无价格变化** - 所有套餐价格保持稳定\n\n"
-        
-        content = f"## {date}\n\n"
-        
-        # 统计变化
-        price_increases = [c for c in changes if c['type'] == 'price_change' and c['change_amount'] > 0]
-        price_decreases = [c for c in changes if c['type'] == 'price_change' and c['change_amount'] < 0]
-        new_plans = [c for c in changes if c['type'] == 'new_plan']
-        removed_plans = [c for c in changes if c['type'] == 'removed_plan']
-        
-        content += f"📊 **变化概览**: {len(changes)} 项变化\n"
-        if price_increases:
-            content += f"- 📈 涨价: {len(price_increases)} 个套餐\n"
-        if price_decreases:
-            content += f"- 📉 降价: {len(price_decreases)} 个套餐\n"
-        if new_plans:
-            content += f"- 🆕 新增: {len(new_plans)} 个套餐\n"
-        if removed_plans:
-            content += f"- ❌ 移除: {len(removed_plans)} 个套餐\n"
-        content += "\n"
-        
-        # 涨价详情
-        if price_increases:
-            content += "### 📈 价格上涨\n\n"
-            price_increases.sort(key=lambda x: x['change_percent'], reverse=True)
-            for change in price_increases:
-                content += f"- **{change['country_name']} ({change['country']}) - {change['plan']}**\n"
-                content += f"  - 原价: ¥{change['old_price_cny']:.2f} | 现价: ¥{change['new_price_cny']:.2f}\n"
-                content += f"  - 涨幅: ¥{change['change_amount']:.2f} (+{change['change_percent']:.1f}%)\n"
-                content += f"  - 当地价格: {change['price_original']} {change['currency']}\n\n"
-        
-        # 降价详情
-        if price_decreases:
-            content += "### 📉 价格下降\n\n"
-            price_decreases.sort(key=lambda x: x['change_percent'])
-            for change in price_decreases:
-                content += f"- **{change['country_name']} ({change['country']}) - {change['plan']}**\n"
-                content += f"  - 原价: ¥{change['old_price_cny']:.2f} | 现价: ¥{change['new_price_cny']:.2f}\n"
-                content += f"  - 降幅: ¥{abs(change['change_amount']):.2f} ({change['change_percent']:.1f}%)\n"
-                content += f"  - 当地价格: {change['price_original']} {change['currency']}\n\n"
-        
-        # 新增套餐
-        if new_plans:
-            content += "### 🆕 新增套餐\n\n"
-            for change in new_plans:
-                content += f"- **{change['country_name']} ({change['country']}) - {change['plan']}**\n"
-                content += f"  - 价格: ¥{change['new_price_cny']:.2f}\n"
-                content += f"  - 当地价格: {change['price_original']} {change['currency']}\n\n"
-        
-        # 移除套餐
-        if removed_plans:
-            content += "### ❌ 移除套餐\n\n"
-            for change in removed_plans:
-                content += f"- **{change['country_name']} ({change['country']}) - {change['plan']}**\n"
-                content += f"  - 原价格: ¥{change['old_price_cny']:.2f}\n"
-                content += f"  - 当地价格: {change['price_original']} {change['currency']}\n\n"
-        
-        return content
+        return self.renderer.render_to_string(changes, date)
     
-    def update_changelog(self, new_content: str):
-        """更新changelog文件"""
-        if not os.path.exists(self.changelog_file):
-            # 如果文件不存在，创建初始模板
-            initial_content = """# Disney+ 价格变化记录
-
-此文件记录 Disney+ 各国套餐价格的变化历史。
-
-> 📊 **说明**：价格变化自动检测功能已启用，每次爬虫运行后都会对比上次的价格数据，生成详细的变化报告。
-
-## 📁 历史归档
-
-| 年月 | 归档文件 | 变化次数 |
-|------|----------|----------|
-| - | 暂无归档 | - |
-
----
-
-## 📅 当前月份记录
-
-### """ + datetime.now().strftime('%Y年%m月') + """
-
-"""
-            with open(self.changelog_file, 'w', encoding='utf-8') as f:
-                f.write(initial_content + new_content + "\n")
-            print(f"✅ 创建新的 Changelog: {self.changelog_file}")
+    def import_changelog_history(self) -> int:
+        """把 CHANGELOG.md 中所有尚未进入事件日志的月份导入，返回导入的月份数"""
+        return import_changelog_history(self.event_log, self.changelog_file)
+
+    def render_changelog_month(self, year_month: str):
+        """用事件日志重新渲染 CHANGELOG.md 中的某个月份小节，其余内容保持不变"""
+        render_changelog_month(self.event_log, self.changelog_file, year_month)
+
+    def update_changelog(self, changes: List[Dict], date: str):
+        """把本次变化追加到事件日志，并只把本次的新条目插入 CHANGELOG.md 的当前月份；
+        同一次检测（按检测时间）重复写入时不会产生重复条目"""
+        year_month = month_key(date)
+        seed_month_from_changelog(self.event_log, self.changelog_file, year_month)
+        if self.event_log.has_run(date):
+            # 上次写入事件日志后中断，CHANGELOG 可能还没有这一条：由事件日志重新渲染当月
+            self.render_changelog_month(year_month)
             return
-        
-        # 读取现有内容
-        with open(self.changelog_file, 'r', encoding='utf-8') as f:
-            existing_content = f.read()
-        
-        # 查找当前月份记录的位置
-        current_month = datetime.now().strftime('%Y年%m月')
-        month_header_pattern = f"### {current_month}"
-        
-        if month_header_pattern in existing_content:
-            # 在当前月份标题后插入新内容
-            parts = existing_content.split(month_header_pattern, 1)
-            if len(parts) == 2:
-                # 查找下一个月份标题或文件结束
-                after_header = parts[1]
-                next_month_match = re.search(r'\n### \d{4}年\d{2}月', after_header)
-                
-                if next_month_match:
-                    # 在下一个月份标题前插入
-                    insert_pos = next_month_match.start()
-                    before_next = after_header[:insert_pos]
-                    after_next = after_header[insert_pos:]
-                    updated_content = parts[0] + month_header_pattern + "\n\n" + new_content + before_next + after_next
-                else:
-                    # 在文件末尾插入
-                    # 清理现有的"暂无记录"文本
-                    cleaned_after = re.sub(r'\n\*本月暂无价格变化记录\*\s*', '\n', after_header)
-                    updated_content = parts[0] + month_header_pattern + "\n\n" + new_content + cleaned_after
-            else:
-                updated_content = existing_content + "\n" + new_content
-        else:
-            # 添加新月份标题和内容
-            updated_content = existing_content + f"\n### {current_month}\n\n" + new_content
-        
-        with open(self.changelog_file, 'w', encoding='utf-8') as f:
-            f.write(updated_content)
-        
-        print(f"✅ Changelog已更新: {self.changelog_file}")
+        self.event_log.append_run(date, changes)
+        with stage('render'):
+            entry = self.generate_changelog_content(changes, date)
+        insert_entry(self.changelog_file, year_month, entry)
     
+    def summary_path(self, date: str) -> str:
+        """摘要文件名取自检测时间，重复写入同一次检测的结果时覆盖同一个文件"""
+        run_id = datetime.strptime(date, '%Y-%m-%d %H:%M:%S').strftime('%Y%m%d_%H%M%S')
+        return os.path.join(self.summary_dir, f"disney_price_changes_summary_{run_id}.json")
+
     def generate_summary_json(self, changes: List[Dict], date: str):
         """生成变化摘要JSON文件"""
         summary = {
             'date': date,
             'timestamp': datetime.now().isoformat(),
             'total_changes': len(changes),
-            'price_increases': len([c for c in changes if c['type'] == 'price_change' and c['change_amount'] > 0]),
-            'price_decreases': len([c for c in changes if c['type'] == 'price_change' and c['change_amount'] < 0]),
-            'new_plans': len([c for c in changes if c['type'] == 'new_plan']),
-            'removed_plans': len([c for c in changes if c['type'] == 'removed_plan']),
+            **count_changes(changes),
             'changes': changes
         }
         
-        summary_file = os.path.join(
-            self.summary_dir,
-            f"disney_price_changes_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-        )
+        summary_file = self.summary_path(date)
         os.makedirs(self.summary_dir, exist_ok=True)
-        with open(summary_file, 'w', encoding='utf-8') as f:
+        with stage('write'), open(summary_file, 'w', encoding='utf-8') as f:
             json.dump(summary, f, ensure_ascii=False, indent=2)
 
         print(f"✅ 变化摘要已生成: {summary_file}")
         return summary_file
     
-    def detect_and_report_changes(self) -> Tuple[int, str]:
-        """主函数：检测价格变化并生成报告"""
+    def detect_changes(self, new_data: Optional[Dict] = None) -> Optional[ChangeSet]:
+        """只与最新快照对比，不写任何文件；new_data 为空时从 current_file 读取，数据无法对比时返回 None"""
         print("🔍 开始检测 Disney+ 价格变化...")
-        
+        date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
         # 检查当前价格文件是否存在
-        if not os.path.exists(self.current_file):
+        if new_data is None and not os.path.exists(self.current_file):
             print(f"❌ 当前价格文件不存在: {self.current_file}")
-            return 0, ""
-        
+            return None
+
         # 查找最新的归档文件
-        latest_archive = self.find_latest_archive_file()
+        with stage('load'):
+            latest_archive = self.find_latest_archive_snapshot()
         if not latest_archive:
             print("⚠️ 没有历史数据，跳过价格对比")
+            return ChangeSet(date, None)
+
+        # 加载数据
+        old_data = latest_archive[1]
+        if new_data is None:
+            with stage('load'):
+                new_data = self.load_price_data(self.current_file)
+
+        if not old_data or not new_data:
+            print("❌ 数据加载失败")
+            return None
+
+        if not self._extract_price_entries(old_data):
+            print("❌ 历史 processed 数据没有可对比的套餐价格")
+            return None
+
+        if not self._extract_price_entries(new_data):
+            print("❌ 当前 processed 数据没有可对比的套餐价格")
+            return None
+
+        # 对比价格
+        with stage('diff'):
+            changes = self.compare_prices(old_data, new_data)
+        return ChangeSet(date, changes)
+
+    def report_changes(self, change_set: Optional[ChangeSet]) -> Tuple[int, str]:
+        """把检测结果写入事件日志、CHANGELOG 和摘要 JSON，返回 (变化数量, 摘要文件)"""
+        if change_set is None:
+            return 0, ""
+
+        if change_set.changes is None:
             # 即使没有历史数据，也生成一个空的摘要文件
-            date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             summary = {
-                'date': date,
+                'date': change_set.date,
                 'timestamp': datetime.now().isoformat(),
                 'total_changes': 0,
                 'price_increases': 0,
@@ -357,74 +340,55 @@ class DisneyPriceChangeDetector:
                 'changes': [],
                 'note': '首次运行或无历史数据，跳过价格对比'
             }
-            summary_file = os.path.join(
-                self.summary_dir,
-                f"disney_price_changes_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-            )
+            summary_file = self.summary_path(change_set.date)
             os.makedirs(self.summary_dir, exist_ok=True)
             with open(summary_file, 'w', encoding='utf-8') as f:
                 json.dump(summary, f, ensure_ascii=False, indent=2)
             print(f"✅ 生成初始摘要文件: {summary_file}")
             return 0, summary_file
-        
-        # 加载数据
-        old_data = self.load_price_data(latest_archive)
-        new_data = self.load_price_data(self.current_file)
-        
-        if not old_data or not new_data:
-            print("❌ 数据加载失败")
-            return 0, ""
 
-        if not self._extract_price_entries(old_data):
-            print("❌ 历史 processed 数据没有可对比的套餐价格")
-            return 0, ""
+        changes, date = change_set.changes, change_set.date
+
+        # 追加事件日志并更新changelog
+        self.update_changelog(changes, date)
 
-        if not self._extract_price_entries(new_data):
-            print("❌ 当前 processed 数据没有可对比的套餐价格")
-            return 0, ""
-        
-        # 对比价格
-        changes = self.compare_prices(old_data, new_data)
-        
-        # 生成报告
-        date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        changelog_content = self.generate_changelog_content(changes, date)
-        
-        # 更新changelog
-        self.update_changelog(changelog_content)
-        
         # 生成摘要JSON
         summary_file = self.generate_summary_json(changes, date)
-        
+
         print(f"✅ Disney+ 价格变化检测完成，发现 {len(changes)} 项变化")
         return len(changes), summary_file
 
-
-if __name__ == "__main__":
-    detector = DisneyPriceChangeDetector()
-    changes_count, summary_file = detector.detect_and_report_changes()
-    
-    # 检查是否需要执行 CHANGELOG 归档
-    now = datetime.now()
-    if now.day <= 3:  # 每月前3天检查归档
-        print("\n🗂️ 检查 CHANGELOG 归档需求...")
-        try:
-            import subprocess
-            import sys
-            
-            # 使用当前 Python 解释器来运行归档脚本
-            result = subprocess.run([sys.executable, 'disney_changelog_archiver.py'], 
-                                  capture_output=True, text=True, encoding='utf-8')
-            if result.returncode == 0:
-                print("✅ CHANGELOG 归档检查完成")
-                if result.stdout.strip():
-                    print(result.stdout.strip())
-            else:
-                print(f"⚠️ CHANGELOG 归档失败: {result.stderr}")
-        except Exception as e:
-            print(f"⚠️ 执行 CHANGELOG 归档时出错: {e}")
-    
-    # 输出结果供GitHub Actions使用
+    def detect_and_report_changes(self, new_data: Optional[Dict] = None) -> Tuple[int, str]:
+        """主函数：检测价格变化并生成报告；new_data 为空时从 current_file 读取"""
+        return self.report_changes(self.detect_changes(new_data))
+
+
+def rollup_summaries(summary_dir: str):
+    """把已结束月份的摘要文件合并为月度汇总"""
+    try:
+        from disney_summary_compactor import DisneySummaryCompactor
+        DisneySummaryCompactor(summary_dir).rollup_completed_months()
+    except Exception as e:
+        print(f"⚠️ 摘要月度汇总失败: {e}")
+
+
+def archive_changelog_if_due():
+    """每月前3天在当前进程内执行 CHANGELOG 归档"""
+    archiver = DisneyChangelogArchiver()
+    if not archiver.should_archive():
+        return
+    print("\n🗂️ 检查 CHANGELOG 归档需求...")
+    try:
+        archived_count, archived_files = archiver.archive_last_month()
+        print("✅ CHANGELOG 归档检查完成")
+        print(f"archived_count={archived_count}")
+        print(f"archived_files={','.join(archived_files)}")
+    except Exception as e:
+        print(f"⚠️ 执行 CHANGELOG 归档时出错: {e}")
+
+
+def write_github_output(changes_count: int, summary_file: str):
+    """输出结果供GitHub Actions使用"""
     github_output = os.environ.get('GITHUB_OUTPUT')
     if github_output and github_output != '/dev/stdout':
         with open(github_output, 'a') as f:
@@ -434,3 +398,16 @@ if __name__ == "__main__":
         # 如果不在 GitHub Actions 环境中，输出到标准输出
         print(f"changes_count={changes_count}")
         print(f"summary_file={summary_file}")
+
+
+def main():
+    setup_profiling('disney_price_change_detector')
+    detector = DisneyPriceChangeDetector()
+    changes_count, summary_file = detector.detect_and_report_changes()
+    rollup_summaries(detector.summary_dir)
+    archive_changelog_if_due()
+    write_github_output(changes_count, summary_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Disney+ 价格查询服务
+启动时加载一次处理后的价格数据，建立按国家、套餐名称、货币的内存索引，
+通过本地 HTTP 接口提供查询；响应带 ETag，支持 If-None-Match 条件请求，
+新快照写入或价格文件更新后自动重新加载。
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+from disney_money import Money
+from disney_snapshot_store import DisneySnapshotStore
+
+PERIODS = ('monthly', 'annual')
+# /cheapest 的 n 上限；更大的值按上限处理
+MAX_CHEAPEST = 100
+# 最多缓存的响应数，超过时淘汰最久未使用的
+RESPONSE_CACHE_SIZE = 512
+
+
+def plan_price_cny(plan: Dict, period: str) -> Optional[Money]:
+    """套餐某个周期的 CNY 价格：优先使用 *_minor 整数字段，旧数据再解析字符串"""
+    money = Money.from_fields(plan.get(f'{period}_price_cny_minor'), plan.get(f'{period}_price_cny'))
+    return money if money and money.currency == 'CNY' else None
+
+
+class PriceIndex:
+    """某一版本价格数据的只读索引；重新加载时整体替换，不做原地修改"""
+
+    def __init__(self, data: Dict, version: str, store: DisneySnapshotStore):
+        self.version = version
+        self.store = store
+        self.top_10 = data.get('_top_10_cheapest_premium_plans', {})
+        self.countries: Dict[str, Dict] = {}
+        self.by_currency: Dict[str, List[str]] = {}
+        # (套餐名称, 周期) -> [(CNY 价格（分）, 国家, 套餐)]，按价格升序
+        self.by_plan: Dict[Tuple[str, str], List[Tuple[int, str, Dict]]] = {}
+        self._history: Dict[str, List[Tuple[str, Dict]]] = {}
+        self._history_lock = threading.Lock()
+
+        for country, info in data.items():
+            if country.startswith('_') or not isinstance(info, dict):
+                continue
+            self.countries[country] = info
+            currencies = set()
+            for plan in info.get('plans', []):
+                if plan.get('currency_code'):
+                    currencies.add(plan['currency_code'])
+                for period in PERIODS:
+                    price = plan_price_cny(plan, period)
+                    if price is not None:
+                        self.by_plan.setdefault((plan.get('plan_name'), period), []).append((price.minor, country, plan))
+            for currency in currencies:
+                self.by_currency.setdefault(currency, []).append(country)
+
+        for entries in self.by_plan.values():
+            entries.sort(key=lambda item: (item[0], item[1]))
+
+    def plan_names(self) -> List[str]:
+        return sorted({plan_name for plan_name, _ in self.by_plan if plan_name})
+
+    def cheapest(self, plan_name: str, period: str = 'monthly', n: int = 10) -> List[Dict]:
+        result = []
+        for rank, (price_minor, country, plan) in enumerate(self.by_plan.get((plan_name, period), [])[:n], 1):
+            result.append({
+                'rank': rank,
+                'country_code': country,
+                'country_name_cn': self.countries[country].get('name_cn', country),
+                'plan_name': plan_name,
+                'original_price': plan.get(f'{period}_price_original'),
+                'currency': plan.get('currency_code'),
+                'price_cny': Money(price_minor, 'CNY').to_float(),
+                'price_cny_minor': price_minor,
+            })
+        return result
+
+    def country_history(self, country: str) -> List[Tuple[str, Dict]]:
+        """某国家在所有快照中的数据，第一次查询时从快照存储读取并缓存"""
+        with self._history_lock:
+            if country not in self._history:
+                self._history[country] = self.store.load_country_history(country)
+            return self._history[country]
+
+    def plan_history(self, country: str, plan_name: Optional[str] = None) -> List[Dict]:
+        history = []
+        for ts, block in self.country_history(country):
+            for plan in block.get('plans', []) if isinstance(block, dict) else []:
+                if plan_name and plan.get('plan_name') != plan_name:
+                    continue
+                history.append({'timestamp': ts, **plan})
+        return history
+
+
+class DisneyPriceService:
+    def __init__(self, data_file: str = "disneyplus_prices_processed.json",
+                 store: Optional[DisneySnapshotStore] = None, reload_interval: float = 5.0):
+        self.data_file = data_file
+        self.store = store or DisneySnapshotStore()
+        self.reload_interval = reload_interval
+        self.index: Optional[PriceIndex] = None
+        self._signature = None
+        # 规范化后的请求 -> (ETag, 响应体)，按最近使用顺序排列
+        self._response_cache: 'OrderedDict[Tuple, Tuple[str, bytes]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.reload_if_changed()
+
+    def _current_signature(self) -> Tuple:
+        stat = os.stat(self.data_file)
+        snapshots = self.store.list_snapshots('processed')
+        return stat.st_mtime_ns, stat.st_size, snapshots[-1] if snapshots else None
+
+    def reload_if_changed(self) -> bool:
+        """价格文件或最新快照变化时重建索引，返回是否重新加载"""
+        signature = self._current_signature()
+        if signature == self._signature:
+            return False
+
+        with open(self.data_file, 'rb') as f:
+            raw = f.read()
+        version = hashlib.sha1(raw + repr(signature[2]).encode('utf-8')).hexdigest()[:16]
+        index = PriceIndex(json.loads(raw.decode('utf-8')), version, self.store)
+
+        with self._lock:
+            self.index = index
+            self._signature = signature
+            self._response_cache = OrderedDict()
+        print(f"✅ 已加载价格数据: {len(index.countries)} 个国家，版本 {version}")
+        return True
+
+    def watch(self, stop_event: threading.Event):
+        """后台轮询文件变化"""
+        while not stop_event.wait(self.reload_interval):
+            try:
+                self.reload_if_changed()
+            except (OSError, ValueError) as e:
+                print(f"⚠️ 重新加载失败，继续使用旧数据: {e}")
+
+    @staticmethod
+    def parse_request(path: str, query: Dict[str, List[str]]) -> Tuple[Optional[Tuple], Optional[Tuple[int, object]]]:
+        """把请求规范化为 (路由, 参数...) 元组，返回 (请求键, 错误)；只保留路由用到的参数，
+        大小写、多余的斜杠和无关的查询参数不同的请求共用同一个缓存项"""
+        parts = [unquote(part) for part in path.strip('/').split('/') if part]
+        param = lambda name, default=None: query.get(name, [default])[0]
+
+        if parts in (['health'], ['top10'], ['plans']):
+            return (parts[0],), None
+        if parts == ['cheapest']:
+            period = param('period', 'monthly')
+            try:
+                n = int(param('n', '10'))
+            except ValueError:
+                return None, (400, {'error': 'n 必须是整数'})
+            if n < 1:
+                return None, (400, {'error': 'n 必须大于 0'})
+            if period not in PERIODS:
+                return None, (400, {'error': f'period 只能是 {"/".join(PERIODS)}'})
+            return ('cheapest', param('plan', 'Disney+ Premium'), period, min(n, MAX_CHEAPEST)), None
+        if len(parts) == 2 and parts[0] in ('countries', 'currencies'):
+            return (parts[0], parts[1].upper()), None
+        if len(parts) == 2 and parts[0] == 'history':
+            return ('history', parts[1].upper(), param('plan')), None
+        return None, (404, {'error': f'未知路径: {path}'})
+
+    def route(self, index: PriceIndex, key: Tuple) -> Tuple[int, object]:
+        name = key[0]
+        if name == 'health':
+            return 200, {'status': 'ok', 'version': index.version, 'countries': len(index.countries)}
+        if name == 'top10':
+            return 200, index.top_10
+        if name == 'plans':
+            return 200, index.plan_names()
+        if name == 'cheapest':
+            return 200, index.cheapest(*key[1:])
+        if name == 'countries':
+            info = index.countries.get(key[1])
+            return (200, info) if info else (404, {'error': f'未知国家: {key[1]}'})
+        if name == 'currencies':
+            countries = index.by_currency.get(key[1])
+            if not countries:
+                return 404, {'error': f'未知货币: {key[1]}'}
+            return 200, {country: index.countries[country] for country in countries}
+        return 200, index.plan_history(key[1], key[2])
+
+    def respond(self, raw_path: str) -> Tuple[int, str, bytes]:
+        """返回 (状态码, ETag, 响应体)；相同版本下等价请求的响应只序列化一次"""
+        url = urlparse(raw_path)
+        key, error = self.parse_request(url.path, parse_qs(url.query))
+        with self._lock:
+            index = self.index
+            cached = self._response_cache.get(key) if key else None
+            if cached:
+                self._response_cache.move_to_end(key)
+        if cached:
+            return 200, cached[0], cached[1]
+
+        status, payload = error or self.route(index, key)
+        body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        etag = '"%s-%s"' % (index.version, hashlib.sha1(body).hexdigest()[:16])
+        if status == 200:
+            with self._lock:
+                if self.index is index:
+                    self._response_cache[key] = (etag, body)
+                    self._response_cache.move_to_end(key)
+                    while len(self._response_cache) > RESPONSE_CACHE_SIZE:
+                        self._response_cache.popitem(last=False)
+        return status, etag, body
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 使用弱比较：逗号分隔的列表中任意一项去掉 W/ 前缀后与 ETag 相同，或为 * 时匹配"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def make_handler(service: DisneyPriceService):
+    class PriceRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            status, etag, body = service.respond(self.path)
+            if status == 200 and etag_matches(self.headers.get('If-None-Match'), etag):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            if status == 200:
+                self.send_header('ETag', etag)
+                self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return PriceRequestHandler
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Disney+ 本地价格查询服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--data', default='disneyplus_prices_processed.json', help='处理后的价格文件')
+    parser.add_argument('--reload-interval', type=float, default=5.0, help='检查数据更新的间隔（秒）')
+    args = parser.parse_args(argv)
+
+    service = DisneyPriceService(args.data, reload_interval=args.reload_interval)
+    stop_event = threading.Event()
+    threading.Thread(target=service.watch, args=(stop_event,), daemon=True).start()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"🚀 价格查询服务已启动: http://{args.host}:{args.port}")
+    print("   /cheapest?plan=Disney%2B%20Premium&n=10  /countries/KR  /currencies/EUR  /history/KR?plan=...  /top10  /plans")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 服务已停止")
+    finally:
+        stop_event.set()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
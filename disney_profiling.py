@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Disney+ 脚本性能剖析
+各脚本用 `with stage('convert'):` 标记阶段；带 --profile 参数或设置环境变量 DISNEY_PROFILE=1 运行时，
+每个阶段会生成 cProfile 统计 (<阶段>.prof) 和 tracemalloc 内存分配排行，
+结果写入 profiles/<脚本>_<时间戳>/，summary.json 可以用 compare 命令在两次运行之间对比。
+未启用时 stage() 不做任何事情。
+"""
+
+import atexit
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+PROFILE_ENV = 'DISNEY_PROFILE'
+PROFILE_FLAG = '--profile'
+DEFAULT_TOP_N = 15
+
+_active_profiler: Optional['DisneyProfiler'] = None
+
+
+class DisneyProfiler:
+    def __init__(self, script: str, out_dir: str = "profiles", top_n: int = DEFAULT_TOP_N):
+        self.script = script
+        self.top_n = top_n
+        self.started_at = datetime.now()
+        self.run_dir = os.path.join(out_dir, f"{script}_{self.started_at.strftime('%Y%m%d_%H%M%S')}")
+        self.stages: Dict[str, Dict] = {}
+        self._profiles: Dict[str, cProfile.Profile] = {}
+        # 当前打开的阶段（由外到内），各自记录进入时的内存和到目前为止的峰值
+        self._stack: List[Dict[str, int]] = []
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+
+    @contextmanager
+    def stage(self, name: str):
+        record = self.stages.setdefault(name, {
+            'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'peak_bytes': 0, 'alloc_top': [],
+        })
+        # cProfile 同一时间只能有一个在运行，嵌套阶段只记录耗时和内存峰值
+        outermost = not self._stack
+        profile = self._profiles.setdefault(name, cProfile.Profile()) if outermost else None
+        # 完整的内存快照开销较大，只在最外层阶段前后各取一次用于分配排行
+        before = tracemalloc.take_snapshot() if outermost else None
+
+        # tracemalloc 只有一个全局峰值：重置前先把到目前为止的峰值并入外层各阶段，外层的峰值不会丢失
+        start_memory, peak_so_far = tracemalloc.get_traced_memory()
+        for frame in self._stack:
+            frame['peak'] = max(frame['peak'], peak_so_far)
+        tracemalloc.reset_peak()
+        frame = {'start': start_memory, 'peak': start_memory}
+        self._stack.append(frame)
+
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        if profile:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile:
+                profile.disable()
+            wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+            # 并发的异步任务可能交错进出阶段，按对象移除自己的记录而不是弹出栈顶
+            self._stack.remove(frame)
+            peak = max(frame['peak'], tracemalloc.get_traced_memory()[1]) - frame['start']
+
+            record['calls'] += 1
+            record['wall_seconds'] += wall
+            record['cpu_seconds'] += cpu
+            if peak >= record['peak_bytes']:
+                record['peak_bytes'] = peak
+                if before is not None:
+                    # 多次进入同一阶段时保留峰值最高那次的分配排行
+                    record['alloc_top'] = self._alloc_top(before, tracemalloc.take_snapshot())
+
+    def _alloc_top(self, before, after) -> List[Dict]:
+        stats = after.compare_to(before, 'lineno')
+        stats.sort(key=lambda stat: stat.size_diff, reverse=True)
+        return [
+            {
+                'where': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                'size_diff': stat.size_diff,
+                'count_diff': stat.count_diff,
+            }
+            for stat in stats[:self.top_n] if stat.size_diff > 0
+        ]
+
+    def _top_functions(self, profile: cProfile.Profile) -> List[Dict]:
+        stats = pstats.Stats(profile, stream=io.StringIO())
+        rows = []
+        for (filename, lineno, func), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+            rows.append({
+                'function': f"{os.path.basename(filename)}:{lineno}({func})",
+                'ncalls': ncalls,
+                'tottime': round(tottime, 6),
+                'cumtime': round(cumtime, 6),
+            })
+        rows.sort(key=lambda row: row['cumtime'], reverse=True)
+        return rows[:self.top_n]
+
+    def finish(self) -> Optional[str]:
+        """写出 .prof、内存排行和 summary.json，返回输出目录"""
+        if not self.stages:
+            return None
+        os.makedirs(self.run_dir, exist_ok=True)
+
+        for name, record in self.stages.items():
+            profile = self._profiles.get(name)
+            if profile and profile.getstats():
+                profile.dump_stats(os.path.join(self.run_dir, f"{name}.prof"))
+                record['top_functions'] = self._top_functions(profile)
+            with open(os.path.join(self.run_dir, f"{name}.memory.txt"), 'w', encoding='utf-8') as f:
+                f.write(f"# {self.script} / {name}: 峰值 {record['peak_bytes'] / 1024:.1f} KB\n")
+                for row in record['alloc_top']:
+                    f.write(f"{row['size_diff'] / 1024:>10.1f} KB  {row['count_diff']:>8}  {row['where']}\n")
+
+        summary = {
+            'script': self.script,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'stages': self.stages,
+        }
+        with open(os.path.join(self.run_dir, 'summary.json'), 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"📈 性能剖析结果已写入: {self.run_dir}")
+        return self.run_dir
+
+
+def setup(script: str, argv: Optional[List[str]] = None) -> Optional[DisneyProfiler]:
+    """根据 --profile 参数或 DISNEY_PROFILE 环境变量启用剖析；会从 argv 中移除 --profile"""
+    global _active_profiler
+    argv = sys.argv if argv is None else argv
+    enabled = os.environ.get(PROFILE_ENV, '').lower() in ('1', 'true', 'yes')
+    while PROFILE_FLAG in argv:
+        argv.remove(PROFILE_FLAG)
+        enabled = True
+
+    if not enabled or _active_profiler is not None:
+        return _active_profiler
+    _active_profiler = DisneyProfiler(script)
+    atexit.register(_active_profiler.finish)
+    return _active_profiler
+
+
+@contextmanager
+def stage(name: str):
+    """标记一个阶段；未启用剖析时为空操作"""
+    if _active_profiler is None:
+        yield
+        return
+    with _active_profiler.stage(name):
+        yield
+
+
+def load_summary(path: str) -> Dict:
+    if os.path.isdir(path):
+        path = os.path.join(path, 'summary.json')
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare_runs(base_path: str, new_path: str) -> List[Dict]:
+    """逐阶段对比两次运行的耗时与内存峰值"""
+    base, new = load_summary(base_path)['stages'], load_summary(new_path)['stages']
+    rows = []
+    for name in list(base) + [n for n in new if n not in base]:
+        old_stage, new_stage = base.get(name), new.get(name)
+        row = {'stage': name}
+        for field in ('wall_seconds', 'peak_bytes'):
+            old_value = old_stage[field] if old_stage else None
+            new_value = new_stage[field] if new_stage else None
+            row[field] = (old_value, new_value)
+            row[f'{field}_ratio'] = new_value / old_value if old_value and new_value is not None else None
+        rows.append(row)
+    return rows
+
+
+def _format_ratio(ratio: Optional[float]) -> str:
+    return f"{ratio:.2f}x" if ratio is not None else "-"
+
+
+def main(argv: Optional[List[str]] = None):
+    """用法: python disney_profiling.py compare <旧运行目录> <新运行目录> | list"""
+    args = sys.argv[1:] if argv is None else argv
+
+    if args[:1] == ['list']:
+        if os.path.isdir('profiles'):
+            for name in sorted(os.listdir('profiles')):
+                print(name)
+        return
+
+    if args[:1] == ['compare'] and len(args) == 3:
+        print(f"{'阶段':<14}{'旧耗时(s)':>12}{'新耗时(s)':>12}{'比例':>9}{'旧峰值(KB)':>13}{'新峰值(KB)':>13}{'比例':>9}")
+        for row in compare_runs(args[1], args[2]):
+            old_wall, new_wall = row['wall_seconds']
+            old_peak, new_peak = row['peak_bytes']
+            fmt_time = lambda v: f"{v:.4f}" if v is not None else "-"
+            fmt_kb = lambda v: f"{v / 1024:.1f}" if v is not None else "-"
+            print(f"{row['stage']:<14}{fmt_time(old_wall):>12}{fmt_time(new_wall):>12}"
+                  f"{_format_ratio(row['wall_seconds_ratio']):>9}"
+                  f"{fmt_kb(old_peak):>13}{fmt_kb(new_peak):>13}{_format_ratio(row['peak_bytes_ratio']):>9}")
+        return
+
+    print("用法: python disney_profiling.py compare <旧运行目录> <新运行目录> | list")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,22 @@
+import heapq
+import itertools
 import json
 import requests
 import re
+import sys
+import tempfile
 import time
 from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
+from operator import itemgetter
 
 import os
 
+from disney_aggregates import write_aggregates
+from disney_binary_snapshot import sidecar_path, write_sidecar
+from disney_money import Money, currency_exponent
+from disney_plan_identity import canonical_plan_id
+from disney_profiling import setup as setup_profiling, stage
+
 # --- Configuration ---
 
 # 尝试加载 .env 文件（如果存在）
@@ -16,20 +27,23 @@ except ImportError:
     # dotenv 不是必需的依赖
     pass
 
-# 从环境变量获取API密钥，如果没有则使用默认值（仅用于本地测试）
-API_KEYS = []
+def load_api_keys():
+    """从环境变量获取API密钥"""
+    api_keys = []
+
+    # 读取API密钥
+    api_key = os.getenv('API_KEY')
+    if api_key:
+        api_keys.append(api_key)
 
-# 读取API密钥
-api_key = os.getenv('API_KEY')
-if api_key:
-    API_KEYS.append(api_key)
+    # 没有环境变量时直接退出
+    if not api_keys:
+        print("错误：未找到API密钥！")
+        print("请设置环境变量 API_KEY 或在 .env 文件中配置")
+        print("获取免费API密钥: https://openexchangerates.org/")
+        exit(1)
+    return api_keys
 
-# 如果没有环境变量，使用默认密钥（仅用于本地开发测试）
-if not API_KEYS:
-    print("错误：未找到API密钥！")
-    print("请设置环境变量 API_KEY 或在 .env 文件中配置")
-    print("获取免费API密钥: https://openexchangerates.org/")
-    exit(1)
 API_URL_TEMPLATE = "https://openexchangerates.org/api/latest.json?app_id={}"
 INPUT_JSON_PATH = 'disneyplus_prices.json' # Input JSON file path
 OUTPUT_JSON_PATH = 'disneyplus_prices_processed.json' # New output file path
@@ -356,32 +370,62 @@ def convert_to_cny(amount, currency_code, rates):
         print(f"转换 {amount} {currency_code} 时出错: {e}")
         return None
 
+def premium_plan_price(country_info):
+    """返回 (Disney+ Premium 月付 CNY 价格的整数分, 套餐)；没有可用价格时返回 None。排序直接比较整数分"""
+    target_plan = None
+
+    # 精确查找名为“Disney+ Premium”的套餐
+    for plan in country_info.get('plans', []):
+        if plan.get('plan_name') == "Disney+ Premium":
+            target_plan = plan
+            break
+
+    if target_plan and target_plan.get('monthly_price_cny') is not None:
+        price_cny_minor = target_plan.get('monthly_price_cny_minor')
+        if type(price_cny_minor) is int:
+            return price_cny_minor, target_plan
+        # 旧数据没有整数字段时解析字符串
+        price_cny = Money.parse(target_plan['monthly_price_cny'])
+        if price_cny is not None:
+            return price_cny.minor, target_plan
+    return None
+
+
+def top_10_entry(rank, country_code, country_info, plan, price_cny_minor):
+    country_name_cn = COUNTRY_INFO.get(country_code, {}).get('name_cn', country_info.get('name_cn', country_code))
+    return {
+        'rank': rank,
+        'country_code': country_code,
+        'country_name_cn': country_name_cn,
+        'plan_name': plan.get('plan_name'),
+        'original_price': plan.get('monthly_price_original'),
+        'currency': plan.get('currency_code'),
+        'price_cny': Money(price_cny_minor, 'CNY').to_float()
+    }
+
+
+def top_10_header(top_10_cheapest):
+    return {
+        'description': '最便宜的10个Disney+ Premium套餐 (按月付)',
+        'updated_at': time.strftime('%Y-%m-%d'),
+        'data': top_10_cheapest
+    }
+
+
 def sort_by_premium_plan_cny(processed_data):
     """按“Disney+ Premium”套餐的CNY月度价格从低到高排序国家，并在JSON前面添加最便宜的10个。"""
     countries_with_plan_price = []
     countries_without_plan_price = []
     
     for country_code, country_info in processed_data.items():
-        target_plan = None
-        
-        # 精确查找名为“Disney+ Premium”的套餐
-        for plan in country_info.get('plans', []):
-            if plan.get('plan_name') == "Disney+ Premium":
-                target_plan = plan
-                break
-        
-        if target_plan and target_plan.get('monthly_price_cny') is not None:
-            price_cny_str = target_plan['monthly_price_cny'].replace('CNY ', '')
-            try:
-                price_cny = float(price_cny_str)
-                countries_with_plan_price.append((country_code, price_cny, country_info, target_plan))
-            except (ValueError, TypeError):
-                countries_without_plan_price.append((country_code, country_info))
+        premium = premium_plan_price(country_info)
+        if premium is not None:
+            countries_with_plan_price.append((country_code, premium[0], country_info, premium[1]))
         else:
             countries_without_plan_price.append((country_code, country_info))
             
-    # 按CNY价格排序
-    countries_with_plan_price.sort(key=lambda x: x[1])
+    # 按CNY价格（整数分）排序
+    countries_with_plan_price.sort(key=itemgetter(1))
     
     # 创建排序后的结果
     sorted_data = {}
@@ -389,23 +433,9 @@ def sort_by_premium_plan_cny(processed_data):
     # 添加Top 10摘要
     top_10_cheapest = []
     for i, (country_code, price_cny, country_info, plan) in enumerate(countries_with_plan_price[:10]):
-        country_name_cn = COUNTRY_INFO.get(country_code, {}).get('name_cn', country_info.get('name_cn', country_code))
-        
-        top_10_cheapest.append({
-            'rank': i + 1,
-            'country_code': country_code,
-            'country_name_cn': country_name_cn,
-            'plan_name': plan.get('plan_name'),
-            'original_price': plan.get('monthly_price_original'),
-            'currency': plan.get('currency_code'),
-            'price_cny': price_cny
-        })
+        top_10_cheapest.append(top_10_entry(i + 1, country_code, country_info, plan, price_cny))
         
-    sorted_data['_top_10_cheapest_premium_plans'] = {
-        'description': '最便宜的10个Disney+ Premium套餐 (按月付)',
-        'updated_at': time.strftime('%Y-%m-%d'),
-        'data': top_10_cheapest
-    }
+    sorted_data['_top_10_cheapest_premium_plans'] = top_10_header(top_10_cheapest)
     
     # 添加所有国家的数据
     for country_code, price_cny, country_info, plan in countries_with_plan_price:
@@ -416,36 +446,8 @@ def sort_by_premium_plan_cny(processed_data):
         
     return sorted_data
 
-# --- Main Script ---
-
-# 1. Fetch Exchange Rates
-print("正在获取汇率...")
-exchange_rates = get_exchange_rates(API_KEYS, API_URL_TEMPLATE)
-if not exchange_rates: exit()
-else:
-    print(f"基础货币: USD。找到 {len(exchange_rates)} 个汇率。")
-    if 'CNY' in exchange_rates: print(f"USD 到 CNY 汇率: {exchange_rates['CNY']:.4f}")
-    else: print("警告：获取的数据中未找到 CNY 汇率！")
-
-# 2. Load Input JSON
-print(f"正在从 {INPUT_JSON_PATH} 加载数据...")
-try:
-    with open(INPUT_JSON_PATH, 'r', encoding='utf-8') as f: data = json.load(f)
-    print("数据加载成功。")
-except FileNotFoundError: print(f"错误：输入文件未找到于 {INPUT_JSON_PATH}"); exit()
-except json.JSONDecodeError as e: print(f"错误：无法解码来自 {INPUT_JSON_PATH} 的 JSON: {e}"); exit()
-except Exception as e: print(f"加载文件时发生意外错误: {e}"); exit()
-
-# 3. Process Data
-print("正在处理订阅数据...")
-processed_data = {}
-
-for country_iso, plans in data.items():
-    if country_iso not in COUNTRY_INFO:
-        print(f"警告：跳过国家/地区 {country_iso} - 在 COUNTRY_INFO 中未找到信息。")
-        continue
-
-    country_details = COUNTRY_INFO[country_iso]
+def process_country(country_iso, plans, country_details, rates):
+    """Converts one country's raw plans. Returns the processed country entry or None."""
     country_name_cn = country_details.get('name_cn', country_details.get('name_en', country_iso))
     processed_plans_list = []
     print(f"正在处理 {country_name_cn} ({country_iso})...")
@@ -460,40 +462,253 @@ for country_iso, plans in data.items():
         standard_plan_name = standardize_plan_name(original_plan_name)
         extracted_prices, final_currency_code = extract_prices_and_currency(price_text, country_details)
 
+        # 每个金额字符串旁边带一个整数最小单位字段 (*_minor)，小数位数见 currency_exponent
         plan_output = {
             "plan_name": standard_plan_name,
+            "plan_id": canonical_plan_id(standard_plan_name),
             "currency_code": final_currency_code if final_currency_code else "N/A",
-            "monthly_price_original": None, "monthly_price_cny": None,
-            "annual_price_original": None, "annual_price_cny": None,
+            "currency_exponent": currency_exponent(final_currency_code),
+            "monthly_price_original": None, "monthly_price_original_minor": None,
+            "monthly_price_cny": None, "monthly_price_cny_minor": None,
+            "annual_price_original": None, "annual_price_original_minor": None,
+            "annual_price_cny": None, "annual_price_cny_minor": None,
         }
 
         if not final_currency_code: print(f"  警告：计划 '{standard_plan_name}' 无法检测到货币，无法进行转换。")
         else:
-            if 'monthly' in extracted_prices and extracted_prices['monthly'] is not None:
-                monthly_price = extracted_prices['monthly']
-                plan_output["monthly_price_original"] = f"{final_currency_code} {monthly_price}"
-                cny_equiv = convert_to_cny(monthly_price, final_currency_code, exchange_rates)
-                if cny_equiv is not None: plan_output["monthly_price_cny"] = f"CNY {cny_equiv}"
-
-            if 'annual' in extracted_prices and extracted_prices['annual'] is not None:
-                annual_price = extracted_prices['annual']
-                plan_output["annual_price_original"] = f"{final_currency_code} {annual_price}"
-                cny_equiv = convert_to_cny(annual_price, final_currency_code, exchange_rates)
-                if cny_equiv is not None: plan_output["annual_price_cny"] = f"CNY {cny_equiv}"
+            for period in ('monthly', 'annual'):
+                price = extracted_prices.get(period)
+                if price is None:
+                    continue
+                plan_output[f"{period}_price_original"] = f"{final_currency_code} {price}"
+                plan_output[f"{period}_price_original_minor"] = Money.from_decimal(price, final_currency_code).minor
+                cny_equiv = convert_to_cny(price, final_currency_code, rates)
+                if cny_equiv is not None:
+                    plan_output[f"{period}_price_cny"] = f"CNY {cny_equiv}"
+                    plan_output[f"{period}_price_cny_minor"] = Money.from_decimal(cny_equiv, 'CNY').minor
 
         processed_plans_list.append(plan_output)
 
     if processed_plans_list:
-        processed_data[country_iso] = {"name_cn": country_name_cn, "plans": processed_plans_list}
-    else: print(f"  未找到 {country_name_cn} ({country_iso}) 的可处理计划。")
+        return {"name_cn": country_name_cn, "plans": processed_plans_list}
+    print(f"  未找到 {country_name_cn} ({country_iso}) 的可处理计划。")
+    return None
 
-# 4. Sort data and add Top 10
-sorted_data = sort_by_premium_plan_cny(processed_data)
 
-# 5. Output Processed Data
-print(f"正在将处理后的数据保存到 {OUTPUT_JSON_PATH}...")
-try:
-    with open(OUTPUT_JSON_PATH, 'w', encoding='utf-8') as f:
-        json.dump(sorted_data, f, ensure_ascii=False, indent=2)
+def process_prices(data, rates, country_info=None):
+    """Converts the raw scraper output into the processed (unsorted) structure."""
+    country_info = COUNTRY_INFO if country_info is None else country_info
+    processed_data = {}
+    for country_iso, plans in data.items():
+        if country_iso not in country_info:
+            print(f"警告：跳过国家/地区 {country_iso} - 在 COUNTRY_INFO 中未找到信息。")
+            continue
+        country_entry = process_country(country_iso, plans, country_info[country_iso], rates)
+        if country_entry:
+            processed_data[country_iso] = country_entry
+    return processed_data
+
+
+def convert_prices(data, rates):
+    """Processes raw scraper output and returns the sorted structure with the Top 10 header."""
+    print("正在处理订阅数据...")
+    with stage('convert'):
+        processed_data = process_prices(data, rates)
+    with stage('sort'):
+        return sort_by_premium_plan_cny(processed_data)
+
+
+def save_processed_data(sorted_data, output_path=OUTPUT_JSON_PATH):
+    print(f"正在将处理后的数据保存到 {output_path}...")
+    try:
+        with stage('write'), open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(sorted_data, f, ensure_ascii=False, indent=2)
+        print("处理完成。输出已保存。")
+    except Exception as e: print(f"保存输出文件时出错: {e}")
+
+
+# --- Streaming mode ---
+# 输入按国家逐个解析、逐个转换，转换结果先写入临时 spill 文件，
+# 内存中只保留每个国家的排序键与偏移量，以及大小为 TOP_N 的排行堆。
+
+TOP_N = 10
+STREAM_CHUNK_SIZE = 1 << 16
+
+
+def iter_json_object_items(f, chunk_size=STREAM_CHUNK_SIZE):
+    """逐个产出顶层 JSON 对象中的 (键, 值)，每次只在缓冲区中保留当前正在解析的值。"""
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    def decode_value():
+        nonlocal pos
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            # 数字等标量可能恰好在缓冲区末尾被截断，读到更多内容后再确认
+            if end == len(buffer) and not eof:
+                fill()
+                continue
+            pos = end
+            return value
+
+    def expect(chars):
+        nonlocal pos
+        skip_whitespace()
+        if pos >= len(buffer) or buffer[pos] not in chars:
+            found = buffer[pos:pos + 1] or 'EOF'
+            raise ValueError(f"JSON 格式错误：期望 {chars!r}，实际为 {found!r}")
+        pos += 1
+        return buffer[pos - 1]
+
+    fill()
+    expect('{')
+    skip_whitespace()
+    if buffer[pos:pos + 1] == '}':
+        return
+    while True:
+        skip_whitespace()
+        key = decode_value()
+        expect(':')
+        skip_whitespace()
+        yield key, decode_value()
+        if expect(',}') == '}':
+            return
+
+
+def _indented_json(value, indent=2, level=1):
+    """与 json.dump(indent=2) 写在对象第 level 层时的格式一致"""
+    text = json.dumps(value, ensure_ascii=False, indent=indent)
+    return text.replace('\n', '\n' + ' ' * (indent * level))
+
+
+def convert_prices_streaming(input_path, output_path, rates, country_info=None, top_n=TOP_N):
+    """流式转换：输出与 convert_prices + save_processed_data 相同，峰值内存只与最大的单个国家有关。"""
+    country_info = COUNTRY_INFO if country_info is None else country_info
+    ranked = []      # (CNY 价格（分）, 偏移, 长度)，列表按输入顺序追加，稳定排序保持同价时的先后
+    unranked = []    # (偏移, 长度)
+    top_heap = []    # (-CNY 价格（分）, -序号, 排行条目)，只保留最便宜的 top_n 个
+
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    with tempfile.TemporaryFile('w+b', dir=output_dir) as spill:
+        print(f"正在从 {input_path} 流式处理订阅数据...")
+        with stage('convert'), open(input_path, 'r', encoding='utf-8') as f:
+            for seq, (country_iso, plans) in enumerate(iter_json_object_items(f)):
+                if country_iso not in country_info:
+                    print(f"警告：跳过国家/地区 {country_iso} - 在 COUNTRY_INFO 中未找到信息。")
+                    continue
+                country_entry = process_country(country_iso, plans, country_info[country_iso], rates)
+                if not country_entry:
+                    continue
+
+                # spill 中直接存放输出片段（含国家键），最后按排序结果拼接
+                offset = spill.tell()
+                spill.write(f',\n  {json.dumps(country_iso, ensure_ascii=False)}: '.encode('utf-8'))
+                spill.write(_indented_json(country_entry).encode('utf-8'))
+                length = spill.tell() - offset
+
+                premium = premium_plan_price(country_entry)
+                if premium is None:
+                    unranked.append((offset, length))
+                    continue
+                price_cny_minor, plan = premium
+                ranked.append((price_cny_minor, offset, length))
+                item = (-price_cny_minor, -seq, top_10_entry(0, country_iso, country_entry, plan, price_cny_minor))
+                if len(top_heap) < top_n:
+                    heapq.heappush(top_heap, item)
+                else:
+                    heapq.heappushpop(top_heap, item)
+
+        with stage('sort'):
+            ranked.sort(key=lambda x: x[0])
+            top_10_cheapest = [entry for _, _, entry in sorted(top_heap, reverse=True)]
+            for rank, entry in enumerate(top_10_cheapest, 1):
+                entry['rank'] = rank
+
+        print(f"正在将处理后的数据保存到 {output_path}...")
+        with stage('write'), open(output_path, 'w', encoding='utf-8') as out:
+            out.write('{\n  "_top_10_cheapest_premium_plans": ')
+            out.write(_indented_json(top_10_header(top_10_cheapest)))
+            for offset, length in itertools.chain((item[1:] for item in ranked), unranked):
+                spill.seek(offset)
+                out.write(spill.read(length).decode('utf-8'))
+            out.write('\n}')
     print("处理完成。输出已保存。")
-except Exception as e: print(f"保存输出文件时出错: {e}")
\ No newline at end of file
+    return len(ranked) + len(unranked)
+
+
+def report_exchange_rates(exchange_rates):
+    print(f"基础货币: USD。找到 {len(exchange_rates)} 个汇率。")
+    if 'CNY' in exchange_rates: print(f"USD 到 CNY 汇率: {exchange_rates['CNY']:.4f}")
+    else: print("警告：获取的数据中未找到 CNY 汇率！")
+
+
+# --- Main Script ---
+
+def main():
+    setup_profiling('disney_rate_converter')
+    api_keys = load_api_keys()
+
+    # 1. Fetch Exchange Rates
+    print("正在获取汇率...")
+    with stage('fetch'):
+        exchange_rates = get_exchange_rates(api_keys, API_URL_TEMPLATE)
+    if not exchange_rates: exit()
+    else: report_exchange_rates(exchange_rates)
+
+    # --stream: 逐个国家读取和转换，适合远大于内存的输入
+    if '--stream' in sys.argv[1:]:
+        try:
+            convert_prices_streaming(INPUT_JSON_PATH, OUTPUT_JSON_PATH, exchange_rates)
+        except FileNotFoundError: print(f"错误：输入文件未找到于 {INPUT_JSON_PATH}"); exit()
+        except ValueError as e: print(f"错误：无法解码来自 {INPUT_JSON_PATH} 的 JSON: {e}"); exit()
+        # 聚合视图同样逐个国家读取输出文件
+        with stage('aggregate'), open(OUTPUT_JSON_PATH, 'r', encoding='utf-8') as f:
+            write_aggregates(iter_json_object_items(f), OUTPUT_JSON_PATH)
+        return
+
+    # 2. Load Input JSON
+    print(f"正在从 {INPUT_JSON_PATH} 加载数据...")
+    try:
+        with stage('load'), open(INPUT_JSON_PATH, 'r', encoding='utf-8') as f: data = json.load(f)
+        print("数据加载成功。")
+    except FileNotFoundError: print(f"错误：输入文件未找到于 {INPUT_JSON_PATH}"); exit()
+    except json.JSONDecodeError as e: print(f"错误：无法解码来自 {INPUT_JSON_PATH} 的 JSON: {e}"); exit()
+    except Exception as e: print(f"加载文件时发生意外错误: {e}"); exit()
+
+    # 3. Process Data, sort and add Top 10
+    sorted_data = convert_prices(data, exchange_rates)
+
+    # 4. Output Processed Data
+    save_processed_data(sorted_data)
+    write_sidecar(sorted_data, sidecar_path(OUTPUT_JSON_PATH))
+
+    # 5. Materialized aggregate views
+    with stage('aggregate'):
+        write_aggregates(sorted_data.items(), OUTPUT_JSON_PATH)
+
+
+if __name__ == '__main__':
+    main()
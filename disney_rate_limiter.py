@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Disney+ 帮助中心请求的自适应限流
+按主机控制并发数：请求快速成功时缓慢加大并发（加法增长），遇到 429 / 5xx / 超时或延迟过高时成倍减小（乘法减小），
+连续失败或服务端要求 Retry-After 时熔断该主机一段时间并说明原因，结束时输出最终稳定的并发与吞吐量。
+"""
+
+import asyncio
+import functools
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+THROTTLED = 'throttled'
+SERVER_ERROR = 'server_error'
+UNAVAILABLE = 'unavailable'
+CLIENT_ERROR = 'client_error'
+OTHER_ERROR = 'error'
+# 这些结果说明主机已经过载，需要减小并发并可以重试
+CONGESTION_KINDS = (THROTTLED, SERVER_ERROR, UNAVAILABLE)
+
+
+class HostStatusError(Exception):
+    """非 requests 发起的请求（例如页面导航）返回了错误状态码"""
+
+    def __init__(self, status: int, retry_after: Optional[float] = None, message: str = ''):
+        super().__init__(message or f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        # HTTP 日期格式的 Retry-After 很少见，按默认冷却时间处理
+        return None
+
+
+def classify_status(status: int) -> Optional[str]:
+    if status == 429:
+        return THROTTLED
+    if status >= 500:
+        return SERVER_ERROR
+    if status >= 400:
+        return CLIENT_ERROR
+    return None
+
+
+def classify_exception(e: Exception) -> Tuple[str, Optional[int], Optional[float]]:
+    """返回 (结果类型, 状态码, Retry-After 秒数)"""
+    if isinstance(e, HostStatusError):
+        return classify_status(e.status) or OTHER_ERROR, e.status, e.retry_after
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        status = e.response.status_code
+        return (classify_status(status) or OTHER_ERROR, status,
+                parse_retry_after(e.response.headers.get('Retry-After')))
+    if isinstance(e, (requests.Timeout, requests.ConnectionError, asyncio.TimeoutError, TimeoutError)):
+        return UNAVAILABLE, None, None
+    return OTHER_ERROR, None, None
+
+
+class CircuitBreaker:
+    """单个主机的熔断器：closed → open（暂停请求）→ half-open（放行一个探测请求）→ closed"""
+
+    def __init__(self, host: str, failure_threshold: int = 5, cooldown: float = 5.0,
+                 max_cooldown: float = 120.0, verbose: bool = True):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.verbose = verbose
+        self.state = 'closed'
+        self.failures = 0
+        self.cooldown = cooldown
+        self.open_until = 0.0
+        self.opens = 0
+        self.reasons: List[str] = []
+        self.probe_inflight = False
+
+    def wait_time(self) -> float:
+        """距离可以发送请求还需等待的秒数；冷却结束后转为 half-open"""
+        if self.state == 'open':
+            remaining = self.open_until - time.monotonic()
+            if remaining > 0:
+                return remaining
+            self.state = 'half-open'
+        if self.state == 'half-open' and self.probe_inflight:
+            return 0.05
+        return 0.0
+
+    def record_success(self):
+        if self.state == 'half-open' and self.verbose:
+            print(f"✅ {self.host} 探测请求成功，恢复正常请求")
+        self.state = 'closed'
+        self.failures = 0
+        self.cooldown = self.base_cooldown
+
+    def record_failure(self, reason: str, retry_after: Optional[float] = None):
+        self.failures += 1
+        if self.state == 'half-open':
+            self.trip(f"探测请求失败: {reason}")
+        elif retry_after is not None:
+            self.trip(f"服务端要求 Retry-After {retry_after:g} 秒: {reason}", retry_after)
+        elif self.failures >= self.failure_threshold:
+            self.trip(f"连续 {self.failures} 次失败，最近一次: {reason}")
+
+    def trip(self, reason: str, retry_after: Optional[float] = None):
+        cooldown = max(self.cooldown, retry_after or 0.0)
+        until = time.monotonic() + cooldown
+        if self.state == 'open':
+            # 并发请求同时失败时只延长冷却时间，不重复计数
+            self.open_until = max(self.open_until, until)
+            return
+        self.state = 'open'
+        self.open_until = until
+        self.opens += 1
+        self.reasons.append(reason)
+        self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+        if self.verbose:
+            print(f"⚠️ {self.host} 熔断 {cooldown:.1f} 秒: {reason}")
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """最近秩法百分位数，q 取 0-100"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(int(round(q / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+class HostStats:
+    def __init__(self):
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.completed = 0
+        self.latencies: List[float] = []
+        self.attempts = 0
+        self.outcomes: Dict[str, int] = {}
+        self.latency_total = 0.0
+        self.limit_avg: Optional[float] = None
+        self.limit_min: Optional[float] = None
+        self.limit_max: Optional[float] = None
+
+
+class DisneyRateLimiter:
+    def __init__(self, initial_limit: float = 4, min_limit: float = 1, max_limit: float = 32,
+                 target_latency: float = 2.0, increase: float = 1.0, decrease: float = 0.5,
+                 latency_decrease: float = 0.8, failure_threshold: int = 5, cooldown: float = 5.0,
+                 max_cooldown: float = 120.0, max_attempts: int = 3, verbose: bool = True):
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_decrease = latency_decrease
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.max_attempts = max_attempts
+        self.verbose = verbose
+
+        self.limits: Dict[str, float] = {}
+        self.inflight: Dict[str, int] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.stats: Dict[str, HostStats] = {}
+        self._latency: Dict[str, float] = {}
+        self._last_decrease: Dict[str, float] = {}
+        self._condition: Optional[asyncio.Condition] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _host(self, host: str):
+        if host not in self.limits:
+            self.limits[host] = float(self.initial_limit)
+            self.inflight[host] = 0
+            self.breakers[host] = CircuitBreaker(host, self.failure_threshold, self.cooldown,
+                                                 self.max_cooldown, self.verbose)
+            self.stats[host] = HostStats()
+        return self.breakers[host], self.stats[host]
+
+    async def _acquire(self, host: str) -> bool:
+        """等待并占用一个并发名额，返回本次请求是否为 half-open 状态下的探测请求"""
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        breaker, stats = self._host(host)
+        async with self._condition:
+            while True:
+                wait = breaker.wait_time()
+                if wait <= 0 and self.inflight[host] < max(int(self.limits[host]), 1):
+                    break
+                try:
+                    # 熔断期间按剩余冷却时间等待，否则等其他请求释放并发名额
+                    await asyncio.wait_for(self._condition.wait(), timeout=wait or None)
+                except asyncio.TimeoutError:
+                    pass
+            probe = breaker.state == 'half-open'
+            if probe:
+                breaker.probe_inflight = True
+            self.inflight[host] += 1
+            if stats.started_at is None:
+                stats.started_at = time.monotonic()
+            stats.attempts += 1
+            return probe
+
+    async def _release(self, host: str, probe: bool):
+        async with self._condition:
+            self.inflight[host] -= 1
+            if probe:
+                # 只有探测请求自己结束时才放行下一个探测；熔断前发出、此时才返回的请求不影响
+                self.breakers[host].probe_inflight = False
+            self._condition.notify_all()
+
+    def _adjust(self, host: str, kind: Optional[str], latency: float, retry_after: Optional[float], reason: str,
+                probe: bool = False):
+        breaker, stats = self.breakers[host], self.stats[host]
+        # 熔断后只有探测请求的结果能让熔断器恢复或重新打开；熔断前发出、此时才返回的请求不算
+        stale = breaker.state != 'closed' and not probe
+        stats.outcomes[kind or 'ok'] = stats.outcomes.get(kind or 'ok', 0) + 1
+        stats.latency_total += latency
+        stats.finished_at = time.monotonic()
+        smoothed = self._latency.get(host)
+        self._latency[host] = latency if smoothed is None else smoothed * 0.8 + latency * 0.2
+
+        limit = self.limits[host]
+        if kind is None:
+            stats.completed += 1
+            stats.latencies.append(latency)
+            if not stale:
+                breaker.record_success()
+            if latency > self.target_latency:
+                limit = self._decrease(host, limit, self.latency_decrease)
+            else:
+                # 每一轮（约 limit 个请求）并发加 increase
+                limit += self.increase / limit
+        elif kind in CONGESTION_KINDS:
+            if not (stale and breaker.state == 'half-open'):
+                # 熔断期间的失败仍可延长冷却时间（例如更长的 Retry-After）
+                breaker.record_failure(reason, retry_after)
+            limit = self._decrease(host, limit, self.decrease)
+        self.limits[host] = min(max(limit, self.min_limit), self.max_limit)
+
+        current = self.limits[host]
+        stats.limit_avg = current if stats.limit_avg is None else stats.limit_avg * 0.95 + current * 0.05
+        stats.limit_min = current if stats.limit_min is None else min(stats.limit_min, current)
+        stats.limit_max = current if stats.limit_max is None else max(stats.limit_max, current)
+
+    def _decrease(self, host: str, limit: float, factor: float) -> float:
+        # 同一批在途请求先后返回的失败信号只减小一次：两次减小至少间隔一个平均延迟
+        now = time.monotonic()
+        window = max(self._latency.get(host, 0.0), 0.05)
+        if now - self._last_decrease.get(host, 0.0) < window:
+            return limit
+        self._last_decrease[host] = now
+        return limit * factor
+
+    @asynccontextmanager
+    async def slot(self, host: str):
+        """占用一个并发名额；退出时根据耗时和异常调整该主机的并发上限"""
+        probe = await self._acquire(host)
+        start = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            kind, status, retry_after = classify_exception(e)
+            reason = f"HTTP {status}" if status else f"{type(e).__name__}: {e}"
+            self._adjust(host, kind, time.monotonic() - start, retry_after, reason, probe)
+            raise
+        else:
+            self._adjust(host, None, time.monotonic() - start, None, '', probe)
+        finally:
+            await self._release(host, probe)
+
+    async def call(self, host: str, func, *args, **kwargs):
+        """在限流下调用 func（同步函数在线程池中执行），过载类错误最多重试 max_attempts 次"""
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                async with self.slot(host):
+                    if asyncio.iscoroutinefunction(func):
+                        return await func(*args, **kwargs)
+                    return await asyncio.get_running_loop().run_in_executor(
+                        self._get_executor(), functools.partial(func, *args, **kwargs))
+            except Exception as e:
+                if attempt == self.max_attempts or classify_exception(e)[0] not in CONGESTION_KINDS:
+                    raise
+                await asyncio.sleep(random.uniform(0, min(0.5 * 2 ** attempt, 10)))
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # 默认线程池只有 CPU 数 + 4 个线程，会在限流器之前先限制住并发
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=int(self.max_limit), thread_name_prefix='disney-http')
+        return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def summary(self) -> Dict[str, Dict]:
+        result = {}
+        for host, stats in self.stats.items():
+            elapsed = (stats.finished_at or time.monotonic()) - (stats.started_at or time.monotonic())
+            attempts_done = sum(stats.outcomes.values())
+            result[host] = {
+                'completed': stats.completed,
+                'attempts': stats.attempts,
+                'outcomes': dict(stats.outcomes),
+                'elapsed_seconds': round(elapsed, 3),
+                'throughput_per_second': round(stats.completed / elapsed, 2) if elapsed > 0 else None,
+                'avg_latency_seconds': round(stats.latency_total / attempts_done, 3) if attempts_done else None,
+                'latency_percentiles': {
+                    f'p{q}': round(percentile(stats.latencies, q), 4) if stats.latencies else None
+                    for q in (50, 95, 99)
+                },
+                'final_limit': round(self.limits[host], 2),
+                'settled_limit': round(stats.limit_avg, 2) if stats.limit_avg is not None else None,
+                'limit_range': [round(stats.limit_min or 0, 2), round(stats.limit_max or 0, 2)],
+                'circuit_opens': self.breakers[host].opens,
+                'circuit_reasons': list(self.breakers[host].reasons),
+            }
+        return result
+
+    def report(self):
+        for host, info in self.summary().items():
+            failures = ', '.join(f"{kind} {count}" for kind, count in info['outcomes'].items() if kind != 'ok')
+            print(f"📈 {host}: 完成 {info['completed']} 个请求,吞吐 {info['throughput_per_second']} 次/秒,"
+                  f"并发稳定在 {info['settled_limit']} (区间 {info['limit_range'][0]}-{info['limit_range'][1]}),"
+                  f"熔断 {info['circuit_opens']} 次" + (f",失败: {failures}" if failures else ''))
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Disney+ 分片抓取与合并
+`python disney.py --shard 2/8` 只抓取按国家代码 crc32 分到第 2 片的国家，结果写入
+disneyplus_prices.shard-2-of-8.json（带本片负责的国家列表）。各片可以在不同机器或容器上并行运行，
+全部完成后用 merge 合并为 disneyplus_prices.json：分片必须齐全、国家不能重复、每个国家都要有数据。
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import zlib
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from disney_fragment_store import FRAGMENT_DIR, DisneyFragmentStore
+
+OUTPUT_FILE = 'disneyplus_prices.json'
+
+
+class ShardSpec(NamedTuple):
+    index: int   # 从 1 开始
+    count: int
+
+    @classmethod
+    def parse(cls, spec: str) -> 'ShardSpec':
+        """'2/8' -> ShardSpec(2, 8)"""
+        match = re.fullmatch(r'\s*(\d+)\s*/\s*(\d+)\s*', spec or '')
+        if not match:
+            raise ValueError(f"分片格式应为 k/n,例如 2/8: {spec!r}")
+        index, count = int(match.group(1)), int(match.group(2))
+        if count < 1 or not 1 <= index <= count:
+            raise ValueError(f"分片序号必须在 1 到 {count} 之间: {spec!r}")
+        return cls(index, count)
+
+    @property
+    def label(self) -> str:
+        return f"{self.index}/{self.count}"
+
+    @property
+    def suffix(self) -> str:
+        return f"shard-{self.index}-of-{self.count}"
+
+    def contains(self, country_code: str) -> bool:
+        return shard_of(country_code, self.count) == self.index
+
+
+def shard_argument(spec: str) -> ShardSpec:
+    """argparse 的 type，解析失败时给出具体原因"""
+    try:
+        return ShardSpec.parse(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def shard_of(country_code: str, count: int) -> int:
+    """国家代码的 crc32 对分片数取模；与进程、Python 版本无关，每台机器结果相同"""
+    return zlib.crc32(country_code.encode('utf-8')) % count + 1
+
+
+def shard_path(path: str, shard: ShardSpec) -> str:
+    """disneyplus_prices.json -> disneyplus_prices.shard-2-of-8.json"""
+    base, ext = os.path.splitext(path)
+    return f"{base}.{shard.suffix}{ext}"
+
+
+def write_partial(shard: ShardSpec, all_countries: List[str], prices: Dict[str, Any],
+                  output_file: str = OUTPUT_FILE) -> str:
+    """写出分片结果；countries 记录本片负责的全部国家，合并时据此检查覆盖是否完整"""
+    path = shard_path(output_file, shard)
+    partial = {
+        'shard': {
+            'index': shard.index,
+            'count': shard.count,
+            'countries': [code for code in all_countries if shard.contains(code)],
+            'all_countries': all_countries,
+            'scraped_at': datetime.now().isoformat(timespec='seconds'),
+        },
+        'prices': prices,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(partial, f, ensure_ascii=False, indent=2)
+    print(f"已写入分片 {shard.label}: {path} ({len(prices)}/{len(partial['shard']['countries'])} 个国家)")
+    return path
+
+
+def find_partials(output_file: str = OUTPUT_FILE) -> List[str]:
+    base, ext = os.path.splitext(output_file)
+    return sorted(glob.glob(f"{glob.escape(base)}.shard-*-of-*{ext}"))
+
+
+def merge_partials(partials: List[Tuple[str, Dict]], allow_missing: bool = False) -> Tuple[Dict[str, Any], List[str], List[str]]:
+    """合并分片结果，返回 (合并后的原始数据, 错误, 警告)；有错误时不应写出结果"""
+    errors: List[str] = []
+    warnings: List[str] = []
+    if not partials:
+        return {}, ["没有找到分片结果文件"], warnings
+
+    counts = {partial['shard']['count'] for _, partial in partials}
+    if len(counts) > 1:
+        errors.append(f"分片数不一致: {sorted(counts)}")
+        return {}, errors, warnings
+    count = counts.pop()
+
+    by_index: Dict[int, str] = {}
+    for path, partial in partials:
+        index = partial['shard']['index']
+        if index in by_index:
+            errors.append(f"分片 {index}/{count} 重复: {by_index[index]} 与 {path}")
+        by_index[index] = path
+    missing_shards = [index for index in range(1, count + 1) if index not in by_index]
+    if missing_shards:
+        errors.append(f"缺少分片: {', '.join(f'{index}/{count}' for index in missing_shards)}")
+
+    # 国家顺序以各分片看到的国家列表为准（与不分片时 loc_map 的顺序一致）
+    all_countries: List[str] = []
+    for _, partial in partials:
+        for code in partial['shard'].get('all_countries', []):
+            if code not in all_countries:
+                all_countries.append(code)
+    if any(partial['shard'].get('all_countries') != all_countries for _, partial in partials):
+        warnings.append("各分片获取到的国家列表不一致,按并集检查覆盖")
+
+    sources: Dict[str, str] = {}
+    merged_prices: Dict[str, Any] = {}
+    for path, partial in partials:
+        index = partial['shard']['index']
+        for code, plans in partial['prices'].items():
+            if code in sources:
+                errors.append(f"{code} 同时出现在 {sources[code]} 与 {path}")
+                continue
+            if shard_of(code, count) != index:
+                errors.append(f"{code} 不属于分片 {index}/{count} ({path})")
+            sources[code] = path
+            merged_prices[code] = plans
+            if code not in all_countries:
+                all_countries.append(code)
+
+    missing = [code for code in all_countries if code not in merged_prices]
+    if missing:
+        message = f"{len(missing)} 个国家没有抓取结果: {', '.join(missing)}"
+        (warnings if allow_missing else errors).append(message)
+
+    merged = {code: merged_prices[code] for code in all_countries if code in merged_prices}
+    return merged, errors, warnings
+
+
+def merge_fragment_manifests(count: int, root: str = FRAGMENT_DIR, order: Optional[List[str]] = None) -> int:
+    """把各分片的片段清单 (manifest.shard-k-of-n.json) 合并进 manifest.json，返回合并的分片数。
+    片段文件按内容哈希命名，各机器的 objects/ 目录直接合并即可"""
+    paths = sorted(glob.glob(os.path.join(glob.escape(root), f'manifest.shard-*-of-{count}.json')))
+    if not paths:
+        return 0
+    store = DisneyFragmentStore(root)
+    for path in paths:
+        partial = DisneyFragmentStore(root, os.path.basename(path))
+        store.countries.update(partial.countries)
+    store.save_manifest(order=order)
+    for path in paths:
+        os.remove(path)
+    return len(paths)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='合并 Disney+ 分片抓取结果')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    merge_parser = subparsers.add_parser('merge', help=f'把分片结果合并为 {OUTPUT_FILE}')
+    merge_parser.add_argument('files', nargs='*', help='分片结果文件 (默认: 当前目录下全部 disneyplus_prices.shard-*-of-*.json)')
+    merge_parser.add_argument('--output', default=OUTPUT_FILE, help=f'输出文件 (默认: {OUTPUT_FILE})')
+    merge_parser.add_argument('--allow-missing', action='store_true', help='有国家没有抓取结果时只告警，仍然写出')
+    merge_parser.add_argument('--keep', action='store_true', help='合并后保留分片结果文件')
+
+    args = parser.parse_args(argv)
+    paths = args.files or find_partials(args.output)
+    partials = []
+    for path in paths:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                partial = json.load(f)
+            partial['shard']['index'], partial['shard']['count'], partial['prices']
+        except (OSError, json.JSONDecodeError, KeyError, TypeError) as e:
+            print(f"❌ 无法读取分片结果 {path}: {e}")
+            sys.exit(1)
+        partials.append((path, partial))
+
+    merged, errors, warnings = merge_partials(partials, args.allow_missing)
+    for warning in warnings:
+        print(f"⚠️ {warning}")
+    if errors:
+        for error in errors:
+            print(f"❌ {error}")
+        print("❌ 合并未通过校验,未写入任何文件")
+        sys.exit(1)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(merged, f, ensure_ascii=False, indent=2)
+    count = partials[0][1]['shard']['count']
+    merged_manifests = merge_fragment_manifests(count, order=list(merged))
+    print(f"✅ 已合并 {len(partials)} 个分片,共 {len(merged)} 个国家,写入 {args.output}"
+          + (f";合并 {merged_manifests} 个片段清单" if merged_manifests else ''))
+    if not args.keep:
+        for path, _ in partials:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Disney+ 价格快照存储
+按内容寻址保存每个国家的数据块（zlib 压缩后按月追加进 pack 文件，相同内容只存一份），每个快照只是一份
+(国家 -> 哈希) 清单。load_snapshot(ts) 读取快照，找不到时透明回退到 archive/ 中的原始 JSON。
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import zlib
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Tuple
+
+KINDS = ('raw', 'processed')
+COUNTRY_KEY_RE = re.compile(r'^[A-Za-z0-9_-]+$')
+ARCHIVE_FILE_RE = re.compile(r'^disneyplus_prices(_processed)?_(\d{8}_\d{6})\.json$')
+
+
+def _canonical_bytes(value) -> bytes:
+    # 保留键顺序，保证读出的快照与原文件顺序一致
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def object_digest(value) -> str:
+    """数据块的 sha256，与 put_object 写入时使用的哈希一致"""
+    return hashlib.sha256(_canonical_bytes(value)).hexdigest()
+
+
+def parse_archive_filename(path: str) -> Optional[Tuple[str, str]]:
+    """disneyplus_prices_processed_20250719_160831.json -> ('processed', '20250719_160831')"""
+    match = ARCHIVE_FILE_RE.match(os.path.basename(path))
+    if not match:
+        return None
+    return ('processed' if match.group(1) else 'raw'), match.group(2)
+
+
+class LazySnapshot(Mapping):
+    """只读快照视图：键来自清单，值在第一次访问时才从 pack 中读取"""
+
+    def __init__(self, store: 'DisneySnapshotStore', entries: List[List]):
+        self._store = store
+        self._locations = {key: (pack, offset, length) for key, _, pack, offset, length in entries}
+        self._cache: Dict[str, object] = {}
+
+    def __getitem__(self, key: str):
+        if key not in self._cache:
+            self._cache[key] = self._store.read_object_at(*self._locations[key])
+        return self._cache[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._locations)
+
+    def __len__(self) -> int:
+        return len(self._locations)
+
+
+class DisneySnapshotStore:
+    def __init__(self, root: str = "snapshot_store", archive_dir: str = "archive"):
+        self.root = root
+        self.packs_dir = os.path.join(root, "packs")
+        self.manifests_dir = os.path.join(root, "manifests")
+        self.countries_dir = os.path.join(root, "countries")
+        self.archive_dir = archive_dir
+        self._object_index: Optional[Dict[str, Tuple[str, int, int]]] = None
+        self._dirty_packs = set()
+
+    # --- 对象 ---
+    # 对象按月追加写入 packs/YYYYMM.pack，packs/YYYYMM.idx.json 记录 sha256 -> [偏移, 长度]，
+    # 避免成千上万个小文件拖慢 git
+
+    def pack_path(self, pack: str) -> str:
+        return os.path.join(self.packs_dir, f"{pack}.pack")
+
+    def pack_index_path(self, pack: str) -> str:
+        return os.path.join(self.packs_dir, f"{pack}.idx.json")
+
+    def _load_object_index(self) -> Dict[str, Tuple[str, int, int]]:
+        if self._object_index is None:
+            self._object_index = {}
+            for path in glob.glob(os.path.join(self.packs_dir, '*.idx.json')):
+                pack = os.path.basename(path)[:-len('.idx.json')]
+                with open(path, 'r', encoding='utf-8') as f:
+                    for digest, (offset, length) in json.load(f).items():
+                        self._object_index[digest] = (pack, offset, length)
+        return self._object_index
+
+    def _save_pack_index(self, pack: str):
+        entries = {
+            digest: [offset, length]
+            for digest, (entry_pack, offset, length) in self._object_index.items()
+            if entry_pack == pack
+        }
+        path = self.pack_index_path(pack)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    def put_object(self, value, pack: str) -> str:
+        """写入一个数据块，返回其 sha256；内容已存在（任意 pack 中）时不重复写入"""
+        data = _canonical_bytes(value)
+        digest = hashlib.sha256(data).hexdigest()
+        index = self._load_object_index()
+        if digest not in index:
+            os.makedirs(self.packs_dir, exist_ok=True)
+            compressed = zlib.compress(data, 9)
+            with open(self.pack_path(pack), 'ab') as f:
+                offset = f.tell()
+                f.write(compressed)
+            index[digest] = (pack, offset, len(compressed))
+            self._dirty_packs.add(pack)
+        return digest
+
+    def read_object_at(self, pack: str, offset: int, length: int):
+        """按 pack 内的偏移直接读取一个数据块，不需要加载对象索引"""
+        with open(self.pack_path(pack), 'rb') as f:
+            f.seek(offset)
+            return json.loads(zlib.decompress(f.read(length)).decode('utf-8'))
+
+    def get_object(self, digest: str):
+        return self.read_object_at(*self._load_object_index()[digest])
+
+    def _flush_packs(self):
+        for pack in sorted(self._dirty_packs):
+            self._save_pack_index(pack)
+        self._dirty_packs.clear()
+
+    # --- 清单 ---
+
+    def manifest_path(self, ts: str, kind: str = 'processed') -> str:
+        return os.path.join(self.manifests_dir, ts[:4], ts[4:6], f"{kind}_{ts}.json")
+
+    def manifest_signature(self, ts: str, kind: str = 'processed') -> Tuple[Tuple[str, str], ...]:
+        """快照内容的签名 ((国家, sha256), ...)，内容相同的两个快照签名相同"""
+        return tuple((entry[0], entry[1]) for entry in self.load_manifest(ts, kind)['entries'])
+
+    def has_snapshot(self, ts: str, kind: str = 'processed') -> bool:
+        return os.path.exists(self.manifest_path(ts, kind))
+
+    def load_manifest(self, ts: str, kind: str = 'processed') -> Dict:
+        with open(self.manifest_path(ts, kind), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def add_snapshot(self, data: Dict, ts: str, kind: str = 'processed') -> str:
+        """保存一个完整快照，返回清单路径；快照不可变，同一时间戳已存在时直接返回"""
+        if kind not in KINDS:
+            raise ValueError(f"未知的快照类型: {kind}")
+        path = self.manifest_path(ts, kind)
+        if os.path.exists(path):
+            print(f"快照已存在，跳过: {kind} {ts}")
+            return path
+
+        # 清单只记录 (国家, sha256)，数据块的位置由 pack 索引推导，不重复提交
+        entries = [[key, self.put_object(value, ts[:6])] for key, value in data.items()]
+        manifest = {'kind': kind, 'timestamp': ts, 'entries': entries}
+
+        # 先写对象索引，再写清单，清单出现时引用的对象一定可读
+        self._flush_packs()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+        return path
+
+    # --- 按国家的位置缓存 ---
+    # countries/<kind>/<国家>.jsonl 每行记录 [时间戳, sha256, pack, 偏移, 长度]，完全由清单和 pack 索引推导，
+    # 已加入 .gitignore；indexed.json 记录已并入缓存的快照，新快照在下一次按国家查询时增量补上
+
+    def country_index_path(self, kind: str, key: str) -> Optional[str]:
+        if not COUNTRY_KEY_RE.match(key):
+            return None
+        return os.path.join(self.countries_dir, kind, f"{key}.jsonl")
+
+    def _country_index_state_path(self, kind: str) -> str:
+        return os.path.join(self.countries_dir, kind, 'indexed.json')
+
+    def _clear_country_index(self, kind: str):
+        directory = os.path.join(self.countries_dir, kind)
+        if os.path.isdir(directory):
+            for filename in os.listdir(directory):
+                os.remove(os.path.join(directory, filename))
+
+    def refresh_country_index(self, kind: str = 'processed') -> int:
+        """把尚未并入缓存的快照追加到按国家的位置缓存，返回新并入的快照数"""
+        state_path = self._country_index_state_path(kind)
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                indexed = set(json.load(f))
+        except (FileNotFoundError, json.JSONDecodeError, TypeError):
+            # 没有状态文件时无法判断已有行是否完整，整体重建
+            self._clear_country_index(kind)
+            indexed = set()
+
+        pending = [ts for ts in self.list_snapshots(kind, include_archive=False) if ts not in indexed]
+        if not pending:
+            return 0
+
+        rows: Dict[str, List[str]] = {}
+        for ts in pending:
+            for entry in self.load_manifest(ts, kind)['entries']:
+                key, digest, pack, offset, length = self._entry_with_location(entry)
+                if COUNTRY_KEY_RE.match(key):
+                    rows.setdefault(key, []).append(
+                        json.dumps([ts, digest, pack, offset, length], separators=(',', ':')) + '\n')
+
+        os.makedirs(os.path.join(self.countries_dir, kind), exist_ok=True)
+        for key, lines in rows.items():
+            with open(self.country_index_path(kind, key), 'a', encoding='utf-8') as f:
+                f.write(''.join(lines))
+        # 先追加行再记录状态；中途失败时重复的行按时间戳去重，不影响结果
+        tmp_path = state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(sorted(indexed.union(pending)), f, separators=(',', ':'))
+        os.replace(tmp_path, state_path)
+        return len(pending)
+
+    def reindex_countries(self) -> int:
+        """丢弃并根据全部清单重建按国家的位置缓存，返回处理的快照数"""
+        count = 0
+        for kind in KINDS:
+            self._clear_country_index(kind)
+            count += self.refresh_country_index(kind)
+        return count
+
+    def _entry_with_location(self, entry: List) -> List:
+        # 早期清单带有位置列，直接使用；其余通过 pack 索引查找
+        if len(entry) >= 5:
+            return entry
+        key, digest = entry[:2]
+        return [key, digest, *self._load_object_index()[digest]]
+
+    def load_country_history(self, country: str, kind: str = 'processed',
+                             include_archive: bool = True) -> List[Tuple[str, object]]:
+        """读取某个国家在所有快照中的数据，返回 [(时间戳, 数据块)]（按时间升序）"""
+        history = {}
+        path = self.country_index_path(kind, country)
+        if path:
+            self.refresh_country_index(kind)
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        ts, _, pack, offset, length = json.loads(line)
+                        history[ts] = (pack, offset, length)
+
+        result = [(ts, self.read_object_at(*location)) for ts, location in sorted(history.items())]
+        if include_archive:
+            # 尚未迁移的 archive/ 文件只能整体读取
+            for ts, archive_file in sorted(self._archive_files(kind).items()):
+                if ts in history or self.has_snapshot(ts, kind):
+                    continue
+                with open(archive_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if country in data:
+                    result.append((ts, data[country]))
+            result.sort(key=lambda item: item[0])
+        return result
+
+    def add_file(self, path: str, ts: Optional[str] = None, kind: Optional[str] = None) -> str:
+        """保存一个 JSON 文件；未指定时从归档文件名中解析时间戳和类型"""
+        if ts is None or kind is None:
+            parsed = parse_archive_filename(path)
+            if not parsed:
+                raise ValueError(f"无法从文件名解析时间戳: {path}")
+            kind = kind or parsed[0]
+            ts = ts or parsed[1]
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return self.add_snapshot(data, ts, kind)
+
+    # --- 读取 ---
+
+    def _archive_files(self, kind: str) -> Dict[str, str]:
+        files = {}
+        for path in glob.glob(os.path.join(self.archive_dir, '**', 'disneyplus_prices*.json'), recursive=True):
+            parsed = parse_archive_filename(path)
+            if parsed and parsed[0] == kind:
+                files[parsed[1]] = path
+        return files
+
+    def list_snapshots(self, kind: str = 'processed', include_archive: bool = True) -> List[str]:
+        """返回所有快照时间戳（升序），默认包含尚未迁移的 archive/ 文件"""
+        timestamps = set()
+        for path in glob.glob(os.path.join(self.manifests_dir, '*', '*', f"{kind}_*.json")):
+            timestamps.add(os.path.basename(path)[len(kind) + 1:-len('.json')])
+        if include_archive:
+            timestamps.update(self._archive_files(kind))
+        return sorted(timestamps)
+
+    def open_snapshot(self, ts: str, kind: str = 'processed') -> Mapping:
+        """打开快照但不读取数据块，访问哪个国家才解压哪个国家"""
+        if self.has_snapshot(ts, kind):
+            manifest = self.load_manifest(ts, kind)
+            return LazySnapshot(self, [self._entry_with_location(e) for e in manifest['entries']])
+
+        archive_file = self._archive_files(kind).get(ts)
+        if archive_file:
+            with open(archive_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        raise FileNotFoundError(f"快照不存在: {kind} {ts}")
+
+    def load_snapshot(self, ts: str, kind: str = 'processed') -> Dict:
+        """读取完整快照：优先使用快照存储，其次回退到 archive/ 中的原始文件"""
+        return dict(self.open_snapshot(ts, kind))
+
+    # --- 迁移 ---
+
+    def migrate_archive(self, delete: bool = False) -> Dict[str, int]:
+        """把 archive/ 下的全部 JSON 导入快照存储，逐个校验读回的数据一致后才允许删除原文件"""
+        stats = {'files': 0, 'skipped': 0, 'original_bytes': 0, 'deleted': 0}
+        for kind in KINDS:
+            for ts, path in sorted(self._archive_files(kind).items()):
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if not self.has_snapshot(ts, kind):
+                    self.add_snapshot(data, ts, kind)
+                    stats['files'] += 1
+                else:
+                    stats['skipped'] += 1
+                stats['original_bytes'] += os.path.getsize(path)
+
+                if self.load_snapshot(ts, kind) != data:
+                    raise RuntimeError(f"校验失败，快照与原文件不一致: {path}")
+                if delete:
+                    os.remove(path)
+                    stats['deleted'] += 1
+        return stats
+
+    def store_size(self) -> int:
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            total += sum(os.path.getsize(os.path.join(dirpath, name)) for name in filenames)
+        return total
+
+
+def load_snapshot(ts: str, kind: str = 'processed', root: str = "snapshot_store", archive_dir: str = "archive") -> Dict:
+    """读取某个时间戳的快照（快照存储或 archive/ 原始文件）"""
+    return DisneySnapshotStore(root, archive_dir).load_snapshot(ts, kind)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Disney+ 价格快照存储")
+    parser.add_argument('--root', default='snapshot_store', help='快照存储目录 (默认: snapshot_store)')
+    parser.add_argument('--archive-dir', default='archive', help='原始归档目录 (默认: archive)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    add_parser = subparsers.add_parser('add', help='保存当前的价格文件')
+    add_parser.add_argument('files', nargs='+', help='disneyplus_prices.json / disneyplus_prices_processed.json')
+    add_parser.add_argument('--timestamp', required=True, help='快照时间戳 YYYYMMDD_HHMMSS')
+
+    migrate_parser = subparsers.add_parser('migrate', help='把 archive/ 导入快照存储')
+    migrate_parser.add_argument('--delete', action='store_true', help='校验通过后删除 archive/ 中的原文件')
+
+    list_parser = subparsers.add_parser('list', help='列出快照')
+    list_parser.add_argument('--kind', choices=KINDS, default='processed')
+
+    history_parser = subparsers.add_parser('history', help='输出某个国家在所有快照中的数据')
+    history_parser.add_argument('country', help='国家代码，如 KR')
+    history_parser.add_argument('--kind', choices=KINDS, default='processed')
+
+    subparsers.add_parser('reindex', help='重建按国家的位置缓存')
+
+    cat_parser = subparsers.add_parser('cat', help='输出某个快照的 JSON')
+    cat_parser.add_argument('timestamp')
+    cat_parser.add_argument('--kind', choices=KINDS, default='processed')
+
+    args = parser.parse_args(argv)
+    store = DisneySnapshotStore(args.root, args.archive_dir)
+
+    if args.command == 'add':
+        for path in args.files:
+            kind = 'processed' if 'processed' in os.path.basename(path) else 'raw'
+            manifest_path = store.add_file(path, args.timestamp, kind)
+            print(f"✅ 已保存快照: {path} -> {manifest_path}")
+    elif args.command == 'migrate':
+        stats = store.migrate_archive(delete=args.delete)
+        store_size = store.store_size()
+        print(f"🎉 迁移完成！新增 {stats['files']} 个快照，跳过 {stats['skipped']} 个，删除 {stats['deleted']} 个原文件")
+        print(f"📦 原始大小 {stats['original_bytes'] / 1024:.1f} KB -> 快照存储 {store_size / 1024:.1f} KB")
+    elif args.command == 'list':
+        for ts in store.list_snapshots(args.kind):
+            source = 'store' if store.has_snapshot(ts, args.kind) else 'archive'
+            print(f"{ts}  {source}")
+    elif args.command == 'history':
+        history = store.load_country_history(args.country, args.kind)
+        print(json.dumps([{'timestamp': ts, 'data': data} for ts, data in history], ensure_ascii=False, indent=2))
+    elif args.command == 'reindex':
+        print(f"✅ 已重建 {store.reindex_countries()} 个快照的国家位置缓存")
+    elif args.command == 'cat':
+        print(json.dumps(store.load_snapshot(args.timestamp, args.kind), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
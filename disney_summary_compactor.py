@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Disney+ 价格变化摘要压缩器
+把 summaries/ 下每次运行生成的摘要 JSON 按月合并为紧凑的 JSONL 文件，并维护月度汇总索引
+"""
+
+import argparse
+import json
+import os
+import re
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+SUMMARY_FILE_RE = re.compile(r'^disney_price_changes_summary_(\d{8})_(\d{6})\.json$')
+COUNT_FIELDS = ('total_changes', 'price_increases', 'price_decreases', 'new_plans', 'removed_plans')
+
+
+def _empty_totals() -> Dict:
+    totals = {field: 0 for field in COUNT_FIELDS}
+    totals['runs'] = 0
+    return totals
+
+
+def _add_counts(totals: Dict, summary: Dict):
+    for field in COUNT_FIELDS:
+        totals[field] += int(summary.get(field) or 0)
+    totals['runs'] += 1
+
+
+def _month_totals(records: Iterable[Dict]) -> Dict:
+    """由某月已压缩的记录计算月度汇总"""
+    totals = _empty_totals()
+    for record in records:
+        run_id = record['run_id']
+        _add_counts(totals, record)
+        totals['first_run'] = min(totals.get('first_run') or run_id, run_id)
+        totals['last_run'] = max(totals.get('last_run') or run_id, run_id)
+    return totals
+
+
+def _normalize_day(value: str) -> str:
+    """'YYYY-MM-DD' / 'YYYYMMDD' -> 'YYYYMMDD'"""
+    day = value.replace('-', '')
+    datetime.strptime(day, '%Y%m%d')
+    return day
+
+
+class DisneySummaryCompactor:
+    def __init__(self, summary_dir: str = "summaries"):
+        self.summary_dir = summary_dir
+        self.rollup_dir = os.path.join(summary_dir, "rollup")
+        self.index_file = os.path.join(self.rollup_dir, "index.json")
+
+    def rollup_path(self, year_month: str) -> str:
+        return os.path.join(self.rollup_dir, f"disney_price_changes_{year_month}.jsonl")
+
+    def list_loose_summaries(self) -> List[Tuple[str, str]]:
+        """返回尚未压缩的 (运行时间戳 YYYYMMDD_HHMMSS, 文件路径)，按时间升序"""
+        if not os.path.isdir(self.summary_dir):
+            return []
+        summaries = []
+        for filename in os.listdir(self.summary_dir):
+            match = SUMMARY_FILE_RE.match(filename)
+            if match:
+                run_id = f"{match.group(1)}_{match.group(2)}"
+                summaries.append((run_id, os.path.join(self.summary_dir, filename)))
+        summaries.sort()
+        return summaries
+
+    def load_index(self) -> Dict:
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {'months': {}}
+
+    def _save_index(self, index: Dict):
+        os.makedirs(self.rollup_dir, exist_ok=True)
+        index['updated_at'] = datetime.now().isoformat()
+        index['months'] = dict(sorted(index['months'].items()))
+        tmp_file = self.index_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.index_file)
+
+    def iter_rollup(self, year_month: str) -> Iterator[Dict]:
+        """读取某月已压缩的摘要记录"""
+        path = self.rollup_path(year_month)
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # 追加到一半中断留下的残行；对应的原文件还没有删除，下次压缩时会重新写入
+                    print(f"⚠️ 跳过不完整的记录: {path}")
+
+    def compact(self, include_current_month: bool = False) -> Tuple[int, List[str]]:
+        """把散落的摘要文件合并进月度 JSONL 并删除原文件，返回 (合并的文件数, 涉及月份)"""
+        current_month = datetime.now().strftime('%Y%m')
+        by_month: Dict[str, List[Tuple[str, str]]] = {}
+        for run_id, path in self.list_loose_summaries():
+            if not include_current_month and run_id[:6] == current_month:
+                continue
+            year_month = f"{run_id[:4]}-{run_id[4:6]}"
+            by_month.setdefault(year_month, []).append((run_id, path))
+
+        if not by_month:
+            return 0, []
+
+        os.makedirs(self.rollup_dir, exist_ok=True)
+        index = self.load_index()
+        compacted = 0
+
+        for year_month, runs in sorted(by_month.items()):
+            # 已有该月的压缩文件时按运行时间戳去重，保证重复执行幂等
+            records = {record['run_id']: record for record in self.iter_rollup(year_month) if record.get('run_id')}
+
+            lines = []
+            merged_paths = []
+            for run_id, path in runs:
+                if run_id in records:
+                    merged_paths.append(path)
+                    continue
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        summary = json.load(f)
+                except (OSError, json.JSONDecodeError) as e:
+                    print(f"⚠️ 读取摘要失败，保留原文件: {path} - {e}")
+                    continue
+                summary = {'run_id': run_id, **summary}
+                records[run_id] = summary
+                lines.append(json.dumps(summary, ensure_ascii=False, separators=(',', ':')) + '\n')
+                merged_paths.append(path)
+
+            if lines:
+                rollup_file = self.rollup_path(year_month)
+                # 上次追加中断时文件可能不以换行结尾，先补上换行，新记录不会和残行连在一起
+                if os.path.exists(rollup_file) and os.path.getsize(rollup_file) > 0:
+                    with open(rollup_file, 'rb') as f:
+                        f.seek(-1, os.SEEK_END)
+                        if f.read(1) != b'\n':
+                            lines.insert(0, '\n')
+                with open(rollup_file, 'a', encoding='utf-8') as f:
+                    f.writelines(lines)
+            # 月度汇总总是由压缩文件重新计算，上次在写入索引前中断时也能恢复；
+            # 顺序为 写入压缩文件 -> 保存索引 -> 删除原文件，任何一步中断都不会漏计
+            index['months'][year_month] = _month_totals(records.values())
+            self._save_index(index)
+            for path in merged_paths:
+                os.remove(path)
+            compacted += len(merged_paths)
+            print(f"✅ 压缩 {year_month}: {len(merged_paths)} 个摘要文件 -> {self.rollup_path(year_month)}")
+
+        return compacted, sorted(by_month)
+
+    def rollup_completed_months(self) -> Tuple[int, List[str]]:
+        """自动月度汇总：只压缩已经结束的月份"""
+        return self.compact(include_current_month=False)
+
+    def count_changes(self, start: str, end: str) -> Dict:
+        """统计 [start, end] 日期范围内（含两端，格式 YYYY-MM-DD）的变化次数"""
+        start_day, end_day = _normalize_day(start), _normalize_day(end)
+        totals = _empty_totals()
+        index = self.load_index()
+
+        for year_month, month_totals in index.get('months', {}).items():
+            month_prefix = year_month.replace('-', '')
+            if not (start_day[:6] <= month_prefix <= end_day[:6]):
+                continue
+            first_day = (month_totals.get('first_run') or '')[:8]
+            last_day = (month_totals.get('last_run') or '')[:8]
+            if first_day and last_day and start_day <= first_day and last_day <= end_day:
+                # 整月都在范围内，直接使用索引中的汇总
+                for field in COUNT_FIELDS + ('runs',):
+                    totals[field] += month_totals.get(field, 0)
+                continue
+            for record in self.iter_rollup(year_month):
+                if start_day <= record['run_id'][:8] <= end_day:
+                    _add_counts(totals, record)
+
+        for run_id, path in self.list_loose_summaries():
+            if not (start_day <= run_id[:8] <= end_day):
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    _add_counts(totals, json.load(f))
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"⚠️ 读取摘要失败: {path} - {e}")
+
+        return totals
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Disney+ 价格变化摘要压缩与查询")
+    parser.add_argument('--summary-dir', default='summaries', help='摘要目录 (默认: summaries)')
+    subparsers = parser.add_subparsers(dest='command')
+
+    compact_parser = subparsers.add_parser('compact', help='把摘要文件按月合并')
+    compact_parser.add_argument('--all', action='store_true', help='同时压缩当前月份')
+
+    count_parser = subparsers.add_parser('count', help='统计日期范围内的变化次数')
+    count_parser.add_argument('start', help='开始日期 YYYY-MM-DD')
+    count_parser.add_argument('end', help='结束日期 YYYY-MM-DD')
+
+    args = parser.parse_args(argv)
+    compactor = DisneySummaryCompactor(args.summary_dir)
+
+    if args.command == 'count':
+        print(json.dumps(compactor.count_changes(args.start, args.end), ensure_ascii=False, indent=2))
+    else:
+        compacted, months = compactor.compact(include_current_month=getattr(args, 'all', False))
+        print(f"🎉 压缩完成！共合并 {compacted} 个摘要文件，涉及 {len(months)} 个月份")
+
+
+if __name__ == "__main__":
+    main()
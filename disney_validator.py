@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Disney+ 价格数据校验
+一次遍历检查原始数据与处理后数据：结构、货币、年付/月付比例、
+与最近一次快照相比 CNY 价格的异常波动，以及 COUNTRY_INFO 中缺失的国家。
+输出机器可读的 JSON 报告；存在错误时以非零状态退出。
+"""
+
+import argparse
+import json
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from disney_money import Money
+from disney_plan_identity import canonical_plan_id
+from disney_rate_converter import COUNTRY_INFO
+from disney_snapshot_store import DisneySnapshotStore
+
+ERROR = 'error'
+WARNING = 'warning'
+PERIODS = ('monthly', 'annual')
+AMOUNT_FIELDS = ('monthly_price_original', 'monthly_price_cny', 'annual_price_original', 'annual_price_cny')
+DEFAULT_ANNUAL_RATIO = (8.0, 13.0)
+DEFAULT_MAX_CNY_CHANGE = 30.0
+
+
+class ValidationAborted(Exception):
+    """fail-fast 模式下遇到第一个错误时中止校验"""
+
+
+def parse_amount(value) -> Optional[float]:
+    """'EUR 9.99' / 'CNY 87.59' -> 9.99 / 87.59"""
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        return float(value.split()[-1])
+    except ValueError:
+        return None
+
+
+class DisneyDataValidator:
+    def __init__(self, country_info: Optional[Dict] = None,
+                 annual_ratio: Tuple[float, float] = DEFAULT_ANNUAL_RATIO,
+                 max_cny_change: float = DEFAULT_MAX_CNY_CHANGE,
+                 fail_fast: bool = False):
+        self.country_info = COUNTRY_INFO if country_info is None else country_info
+        self.annual_ratio = annual_ratio
+        self.max_cny_change = max_cny_change
+        self.fail_fast = fail_fast
+        self.issues: List[Dict] = []
+        self.stats: Dict[str, object] = {}
+
+    def _issue(self, severity: str, check: str, message: str, country: Optional[str] = None,
+               plan: Optional[str] = None, **details):
+        issue = {'severity': severity, 'check': check, 'message': message}
+        if country:
+            issue['country'] = country
+        if plan:
+            issue['plan'] = plan
+        issue.update(details)
+        self.issues.append(issue)
+        if severity == ERROR and self.fail_fast:
+            raise ValidationAborted(message)
+
+    def check_raw(self, raw: Dict):
+        countries = plans = 0
+        for country, country_plans in raw.items():
+            if not isinstance(country_plans, list):
+                self._issue(ERROR, 'raw_structure', f"{country} 的值不是套餐列表", country)
+                continue
+            countries += 1
+            for plan in country_plans:
+                plans += 1
+                if not isinstance(plan, dict) or not plan.get('plan') or not plan.get('price'):
+                    self._issue(ERROR, 'raw_plan', f"{country} 存在缺少名称或价格文本的套餐", country,
+                                plan=plan.get('plan') if isinstance(plan, dict) else None)
+
+        self.stats.update(raw_countries=countries, raw_plans=plans)
+        if not countries or not plans:
+            self._issue(ERROR, 'raw_empty', "原始数据没有有效国家套餐数据")
+
+        for country in sorted(set(self.country_info) - set(raw)):
+            self._issue(WARNING, 'missing_country', f"COUNTRY_INFO 中的 {country} 没有抓取到数据", country)
+        for country in sorted(set(raw) - set(self.country_info)):
+            self._issue(WARNING, 'unknown_country', f"{country} 不在 COUNTRY_INFO 中，转换时会被跳过", country)
+
+    def _baseline_prices(self, baseline, country: str) -> Dict[Tuple[str, str], float]:
+        block = baseline.get(country) if baseline is not None else None
+        prices = {}
+        for plan in (block or {}).get('plans', []):
+            plan_id = canonical_plan_id(plan.get('plan_name') or '')
+            for period in PERIODS:
+                price = parse_amount(plan.get(f'{period}_price_cny'))
+                if price is not None:
+                    prices[(plan_id, period)] = price
+        return prices
+
+    def check_processed(self, processed: Dict, baseline=None):
+        """逐个套餐检查货币、年付比例和相对基线的 CNY 变化；baseline 为快照（可以是按需读取的映射）"""
+        low, high = self.annual_ratio
+        countries = plans = priced = 0
+
+        for country, info in processed.items():
+            if country.startswith('_'):
+                continue
+            if not isinstance(info, dict) or not isinstance(info.get('plans'), list):
+                self._issue(ERROR, 'processed_structure', f"{country} 缺少 plans 列表", country)
+                continue
+            countries += 1
+            old_prices = self._baseline_prices(baseline, country) if baseline is not None else {}
+
+            for plan in info['plans']:
+                plans += 1
+                name = plan.get('plan_name') or ''
+                currency = plan.get('currency_code')
+                if not currency or currency == 'N/A':
+                    self._issue(ERROR, 'missing_currency', f"{country} / {name} 没有货币代码", country, name)
+
+                for field in AMOUNT_FIELDS:
+                    # 转换器写出的整数字段必须与字符串一致，下游会直接使用它们
+                    if f'{field}_minor' not in plan:
+                        continue
+                    money = Money.parse(plan.get(field))
+                    if plan[f'{field}_minor'] != (money.minor if money else None):
+                        self._issue(ERROR, 'minor_units', f"{country} / {name} 的 {field}_minor 与 {field} 不一致",
+                                    country, name, field=field)
+
+                monthly = parse_amount(plan.get('monthly_price_original'))
+                annual = parse_amount(plan.get('annual_price_original'))
+                if monthly and annual:
+                    ratio = annual / monthly
+                    if not low <= ratio <= high:
+                        self._issue(WARNING, 'annual_ratio',
+                                    f"{country} / {name} 年付是月付的 {ratio:.2f} 倍，超出 {low:g}-{high:g} 倍",
+                                    country, name, ratio=round(ratio, 2))
+
+                plan_id = canonical_plan_id(name)
+                has_price = False
+                for period in PERIODS:
+                    price = parse_amount(plan.get(f'{period}_price_cny'))
+                    if price is None:
+                        continue
+                    has_price = True
+                    old_price = old_prices.get((plan_id, period))
+                    if old_price:
+                        change = (price - old_price) / old_price * 100
+                        if abs(change) > self.max_cny_change:
+                            self._issue(WARNING, 'cny_change',
+                                        f"{country} / {name} {period} CNY {old_price:.2f} -> {price:.2f} ({change:+.1f}%)",
+                                        country, name, period=period, old=old_price, new=price,
+                                        change_percent=round(change, 1))
+                priced += has_price
+
+        self.stats.update(processed_countries=countries, processed_plans=plans, priced_plans=priced)
+        if not countries or not plans or not priced:
+            self._issue(ERROR, 'processed_empty', "处理后数据没有有效转换价格")
+
+    def validate(self, raw: Optional[Dict] = None, processed: Optional[Dict] = None,
+                 baseline=None, baseline_name: Optional[str] = None) -> Dict:
+        self.issues, self.stats = [], {'baseline': baseline_name}
+        aborted = False
+        try:
+            if raw is not None:
+                self.check_raw(raw)
+            if processed is not None:
+                self.check_processed(processed, baseline)
+        except ValidationAborted:
+            aborted = True
+
+        errors = sum(1 for issue in self.issues if issue['severity'] == ERROR)
+        return {
+            'ok': errors == 0,
+            'aborted': aborted,
+            'errors': errors,
+            'warnings': len(self.issues) - errors,
+            'stats': self.stats,
+            'issues': self.issues,
+        }
+
+
+def latest_baseline(store: DisneySnapshotStore):
+    """返回最近一次 processed 快照 (时间戳, 按需读取的映射)，没有快照时返回 (None, None)"""
+    timestamps = store.list_snapshots('processed')
+    if not timestamps:
+        return None, None
+    return timestamps[-1], store.open_snapshot(timestamps[-1], 'processed')
+
+
+def _load_json(path: str) -> Dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Disney+ 价格数据校验')
+    parser.add_argument('--raw', default='disneyplus_prices.json', help='原始数据文件')
+    parser.add_argument('--processed', default='disneyplus_prices_processed.json', help='处理后数据文件')
+    parser.add_argument('--baseline', help='用于对比 CNY 变化的快照时间戳 (默认: 最近一次快照)')
+    parser.add_argument('--no-baseline', action='store_true', help='不与历史快照对比')
+    parser.add_argument('--max-cny-change', type=float, default=DEFAULT_MAX_CNY_CHANGE,
+                        help=f'CNY 价格相对基线变化超过该百分比时告警 (默认: {DEFAULT_MAX_CNY_CHANGE:g})')
+    parser.add_argument('--annual-ratio', type=float, nargs=2, default=DEFAULT_ANNUAL_RATIO,
+                        metavar=('MIN', 'MAX'), help='年付/月付的合理倍数范围 (默认: 8 13)')
+    parser.add_argument('--fail-fast', action='store_true', help='遇到第一个错误立即停止')
+    parser.add_argument('--strict', action='store_true', help='存在警告时也以非零状态退出')
+    parser.add_argument('--report', help='把 JSON 报告写入文件 (默认输出到标准输出)')
+    args = parser.parse_args(argv)
+
+    validator = DisneyDataValidator(annual_ratio=tuple(args.annual_ratio),
+                                    max_cny_change=args.max_cny_change, fail_fast=args.fail_fast)
+    try:
+        raw = _load_json(args.raw) if args.raw else None
+        processed = _load_json(args.processed) if args.processed else None
+        baseline_name, baseline = None, None
+        if not args.no_baseline and processed is not None:
+            store = DisneySnapshotStore()
+            if args.baseline:
+                baseline_name, baseline = args.baseline, store.open_snapshot(args.baseline, 'processed')
+            else:
+                baseline_name, baseline = latest_baseline(store)
+    except (OSError, json.JSONDecodeError) as e:
+        report = {'ok': False, 'aborted': True, 'errors': 1, 'warnings': 0, 'stats': {},
+                  'issues': [{'severity': ERROR, 'check': 'load', 'message': str(e)}]}
+    else:
+        report = validator.validate(raw, processed, baseline, baseline_name)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    summary = f"{report['errors']} 个错误，{report['warnings']} 个警告"
+    if report['errors'] or (args.strict and report['warnings']):
+        print(f"❌ 数据校验未通过: {summary}", file=sys.stderr)
+        sys.exit(1)
+    print(f"✅ 数据校验通过: {summary}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
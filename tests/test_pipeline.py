@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+disney_pipeline 的单元测试：快照写入后记录变化失败时，保存的检测结果可以补写且不会重复。
+在仓库根目录运行: python -m unittest discover -s tests
+"""
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import disney_pipeline as pipeline
+from disney_price_change_detector import ChangeSet, DisneyPriceChangeDetector
+from disney_snapshot_store import DisneySnapshotStore
+
+CHANGE = {
+    'country': 'US', 'country_name': '美国', 'plan': 'Disney+ Premium（月付）',
+    'old_price_cny': 100.0, 'new_price_cny': 110.0, 'change_amount': 10.0, 'change_percent': 10.0,
+    'price_original': '$15.99', 'currency': 'USD', 'type': 'price_change',
+}
+SNAPSHOT = {'US': {'name_cn': '美国', 'plans': [{'plan_name': 'Disney+ Premium', 'monthly_price_cny': '¥110.00'}]}}
+
+
+class PendingChangesTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        cwd = os.getcwd()
+        os.chdir(tmp.name)
+        self.addCleanup(os.chdir, cwd)
+        # 各步骤的进度输出与测试无关
+        quiet = contextlib.redirect_stdout(io.StringIO())
+        quiet.__enter__()
+        self.addCleanup(quiet.__exit__, None, None, None)
+
+        self.store = DisneySnapshotStore()
+        self.detector = DisneyPriceChangeDetector()
+        self.change_set = ChangeSet('2026-10-18 08:00:00', [CHANGE])
+
+    def changelog_entries(self) -> int:
+        with open(self.detector.changelog_file, 'r', encoding='utf-8') as f:
+            return f.read().count('## 2026-10-18 08:00:00')
+
+    def event_runs(self) -> int:
+        return sum(1 for record in self.detector.event_log.iter_records('2026-10') if 'changes' in record)
+
+    def test_report_changes_is_idempotent(self):
+        first = self.detector.report_changes(self.change_set)
+        second = self.detector.report_changes(self.change_set)
+        self.assertEqual(first, second)
+        self.assertEqual(first[0], 1)
+        self.assertEqual(self.changelog_entries(), 1)
+        self.assertEqual(self.event_runs(), 1)
+        self.assertEqual(os.listdir(self.detector.summary_dir), [os.path.basename(first[1])])
+
+    def test_failed_report_is_replayed_once(self):
+        self.store.add_snapshot(SNAPSHOT, '20261018_080000', 'processed')
+        pipeline.save_pending_changes(self.change_set, '20261018_080000')
+
+        # 事件日志和 CHANGELOG 已经写入，生成摘要时失败
+        with mock.patch.object(DisneyPriceChangeDetector, 'generate_summary_json', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                pipeline.report_pending_changes(self.detector, self.store)
+        self.assertTrue(os.path.exists(pipeline.PENDING_CHANGES_FILE))
+
+        changes_count, summary_file = pipeline.report_pending_changes(self.detector, self.store)
+        self.assertEqual(changes_count, 1)
+        self.assertTrue(os.path.exists(summary_file))
+        self.assertFalse(os.path.exists(pipeline.PENDING_CHANGES_FILE))
+        self.assertEqual(self.changelog_entries(), 1)
+        self.assertEqual(self.event_runs(), 1)
+        self.assertIsNone(pipeline.report_pending_changes(self.detector, self.store))
+
+    def test_pending_without_snapshot_is_discarded(self):
+        pipeline.save_pending_changes(self.change_set, '20261018_080000')
+        self.assertIsNone(pipeline.report_pending_changes(self.detector, self.store))
+        self.assertFalse(os.path.exists(pipeline.PENDING_CHANGES_FILE))
+        self.assertFalse(os.path.exists(self.detector.changelog_file))
+
+    def test_resume_replays_without_scraping(self):
+        self.store.add_snapshot(SNAPSHOT, '20261018_080000', 'processed')
+        pipeline.save_pending_changes(self.change_set, '20261018_080000')
+        with mock.patch.object(pipeline, 'scrape_and_fetch_rates') as scrape:
+            changes_count, _ = pipeline.run_pipeline(resume=True)
+        scrape.assert_not_called()
+        self.assertEqual(changes_count, 1)
+        self.assertEqual(self.changelog_entries(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+disney_price_change_detector 的单元测试：按规范套餐 ID 对比，以及同一国家内 ID 冲突时的配对。
+在仓库根目录运行: python -m unittest discover -s tests
+"""
+
+import unittest
+
+from disney_plan_identity import find_collisions, plan_keys
+from disney_price_change_detector import DisneyPriceChangeDetector
+
+
+def snapshot(*plans, country='US'):
+    return {country: {'name_cn': '美国', 'plans': [
+        {'plan_name': name, 'monthly_price_cny': price, 'currency_code': 'USD'} for name, price in plans
+    ]}}
+
+
+class PlanKeysTest(unittest.TestCase):
+    def test_unique_names_use_plan_id(self):
+        self.assertEqual(plan_keys(['Disney+ Premium', 'Disney+ Standard']),
+                         {'Disney+ Premium': 'disney/premium', 'Disney+ Standard': 'disney/standard'})
+
+    def test_colliding_names_all_get_qualified(self):
+        keys = plan_keys(['Premium', 'Disney+ Premium'])
+        self.assertEqual(keys, {'Premium': 'disney/premium#Premium',
+                                'Disney+ Premium': 'disney/premium#Disney+ Premium'})
+        self.assertEqual(plan_keys(['Disney+ Premium', 'Premium']), keys)
+
+    def test_find_collisions(self):
+        data = {**snapshot(('Disney+ Premium', '¥1'), ('Premium', '¥2')),
+                **snapshot(('Disney+ Premium', '¥1'), country='KR')}
+        self.assertEqual(find_collisions(data), {'US': {'disney/premium': ['Disney+ Premium', 'Premium']}})
+
+
+class ComparePricesTest(unittest.TestCase):
+    def setUp(self):
+        self.detector = DisneyPriceChangeDetector()
+
+    def test_renamed_plan_is_a_price_change(self):
+        changes = self.detector.compare_prices(snapshot(('Disney+ Estándar con anuncios', '¥30.00')),
+                                               snapshot(('Disney+ Standard with Ads', '¥35.00')))
+        self.assertEqual([change['type'] for change in changes], ['price_change'])
+
+    def test_collision_is_independent_of_row_order(self):
+        old = snapshot(('Disney+ Premium', '¥100.00'), ('Premium', '¥50.00'))
+        new = snapshot(('Premium', '¥50.00'), ('Disney+ Premium', '¥100.00'))
+        self.assertEqual(self.detector.compare_prices(old, new), [])
+
+    def test_collision_price_change_pairs_by_name(self):
+        old = snapshot(('Disney+ Premium', '¥100.00'), ('Premium', '¥50.00'))
+        new = snapshot(('Premium', '¥55.00'), ('Disney+ Premium', '¥100.00'))
+        changes = self.detector.compare_prices(old, new)
+        self.assertEqual([(change['type'], change['plan']) for change in changes],
+                         [('price_change', 'Premium（月付）')])
+        self.assertEqual(changes[0]['old_price_cny'], 50.0)
+
+    def test_collision_on_one_side_only(self):
+        old = snapshot(('Disney+ Premium', '¥100.00'))
+        new = snapshot(('Premium', '¥50.00'), ('Disney+ Premium', '¥110.00'))
+        changes = sorted((change['type'], change['plan']) for change in self.detector.compare_prices(old, new))
+        self.assertEqual(changes, [('new_plan', 'Premium（月付）'), ('price_change', 'Disney+ Premium（月付）')])
+        changes = sorted((change['type'], change['plan']) for change in self.detector.compare_prices(new, old))
+        self.assertEqual(changes, [('price_change', 'Disney+ Premium（月付）'), ('removed_plan', 'Premium（月付）')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+disney_price_service 的单元测试：请求规范化与 If-None-Match 条件请求。
+在仓库根目录运行: python -m unittest discover -s tests
+"""
+
+import unittest
+
+from disney_price_service import MAX_CHEAPEST, DisneyPriceService, etag_matches
+
+ETAG = '"0123456789abcdef-fedcba9876543210"'
+
+
+class EtagMatchesTest(unittest.TestCase):
+    def test_exact_and_weak_match(self):
+        self.assertTrue(etag_matches(ETAG, ETAG))
+        self.assertTrue(etag_matches(f"W/{ETAG}", ETAG))
+
+    def test_list_and_wildcard(self):
+        self.assertTrue(etag_matches(f'"other", {ETAG}', ETAG))
+        self.assertTrue(etag_matches(f'W/"other",W/{ETAG}', ETAG))
+        self.assertTrue(etag_matches('*', ETAG))
+
+    def test_no_substring_match(self):
+        self.assertFalse(etag_matches(None, ETAG))
+        self.assertFalse(etag_matches('', ETAG))
+        self.assertFalse(etag_matches(ETAG[:-1] + '0"', ETAG))
+        self.assertFalse(etag_matches(f'"x{ETAG[1:]}', ETAG))
+        self.assertFalse(etag_matches(ETAG.strip('"'), ETAG))
+
+
+class ParseRequestTest(unittest.TestCase):
+    def test_equivalent_requests_share_a_key(self):
+        key, _ = DisneyPriceService.parse_request('/countries/kr/', {'unused': ['1']})
+        self.assertEqual(key, ('countries', 'KR'))
+        self.assertEqual(DisneyPriceService.parse_request('/cheapest', {'n': ['10']})[0],
+                         DisneyPriceService.parse_request('/cheapest', {})[0])
+
+    def test_cheapest_bounds(self):
+        self.assertEqual(DisneyPriceService.parse_request('/cheapest', {'n': ['100000']})[0][-1], MAX_CHEAPEST)
+        self.assertEqual(DisneyPriceService.parse_request('/cheapest', {'n': ['0']})[1][0], 400)
+        self.assertEqual(DisneyPriceService.parse_request('/cheapest', {'n': ['x']})[1][0], 400)
+        self.assertEqual(DisneyPriceService.parse_request('/cheapest', {'period': ['weekly']})[1][0], 400)
+
+    def test_unknown_path(self):
+        self.assertEqual(DisneyPriceService.parse_request('/nope', {})[1][0], 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+disney_rate_limiter 的单元测试：AIMD 并发调整、熔断器 open / half-open 探测、Retry-After，
+以及对注入限流的本地替身服务器验证并发能够收敛而不是崩溃到最低。
+在仓库根目录运行: python -m unittest discover -s tests
+"""
+
+import asyncio
+import threading
+import time
+import types
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import requests
+
+import disney_rate_limiter as rl
+
+
+class FakeClock:
+    """替换限流器模块中的 time，只影响限流器自己的计时，不影响事件循环"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+class ClockMixin:
+    def patch_clock(self) -> FakeClock:
+        clock = FakeClock()
+        patcher = mock.patch.object(rl, 'time', types.SimpleNamespace(monotonic=clock.monotonic))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return clock
+
+
+def http_error(status: int, retry_after=None) -> requests.HTTPError:
+    response = requests.Response()
+    response.status_code = status
+    if retry_after is not None:
+        response.headers['Retry-After'] = retry_after
+    return requests.HTTPError(f"HTTP {status}", response=response)
+
+
+class ThrottlingServer:
+    """本地替身服务器：同时处理的请求超过 capacity 时返回 429，超过两倍时返回 503 + Retry-After"""
+
+    def __init__(self, capacity: int = 8, base_latency: float = 0.02, retry_after: float = 0.5):
+        self.capacity = capacity
+        self.base_latency = base_latency
+        self.retry_after = retry_after
+        self.inflight = 0
+        self.peak_inflight = 0
+        self.counts = {200: 0, 429: 0, 503: 0}
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                with server._lock:
+                    server.inflight += 1
+                    server.peak_inflight = max(server.peak_inflight, server.inflight)
+                    load = server.inflight
+                try:
+                    # 负载越高处理越慢
+                    time.sleep(server.base_latency * (1 + load / server.capacity))
+                    if load > server.capacity * 2:
+                        status, headers = 503, {'Retry-After': f"{server.retry_after:g}"}
+                    elif load > server.capacity:
+                        status, headers = 429, {}
+                    else:
+                        status, headers = 200, {}
+                    body = b'{"returnValue": {}}' if status == 200 else b'{}'
+                    with server._lock:
+                        server.counts[status] += 1
+                    self.send_response(status)
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with server._lock:
+                        server.inflight -= 1
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class RetryAfterTest(unittest.TestCase):
+    def test_parse_retry_after(self):
+        self.assertEqual(rl.parse_retry_after('2'), 2.0)
+        self.assertEqual(rl.parse_retry_after('1.5'), 1.5)
+        self.assertEqual(rl.parse_retry_after('-3'), 0.0)
+        self.assertIsNone(rl.parse_retry_after(None))
+        self.assertIsNone(rl.parse_retry_after(''))
+        # HTTP 日期格式按默认冷却时间处理
+        self.assertIsNone(rl.parse_retry_after('Wed, 21 Oct 2026 07:28:00 GMT'))
+
+    def test_classify_http_errors(self):
+        self.assertEqual(rl.classify_exception(http_error(429)), (rl.THROTTLED, 429, None))
+        self.assertEqual(rl.classify_exception(http_error(503, '7')), (rl.SERVER_ERROR, 503, 7.0))
+        self.assertEqual(rl.classify_exception(http_error(404)), (rl.CLIENT_ERROR, 404, None))
+        self.assertEqual(rl.classify_exception(rl.HostStatusError(429, 3.0)), (rl.THROTTLED, 429, 3.0))
+        self.assertEqual(rl.classify_exception(requests.Timeout()), (rl.UNAVAILABLE, None, None))
+
+
+class CircuitBreakerTest(ClockMixin, unittest.TestCase):
+    def setUp(self):
+        self.clock = self.patch_clock()
+        self.breaker = rl.CircuitBreaker('host', failure_threshold=3, cooldown=5.0, max_cooldown=60.0,
+                                         verbose=False)
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure('HTTP 429')
+        self.breaker.record_failure('HTTP 429')
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertEqual(self.breaker.wait_time(), 0.0)
+
+        self.breaker.record_failure('HTTP 429')
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertEqual(self.breaker.opens, 1)
+        self.assertAlmostEqual(self.breaker.wait_time(), 5.0)
+
+    def test_success_resets_failure_count(self):
+        self.breaker.record_failure('HTTP 429')
+        self.breaker.record_failure('HTTP 429')
+        self.breaker.record_success()
+        self.breaker.record_failure('HTTP 429')
+        self.assertEqual(self.breaker.state, 'closed')
+
+    def test_half_open_after_cooldown_and_probe_success_closes(self):
+        self.breaker.trip('test')
+        self.clock.advance(4.9)
+        self.assertGreater(self.breaker.wait_time(), 0)
+        self.clock.advance(0.2)
+        self.assertEqual(self.breaker.wait_time(), 0.0)
+        self.assertEqual(self.breaker.state, 'half-open')
+
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertEqual(self.breaker.cooldown, 5.0)
+
+    def test_half_open_waits_while_probe_inflight(self):
+        self.breaker.trip('test')
+        self.clock.advance(6)
+        self.assertEqual(self.breaker.wait_time(), 0.0)
+        self.breaker.probe_inflight = True
+        self.assertGreater(self.breaker.wait_time(), 0)
+
+    def test_probe_failure_reopens_with_doubled_cooldown(self):
+        self.breaker.trip('test')
+        self.clock.advance(6)
+        self.breaker.wait_time()
+        self.breaker.record_failure('HTTP 503')
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertEqual(self.breaker.opens, 2)
+        self.assertAlmostEqual(self.breaker.wait_time(), 10.0)
+
+    def test_retry_after_trips_immediately(self):
+        self.breaker.record_failure('HTTP 503', retry_after=30)
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertAlmostEqual(self.breaker.wait_time(), 30.0)
+        self.assertIn('Retry-After', self.breaker.reasons[0])
+
+    def test_retry_after_shorter_than_cooldown_uses_cooldown(self):
+        self.breaker.record_failure('HTTP 503', retry_after=1)
+        self.assertAlmostEqual(self.breaker.wait_time(), 5.0)
+
+
+class AimdTest(ClockMixin, unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.clock = self.patch_clock()
+        self.limiter = rl.DisneyRateLimiter(initial_limit=8, min_limit=1, max_limit=32, target_latency=2.0,
+                                            failure_threshold=100, verbose=False)
+
+    async def attempt(self, error: Exception = None, latency: float = 0.1):
+        try:
+            async with self.limiter.slot('host'):
+                self.clock.advance(latency)
+                if error:
+                    raise error
+        except Exception as e:
+            if e is not error:
+                raise
+
+    async def test_429_halves_limit(self):
+        await self.attempt(rl.HostStatusError(429))
+        self.assertEqual(self.limiter.limits['host'], 4)
+
+    async def test_503_halves_limit(self):
+        await self.attempt(http_error(503))
+        self.assertEqual(self.limiter.limits['host'], 4)
+
+    async def test_one_decrease_per_latency_window(self):
+        # 同一批在途请求的失败只减小一次
+        await self.attempt(rl.HostStatusError(429))
+        await self.attempt(rl.HostStatusError(429), latency=0.0)
+        self.assertEqual(self.limiter.limits['host'], 4)
+        self.clock.advance(1.0)
+        await self.attempt(rl.HostStatusError(429))
+        self.assertEqual(self.limiter.limits['host'], 2)
+
+    async def test_decrease_stops_at_min_limit(self):
+        for _ in range(10):
+            self.clock.advance(1.0)
+            await self.attempt(rl.HostStatusError(429))
+        self.assertEqual(self.limiter.limits['host'], 1)
+
+    async def test_success_adds_increase_per_round(self):
+        await self.attempt()
+        self.assertAlmostEqual(self.limiter.limits['host'], 8 + 1 / 8)
+
+    async def test_slow_success_decreases(self):
+        await self.attempt(latency=3.0)
+        self.assertAlmostEqual(self.limiter.limits['host'], 8 * 0.8)
+
+    async def test_client_error_keeps_limit(self):
+        await self.attempt(http_error(404))
+        self.assertEqual(self.limiter.limits['host'], 8)
+        self.assertEqual(self.limiter.stats['host'].outcomes, {rl.CLIENT_ERROR: 1})
+
+
+class ProbeTest(ClockMixin, unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.clock = self.patch_clock()
+        self.limiter = rl.DisneyRateLimiter(initial_limit=8, failure_threshold=1, cooldown=1.0,
+                                            verbose=False)
+
+    async def hold(self, started: asyncio.Event, finish: asyncio.Event, error: Exception = None):
+        async with self.limiter.slot('host'):
+            started.set()
+            await finish.wait()
+            if error:
+                raise error
+
+    async def test_only_probe_release_admits_next_request(self):
+        breaker_host = 'host'
+        # 熔断前发出的请求，熔断后才返回
+        stale_started, stale_finish = asyncio.Event(), asyncio.Event()
+        stale = asyncio.ensure_future(self.hold(stale_started, stale_finish))
+        await stale_started.wait()
+
+        with self.assertRaises(rl.HostStatusError):
+            async with self.limiter.slot(breaker_host):
+                raise rl.HostStatusError(503)
+        breaker = self.limiter.breakers[breaker_host]
+        self.assertEqual(breaker.state, 'open')
+
+        self.clock.advance(2.0)
+        probe_started, probe_finish = asyncio.Event(), asyncio.Event()
+        probe = asyncio.ensure_future(self.hold(probe_started, probe_finish))
+        await probe_started.wait()
+        self.assertTrue(breaker.probe_inflight)
+
+        waiter_started, waiter_finish = asyncio.Event(), asyncio.Event()
+        waiter = asyncio.ensure_future(self.hold(waiter_started, waiter_finish))
+        await asyncio.sleep(0.2)
+        self.assertFalse(waiter_started.is_set())
+
+        # 旧请求成功返回既不清除探测标记，也不关闭熔断器
+        stale_finish.set()
+        await stale
+        await asyncio.sleep(0.2)
+        self.assertEqual(breaker.state, 'half-open')
+        self.assertTrue(breaker.probe_inflight)
+        self.assertFalse(waiter_started.is_set())
+
+        probe_finish.set()
+        await probe
+        self.assertEqual(breaker.state, 'closed')
+        await asyncio.wait_for(waiter_started.wait(), timeout=2)
+        waiter_finish.set()
+        await waiter
+
+    async def test_probe_failure_reopens(self):
+        with self.assertRaises(rl.HostStatusError):
+            async with self.limiter.slot('host'):
+                raise rl.HostStatusError(503)
+        self.clock.advance(2.0)
+        with self.assertRaises(rl.HostStatusError):
+            async with self.limiter.slot('host'):
+                self.assertTrue(self.limiter.breakers['host'].probe_inflight)
+                raise rl.HostStatusError(503)
+        breaker = self.limiter.breakers['host']
+        self.assertEqual(breaker.state, 'open')
+        self.assertFalse(breaker.probe_inflight)
+        self.assertEqual(breaker.opens, 2)
+
+
+class ConvergenceTest(unittest.IsolatedAsyncioTestCase):
+    """真实时钟下对替身服务器并发请求：并发收敛到容量附近，既不冲到上限也不塌缩到最低"""
+
+    REQUESTS = 200
+    CAPACITY = 8
+    MAX_LIMIT = 64
+
+    async def test_converges_to_server_capacity(self):
+        limiter = rl.DisneyRateLimiter(initial_limit=2, max_limit=self.MAX_LIMIT, target_latency=1.0,
+                                       cooldown=0.5, max_attempts=8, verbose=False)
+        self.addCleanup(limiter.close)
+        with ThrottlingServer(capacity=self.CAPACITY) as server, requests.Session() as session:
+            session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=self.MAX_LIMIT))
+
+            def post():
+                resp = session.post(server.url, json={}, timeout=10)
+                resp.raise_for_status()
+                return resp.json()
+
+            results = await asyncio.wait_for(
+                asyncio.gather(*(limiter.call('localhost', post) for _ in range(self.REQUESTS)),
+                               return_exceptions=True),
+                timeout=60)
+
+        failures = [result for result in results if isinstance(result, Exception)]
+        self.assertEqual(failures, [])
+        self.assertEqual(server.counts[200], self.REQUESTS)
+
+        info = limiter.summary()['localhost']
+        self.assertEqual(info['completed'], self.REQUESTS)
+        self.assertGreaterEqual(info['settled_limit'], self.CAPACITY / 2)
+        self.assertLessEqual(info['settled_limit'], self.CAPACITY * 2)
+        self.assertGreater(limiter.limits['localhost'], limiter.min_limit)
+        # 过载时会短暂熔断，但运行结束时熔断器已经关闭
+        self.assertNotEqual(limiter.breakers['localhost'].state, 'open')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+disney_shards 的单元测试：分片分配与 merge_partials 的合并校验。
+在仓库根目录运行: python -m unittest discover -s tests
+"""
+
+import unittest
+
+import disney_shards as ds
+
+COUNTRIES = ['US', 'GB', 'KR', 'JP', 'TR', 'IN', 'BR', 'DE', 'FR', 'AU']
+COUNT = 3
+
+
+def plans(code: str):
+    return [{'plan_name': 'Disney+ Premium', 'country': code}]
+
+
+def partial(index: int, prices=None, all_countries=COUNTRIES, count: int = COUNT):
+    """构造一个分片结果；prices 缺省时本片负责的国家全部有数据"""
+    mine = [code for code in all_countries if ds.shard_of(code, count) == index]
+    return f"shard-{index}", {
+        'shard': {'index': index, 'count': count, 'countries': mine, 'all_countries': all_countries},
+        'prices': {code: plans(code) for code in mine} if prices is None else prices,
+    }
+
+
+def owned_by(index: int):
+    return [code for code in COUNTRIES if ds.shard_of(code, COUNT) == index]
+
+
+class ShardSpecTest(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(ds.ShardSpec.parse(' 2 / 8 '), ds.ShardSpec(2, 8))
+        for spec in ('0/4', '5/4', '1/0', 'a/b', ''):
+            with self.assertRaises(ValueError):
+                ds.ShardSpec.parse(spec)
+
+    def test_every_country_in_exactly_one_shard(self):
+        for code in COUNTRIES:
+            owners = [index for index in range(1, COUNT + 1) if ds.ShardSpec(index, COUNT).contains(code)]
+            self.assertEqual(len(owners), 1, code)
+
+    def test_shard_path(self):
+        self.assertEqual(ds.shard_path('disneyplus_prices.json', ds.ShardSpec(2, 8)),
+                         'disneyplus_prices.shard-2-of-8.json')
+
+
+class MergePartialsTest(unittest.TestCase):
+    def setUp(self):
+        # 测试数据需要每个分片至少负责一个国家
+        for index in range(1, COUNT + 1):
+            self.assertTrue(owned_by(index), f"分片 {index} 没有国家")
+
+    def test_complete_set_merges_in_country_order(self):
+        merged, errors, warnings = ds.merge_partials([partial(3), partial(1), partial(2)])
+        self.assertEqual(errors, [])
+        self.assertEqual(warnings, [])
+        self.assertEqual(list(merged), COUNTRIES)
+        self.assertEqual(merged['KR'], plans('KR'))
+
+    def test_missing_shard(self):
+        merged, errors, _ = ds.merge_partials([partial(1), partial(3)])
+        self.assertTrue(any('缺少分片: 2/3' in error for error in errors), errors)
+
+    def test_no_partials(self):
+        _, errors, _ = ds.merge_partials([])
+        self.assertEqual(len(errors), 1)
+
+    def test_inconsistent_shard_count(self):
+        _, errors, _ = ds.merge_partials([partial(1), partial(2, count=4)])
+        self.assertTrue(any('分片数不一致' in error for error in errors), errors)
+
+    def test_duplicate_shard(self):
+        _, errors, _ = ds.merge_partials([partial(1), partial(1), partial(2), partial(3)])
+        self.assertTrue(any('重复' in error for error in errors), errors)
+
+    def test_duplicate_country(self):
+        code = owned_by(1)[0]
+        path, second = partial(2)
+        # 同一国家出现在两个分片中（第二份同时也放错了分片）
+        second['prices'][code] = plans(code)
+        _, errors, _ = ds.merge_partials([partial(1), (path, second), partial(3)])
+        self.assertTrue(any(f"{code} 同时出现在" in error for error in errors), errors)
+
+    def test_country_in_wrong_shard(self):
+        code = owned_by(1)[0]
+        first = {c: plans(c) for c in owned_by(1) if c != code}
+        second = {c: plans(c) for c in owned_by(2)}
+        second[code] = plans(code)
+        _, errors, _ = ds.merge_partials([partial(1, first), partial(2, second), partial(3)])
+        self.assertEqual(errors, [f"{code} 不属于分片 2/{COUNT} (shard-2)"])
+
+    def test_missing_country_is_an_error(self):
+        failed = owned_by(2)[0]
+        prices = {code: plans(code) for code in owned_by(2) if code != failed}
+        merged, errors, warnings = ds.merge_partials([partial(1), partial(2, prices), partial(3)])
+        self.assertEqual(len(errors), 1)
+        self.assertIn(failed, errors[0])
+        self.assertEqual(warnings, [])
+
+    def test_allow_missing_downgrades_to_warning(self):
+        failed = owned_by(2)[0]
+        prices = {code: plans(code) for code in owned_by(2) if code != failed}
+        merged, errors, warnings = ds.merge_partials([partial(1), partial(2, prices), partial(3)],
+                                                     allow_missing=True)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(warnings), 1)
+        self.assertIn(failed, warnings[0])
+        self.assertNotIn(failed, merged)
+        self.assertEqual(list(merged), [code for code in COUNTRIES if code != failed])
+
+    def test_allow_missing_still_rejects_missing_shard(self):
+        _, errors, _ = ds.merge_partials([partial(1), partial(2)], allow_missing=True)
+        self.assertTrue(any('缺少分片' in error for error in errors), errors)
+
+    def test_different_country_lists_warn_and_use_union(self):
+        extra = COUNTRIES + ['NZ']
+        owner = ds.shard_of('NZ', COUNT)
+        partials = [partial(index, all_countries=extra if index == owner else COUNTRIES)
+                    for index in range(1, COUNT + 1)]
+        merged, errors, warnings = ds.merge_partials(partials)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(warnings), 1)
+        self.assertIn('NZ', merged)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+disney_summary_compactor 的单元测试：按月压缩、幂等，以及中断后月度汇总可以从压缩文件恢复。
+在仓库根目录运行: python -m unittest discover -s tests
+"""
+
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import disney_summary_compactor as sc
+
+
+class CompactorTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.summary_dir = tmp.name
+        self.compactor = sc.DisneySummaryCompactor(self.summary_dir)
+
+    def write_summary(self, run_id: str, total_changes: int) -> str:
+        path = os.path.join(self.summary_dir, f"disney_price_changes_summary_{run_id}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'total_changes': total_changes, 'price_increases': total_changes}, f)
+        return path
+
+    def test_compact_and_count(self):
+        self.write_summary('20250101_010000', 2)
+        self.write_summary('20250115_010000', 3)
+        self.write_summary('20250201_010000', 4)
+
+        compacted, months = self.compactor.compact(include_current_month=True)
+        self.assertEqual(compacted, 3)
+        self.assertEqual(months, ['2025-01', '2025-02'])
+        self.assertEqual(self.compactor.list_loose_summaries(), [])
+
+        index = self.compactor.load_index()
+        self.assertEqual(index['months']['2025-01']['total_changes'], 5)
+        self.assertEqual(index['months']['2025-01']['runs'], 2)
+        self.assertEqual(self.compactor.count_changes('2025-01-01', '2025-02-28')['total_changes'], 9)
+        self.assertEqual(self.compactor.count_changes('2025-01-10', '2025-01-31')['total_changes'], 3)
+
+    def test_interrupted_before_index_saved_is_recovered(self):
+        self.write_summary('20250101_010000', 2)
+        self.write_summary('20250102_010000', 3)
+
+        # 压缩文件已写入，但保存索引之前进程退出
+        with mock.patch.object(sc.DisneySummaryCompactor, '_save_index', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                self.compactor.compact(include_current_month=True)
+        self.assertEqual(len(self.compactor.list_loose_summaries()), 2)
+
+        self.compactor.compact(include_current_month=True)
+        self.assertEqual(self.compactor.list_loose_summaries(), [])
+        self.assertEqual(len(list(self.compactor.iter_rollup('2025-01'))), 2)
+        self.assertEqual(self.compactor.load_index()['months']['2025-01']['total_changes'], 5)
+        self.assertEqual(self.compactor.count_changes('2025-01-01', '2025-01-31')['total_changes'], 5)
+
+    def test_truncated_rollup_line_is_rewritten(self):
+        self.write_summary('20250101_010000', 2)
+        os.makedirs(self.compactor.rollup_dir)
+        with open(self.compactor.rollup_path('2025-01'), 'w', encoding='utf-8') as f:
+            f.write('{"run_id":"20250101_0100')
+
+        self.compactor.compact(include_current_month=True)
+        self.assertEqual([r['run_id'] for r in self.compactor.iter_rollup('2025-01')], ['20250101_010000'])
+        self.assertEqual(self.compactor.load_index()['months']['2025-01']['total_changes'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()